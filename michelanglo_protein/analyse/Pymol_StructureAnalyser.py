@@ -1,8 +1,12 @@
 from ..structure import Structure
 from ..mutation import Mutation
+from ..ligand_inventory import LigandInventory
+from .residue_table import ResidueTable
 from michelanglo_transpiler import PyMolTranspiler
 import pymol2
 import math
+from collections import Counter
+from typing import Optional, Dict, List, Union
 
 class StructureAnalyser:
     """
@@ -15,11 +19,13 @@ class StructureAnalyser:
     # I think PyMOL has H,S,L only?
     ss_types = {'H': 'Helix','S': 'Sheet', 'L': 'Loop', 'G': '3_10 helix', 'I': 'Pi helix', 'T': 'Turn', 'C': 'Coil', 'E': 'Sheet', 'B': 'Beta bridge', '-': 'Unassigned'}
 
-    def __init__(self, structure: Structure, mutation: Mutation):
+    def __init__(self, structure: Structure, mutation: Mutation, session: Optional[Dict] = None):
         """
 
         :param structure: a instance of Structure, a former namedtuple and is in core.py
         :param mutation: a instance of mutation.
+        :param session: a PyMOL session with the coordinates loaded by ``.load_session`` to share (see ``.analyse_many``).
+            None: a session of its own.
         """
         self.mutation = mutation
         self.position = mutation.residue_index
@@ -27,14 +33,7 @@ class StructureAnalyser:
         self.model = None
         self.chain = 'A' #structure.chain get offset will change the chain to A.
         self.code = structure.code
-        if self.structure.coordinates:
-            self.coordinates = self.structure.coordinates
-        elif len(self.code) == 4:
-            self.coordinates = structure.get_offset_coordinates()
-        else:
-            self.structure.type = 'swissmodel'
-            self.coordinates = structure.get_coordinates()
-        assert self.coordinates, 'There are no coordinates!!'
+        self.coordinates = self.get_coordinates_of(structure)
         # these two are very much for the ajax.
         self.chain_definitions = structure.chain_definitions  # seems redundant but str(structure) does not give these.
         self.history = {'code': self.code, 'changes': 'offset and made chain A'},
@@ -42,25 +41,123 @@ class StructureAnalyser:
         self.target_selection = f'(resi {self.position} and chain {self.chain})'
         self.pymol = None
         self._obj_name = 'myprotein'
-        with pymol2.PyMOL() as self.pymol:
-            self.pymol.cmd.read_pdbstr(self.coordinates, self._obj_name)
-            self.N_atoms = self.pymol.cmd.select(self.target_selection)
-            self.has_all_heavy_atoms = self.N_atoms >= self.normal_HA[self.mutation.from_residue]
-            self.pymol.cmd.h_add()
-            self.neighbours = self.get_neighbours()
-            self.SASA = self.get_SASA()
-            if self.mutation.from_residue != 'G':
-                self.SASA_sidechain = self.get_SASA(f'{self.target_selection} and not name N+H+C+CA+HA+O+OXT')
-            else:
-                self.SASA_sidechain = self.get_SASA(f'{self.target_selection} and name CA')
-            self.RSA = self.SASA / self.maxASA[self.mutation.from_residue]
-            self.SS = self.get_SS()
-            self.buried = self.RSA <= 0.2
-            self.ligand_list = self.get_ligand_list()
+        # a precomputed table of the structure (see residue_table.py) makes this a lookup.
+        residue_table = ResidueTable.get(self.coordinates)
+        precomputed = residue_table.get_residue(self.chain, self.position) if residue_table else None
+        if precomputed is not None:
+            self._read_table(precomputed)
+        elif session is None:
+            with pymol2.PyMOL() as pymol:
+                self._analyse(self.load_session(pymol, self.coordinates))
+        else:
+            self._analyse(session)
+        self.pymol = None
+        # ligands come from the precomputed inventory (see ligand_inventory.py). No PyMOL needed.
+        self.ligand_inventory = LigandInventory.get(self.code, self.coordinates)
+        self.ligand_list = self.get_ligand_list()
+        if precomputed is not None:
+            self.closest_ligand = precomputed['closest_ligand']
+            self.distance_to_closest_ligand = precomputed['distance_to_closest_ligand']
+        else:
             t = self.get_distance_to_closest_ligand()
             self.closest_ligand = t['closest']
             self.distance_to_closest_ligand = t['distance']
-        self.pymol = None
+
+    @staticmethod
+    def get_coordinates_of(structure: Structure) -> str:
+        """
+        The coordinates to analyse: as they are if present, else renumbered (RCSB) or fetched.
+        Local models (e.g. of a ``ModelRepository``) are read as they are.
+        """
+        if structure.coordinates:
+            coordinates = structure.coordinates
+        elif structure.type in ('local', 'custom'):
+            coordinates = structure.get_coordinates()
+        elif len(structure.code) == 4:
+            coordinates = structure.get_offset_coordinates()
+        else:
+            structure.type = 'swissmodel'
+            coordinates = structure.get_coordinates()
+        assert coordinates, 'There are no coordinates!!'
+        return coordinates
+
+    @classmethod
+    def load_session(cls, pymol, coordinates: str, name: str = 'myprotein') -> Dict:
+        """
+        Loads the coordinates, counts the atoms per residue (before hydrogens are added) and adds hydrogens.
+
+        :param pymol: a pymol2.PyMOL() instance (started)
+        :return: session dict: pymol, atom_counts ((chain, resi) -> atoms as given)
+        """
+        pymol.cmd.read_pdbstr(coordinates, name)
+        residues = {'residues': []}
+        pymol.cmd.iterate(name, "residues.append((chain, resi))", space=residues)
+        pymol.cmd.h_add()
+        return {'pymol': pymol, 'atom_counts': Counter(residues['residues'])}
+
+    def _analyse(self, session: Dict):
+        self.pymol = session['pymol']
+        self.N_atoms = session['atom_counts'].get((self.chain, str(self.position)), 0)
+        self.has_all_heavy_atoms = self.N_atoms >= self.normal_HA[self.mutation.from_residue]
+        self.neighbours = self.get_neighbours()
+        self.SASA = self.get_SASA()
+        if self.mutation.from_residue != 'G':
+            self.SASA_sidechain = self.get_SASA(f'{self.target_selection} and not name N+H+C+CA+HA+O+OXT')
+        else:
+            self.SASA_sidechain = self.get_SASA(f'{self.target_selection} and name CA')
+        self.RSA = self.SASA / self.maxASA[self.mutation.from_residue]
+        self.SS = self.get_SS()
+        self.buried = self.RSA <= 0.2
+
+    def _read_table(self, precomputed: Dict):
+        """
+        Fills the attributes ``_analyse`` would from a row of a ``ResidueTable``.
+        """
+        self.N_atoms = precomputed['N_atoms']
+        self.has_all_heavy_atoms = self.N_atoms >= self.normal_HA[self.mutation.from_residue]
+        self.neighbours = precomputed['neighbours']
+        self.SASA = precomputed['SASA']
+        self.SASA_sidechain = precomputed['SASA_sidechain']
+        self.RSA = self.SASA / self.maxASA[self.mutation.from_residue]
+        self.SS = 'Unknown' if precomputed['SS'] == '?' else self.ss_types.get(precomputed['SS'])
+        self.buried = self.RSA <= 0.2
+
+    @classmethod
+    def analyse_many(cls, structure: Structure, mutations: List[Mutation]) -> List[Union['StructureAnalyser', Exception]]:
+        """
+        Analyses several mutations of the same structure in one PyMOL session (loaded, hydrogenated once),
+        or none if the structure has a ``ResidueTable`` with all the residues.
+
+        :return: list in the same order of StructureAnalyser instances or of the exception raised for that mutation.
+        """
+        coordinates = cls.get_coordinates_of(structure)
+        residue_table = ResidueTable.get(coordinates)
+        if residue_table is not None and \
+                all(residue_table.lookup('A', mutation.residue_index) is not None for mutation in mutations):
+            return cls._analyse_each(structure, mutations, None)
+        with pymol2.PyMOL() as pymol:
+            return cls._analyse_each(structure, mutations, cls.load_session(pymol, coordinates))
+
+    @classmethod
+    def _analyse_each(cls, structure: Structure, mutations: List[Mutation], session: Optional[Dict]) -> List:
+        results = []
+        for mutation in mutations:
+            try:
+                results.append(cls(structure, mutation, session=session))
+            except Exception as error:
+                results.append(error)
+        return results
+
+    @classmethod
+    def annotate(cls, structure: Structure) -> ResidueTable:
+        """
+        Computes and stores the ``ResidueTable`` of the structure (as renumbered for analysis), for generation.
+        """
+        coordinates = cls.get_coordinates_of(structure)
+        with pymol2.PyMOL() as pymol:
+            table = ResidueTable.compute(cls.load_session(pymol, coordinates), coordinates, code=structure.code)
+        table.save(coordinates)
+        return table
 
     def get_SS(self, sele=None):
         assert self.pymol is not None, 'Can only be called within a PyMOL session'
@@ -123,27 +220,13 @@ class StructureAnalyser:
 
     def get_distance_to_closest_ligand(self):
         """
+        Closest atom of a ligand in ``.ligand_inventory`` to the target residue (heavy atoms, as in the coordinates).
 
         :return: {'target': target atom, 'closest': ligand atom, 'distance': Ang distance}
         """
-        assert self.pymol is not None, 'Can only be called within a PyMOL session'
-        my_dict = {'target': {}, 'ligands': {}}
-        self.pymol.cmd.iterate_state(1, f'{self.target_selection}', "target[resi+'.'+name+':'+chain] =(x,y,z)", space=my_dict)
-        if not self.ligand_list:
-            return {'target': None, 'closest': None, 'distance': None}
-        for lig in self.ligand_list:
-            self.pymol.cmd.iterate_state(1, f'resn {lig}', "ligands['['+resn+']'+resi+'.'+name+':'+chain] = (x,y,z)", space=my_dict)
-        closest_t = ''
-        closest_l = ''
-        closest_d = 99999
-        for l in my_dict['ligands']:
-            for t in my_dict['target']:
-                d = self.euclidean(my_dict['ligands'][l], my_dict['target'][t])
-                if d < closest_d:
-                    closest_t = t
-                    closest_l = l
-                    closest_d = d
-        return {'target': closest_t, 'closest': closest_l, 'distance': closest_d}
+        atoms = self.structure.atoms  # parsed from self.coordinates
+        target = atoms[(atoms.chain == self.chain) & (atoms.resi == self.position) & (atoms.icode == '')]
+        return self.ligand_inventory.get_closest(target)
 
 
     @staticmethod
@@ -151,9 +234,4 @@ class StructureAnalyser:
         return math.sqrt(sum([(a[i]-b[i])**2 for i in range(3)]))
 
     def get_ligand_list(self):
-        assert self.pymol is not None, 'Can only be called within a PyMOL session'
-        my_dict = {'residues': set()}
-        self.pymol.cmd.iterate(f'all', "residues.add(resn)", space=my_dict)
-        exclusion = PyMolTranspiler.boring_ligand + PyMolTranspiler.water_ligand + PyMolTranspiler.aa_ligand
-        return {lig.upper() for lig in my_dict['residues'] if lig.upper() not in exclusion}
-
+        return self.ligand_inventory.get_ligand_list()
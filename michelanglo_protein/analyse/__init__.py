@@ -1,3 +1,6 @@
+from .mutator_pool import MutatorPool
+from .ff_scheduler import FFScheduler
+from .energetics_cache import EnergeticsCache
 try:
     from .Pymol_StructureAnalyser import StructureAnalyser
     from .pyrosetta_modifier import Mutator
@@ -0,0 +1,149 @@
+__doc__ = """
+Disk cache of the pyrosetta results (``Mutator.analyse_mutation``, ``.repack_other``, ``.score_gnomads``,
+``.make_phospho``, ``.relax_native`` and ``.saturate``), as these are minutes of CPU each and deterministic
+given their inputs.
+``ProteinAnalyser._run_mutator`` checks it before queuing a job.
+
+The key is a hash of the method, its arguments, the PDB block, target residue and chain, cycles, radius,
+the content of the params files and the pyrosetta version.
+Results are gzipped pickles in ``temp/energetics`` (coordinate blocks included, as ``ProteinAnalyser.pdbblock``
+and the app use them). Errors are not cached. Past ``max_size`` bytes the least recently used results are deleted.
+``sandbox.warm_energetics_cache`` fills it with the ClinVar missenses.
+"""
+
+import os, gzip, pickle, hashlib
+from threading import Lock
+from typing import Dict, Optional, Any
+from ..settings_handler import global_settings  # the instance not the class.
+
+
+class EnergeticsCache:
+    settings = global_settings
+    subfolder = 'energetics'  #: within the temp folder
+    enabled = True
+    max_size = 5 * 2 ** 30  #: bytes
+    cached_methods = ('analyse_mutation', 'repack_other', 'score_gnomads', 'make_phospho', 'relax_native',
+                      'saturate')
+    hits = 0
+    misses = 0
+    _folder = None
+    _size = None  #: bytes used, counted once per process then kept up to date.
+    _version = None
+    _lock = Lock()
+
+    @classmethod
+    def get_folder(cls) -> str:
+        if cls._folder is None:
+            cls._folder = os.path.join(cls.settings.temp_folder, cls.subfolder)
+        if not os.path.exists(cls._folder):
+            os.makedirs(cls._folder, exist_ok=True)
+        return cls._folder
+
+    @classmethod
+    def get_pyrosetta_version(cls) -> str:
+        """
+        From the package metadata, so pyrosetta is not imported in the main process.
+        """
+        if cls._version is None:
+            from importlib import metadata
+            for name in ('pyrosetta', 'pyrosetta-installer'):
+                try:
+                    cls._version = metadata.version(name)
+                    break
+                except metadata.PackageNotFoundError:
+                    continue
+            else:
+                cls._version = 'unknown'
+        return cls._version
+
+    @classmethod
+    def get_key(cls, method: str, init_settings: Dict, args: tuple) -> str:
+        """
+        :param init_settings: of ``Mutator``
+        """
+        digest = hashlib.sha256()
+        digest.update(repr((method, args, init_settings.get('target_resi'), init_settings.get('target_chain', 'A'),
+                            init_settings.get('cycles', 1), init_settings.get('radius', 4),
+                            cls.get_pyrosetta_version())).encode())
+        digest.update((init_settings.get('pdbblock') or '').encode())
+        for filename in init_settings.get('params_filenames') or ():
+            if os.path.exists(filename):
+                with open(filename, 'rb') as fh:
+                    digest.update(fh.read())
+            else:
+                digest.update(filename.encode())
+        return digest.hexdigest()
+
+    @classmethod
+    def get_path(cls, key: str) -> str:
+        return os.path.join(cls.get_folder(), key[:2], key + '.p.gz')
+
+    @classmethod
+    def get(cls, key: str) -> Optional[Any]:
+        """
+        :return: the stored result or None
+        """
+        path = cls.get_path(key)
+        try:
+            with gzip.open(path, 'rb') as fh:
+                result = pickle.load(fh)
+            os.utime(path)  # recently used
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, OSError):
+            cls.misses += 1
+            return None
+        cls.hits += 1
+        return result
+
+    @classmethod
+    def put(cls, key: str, result: Any):
+        if result is None or (isinstance(result, dict) and 'error' in result):
+            return
+        path = cls.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f'{path}.{os.getpid()}.tmp'
+        with gzip.open(temp, 'wb') as fh:
+            pickle.dump(result, fh)
+        with cls._lock:
+            if cls._size is None:
+                cls._size = cls._measure()
+            if os.path.exists(path):  # replaced: not counted twice.
+                cls._size -= os.path.getsize(path)
+            os.replace(temp, path)
+            cls._size += os.path.getsize(path)
+            if cls._size > cls.max_size:
+                cls._evict()
+
+    @classmethod
+    def _iter_files(cls):
+        for folder, subfolders, files in os.walk(cls.get_folder()):
+            for file in files:
+                if file.endswith('.p.gz'):
+                    yield os.path.join(folder, file)
+
+    @classmethod
+    def _measure(cls) -> int:
+        return sum(os.path.getsize(path) for path in cls._iter_files())
+
+    @classmethod
+    def _evict(cls):
+        """
+        Deletes the least recently used results till 90% of ``max_size``. Call within ``cls._lock``.
+        """
+        stats = sorted(((os.stat(path), path) for path in cls._iter_files()), key=lambda s: s[0].st_mtime)
+        size = sum(stat.st_size for stat, path in stats)
+        for stat, path in stats:
+            if size <= cls.max_size * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= stat.st_size
+        cls._size = size
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            for path in list(cls._iter_files()):
+                os.remove(path)
+            cls._size = 0
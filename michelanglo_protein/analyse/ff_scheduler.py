@@ -0,0 +1,244 @@
+__doc__ = """
+Priority and deadline aware queue in front of ``MutatorPool`` for the force field jobs of ``ProteinAnalyser``
+(``analyse_FF``, ``analyse_gnomad_FF``, ``analyse_other_FF`` and ``phosphorylate_FF``), so an interactive
+VENUS request does not wait behind a batch relax of a huge protein.
+
+    >>> future = FFScheduler.get_default().submit('analyse_mutation', init_settings, 'W',
+    ...                                           priority='interactive', deadline=time.time() + 300)
+    >>> future.result()  # concurrent.futures.Future
+    {'ddG': ..., 'scores': ...}
+
+* Jobs run by priority (``FFScheduler.priorities``), then earliest deadline, then order of submission.
+* A job still queued at its deadline is dropped then (by a sweeping thread, not when it would have been dispatched),
+  a running one is stopped at it (its worker is replaced):
+  either way the result is ``{'error': 'deadline exceeded'}``. ``future.cancel()`` drops a queued job.
+* Admission: over ``max_queue`` queued jobs, or if the job is predicted to miss its deadline, it is rejected
+  (``{'error': 'rejected: ...'}``) or, if interactive and ``on_late`` is 'downgrade', queued as batch without deadline.
+  The prediction uses the running average of seconds per kB of PDB block of each method.
+* ``.close()`` stops its threads, rejecting the queued jobs.
+* ``.get_metrics()`` gives the queue depths, running jobs and counts of what happened to the jobs.
+"""
+
+import heapq, itertools, time
+from concurrent.futures import Future
+from threading import Condition, Thread, Lock
+from typing import Optional, Dict, Any
+from .mutator_pool import MutatorPool
+
+
+class _Job:
+    __slots__ = ('method', 'init_settings', 'args', 'rank', 'deadline', 'estimate', 'future', 'started')
+
+    def __init__(self, method, init_settings, args, rank, deadline, estimate):
+        self.method = method
+        self.init_settings = init_settings
+        self.args = args
+        self.rank = rank
+        self.deadline = deadline
+        self.estimate = estimate
+        self.future = Future()
+        self.started = None
+
+
+class FFScheduler:
+    priorities = {'interactive': 0, 'batch': 1}
+    max_queue = 200  #: queued jobs over which new ones are rejected
+    on_late = 'downgrade'  #: interactive jobs predicted to miss their deadline: 'downgrade' to batch or 'reject'
+    default_estimate = 120.  #: seconds, for a method not yet timed
+    smoothing = 0.3  #: weight of the latest run in the running average
+    _default = None
+    _default_lock = Lock()
+
+    def __init__(self, pool: Optional[MutatorPool] = None, workers: Optional[int] = None):
+        """
+        :param pool: default ``MutatorPool.get_default()``
+        :param workers: jobs run at once. Default: the size of the pool (more would just queue in the pool).
+        """
+        self.pool = pool if pool is not None else MutatorPool.get_default()
+        self.workers = workers if workers is not None else self.pool.size
+        self._queue = []  # heap of (rank, deadline, sequence, _Job)
+        self._sequence = itertools.count()
+        self._running = []
+        self._condition = Condition()
+        self._threads = []
+        self._sweeper = None
+        self._closing = False
+        self.rates = {}  #: method -> seconds per kB of PDB block (running average)
+        self.counts = dict.fromkeys(('submitted', 'completed', 'failed', 'rejected', 'downgraded', 'expired',
+                                     'cancelled'), 0)
+
+    @classmethod
+    def get_default(cls) -> 'FFScheduler':
+        """
+        The scheduler shared by the ``ProteinAnalyser`` instances of the process.
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    ############################## prediction
+
+    @staticmethod
+    def _get_size(init_settings: Dict) -> float:
+        return max(len(init_settings.get('pdbblock') or ''), 1) / 1000
+
+    def estimate(self, method: str, init_settings: Dict) -> float:
+        """
+        Predicted run time in seconds.
+        """
+        if method not in self.rates:
+            return self.default_estimate
+        return self.rates[method] * self._get_size(init_settings)
+
+    def _record(self, job: _Job, duration: float):
+        rate = duration / self._get_size(job.init_settings)
+        previous = self.rates.get(job.method)
+        self.rates[job.method] = rate if previous is None else previous + self.smoothing * (rate - previous)
+
+    def predict_wait(self, rank: int) -> float:
+        """
+        Seconds before a job of that rank would start: the queued jobs ahead of it and what is left of the running ones.
+        Call within ``self._condition``.
+        """
+        now = time.time()
+        ahead = sum(job.estimate for r, d, s, job in self._queue if r <= rank and not job.future.cancelled())
+        left = sum(max(job.estimate - (now - job.started), 0) for job in self._running)
+        if len(self._running) < self.workers and not ahead:
+            return 0.
+        return (ahead + left) / self.workers
+
+    ############################## queue
+
+    def submit(self, method: str, init_settings: Dict, *args, priority: str = 'interactive',
+               deadline: Optional[float] = None) -> Future:
+        """
+        Queues ``Mutator(**init_settings).method(*args)``.
+
+        :param priority: key of ``FFScheduler.priorities``
+        :param deadline: epoch seconds (``time.time()``) by which the result is of use. None: no limit.
+        :return: Future whose result is the job result or a dict with the key error
+        """
+        rank = self.priorities[priority]
+        job = _Job(method, init_settings, args, rank, deadline, self.estimate(method, init_settings))
+        with self._condition:
+            self.counts['submitted'] += 1
+            if self._closing:
+                return self._reject(job, 'closed')
+            elif len(self._queue) >= self.max_queue:
+                return self._reject(job, 'queue full')
+            if deadline is not None and time.time() + self.predict_wait(rank) + job.estimate > deadline:
+                if rank == 0 and self.on_late == 'downgrade':
+                    job.rank, job.deadline = self.priorities['batch'], None
+                    self.counts['downgraded'] += 1
+                else:
+                    return self._reject(job, 'predicted to miss its deadline')
+            heapq.heappush(self._queue, (job.rank, job.deadline if job.deadline is not None else float('inf'),
+                                         next(self._sequence), job))
+            while len(self._threads) < self.workers:
+                thread = Thread(target=self._dispatch, daemon=True, name='FFScheduler')
+                thread.start()
+                self._threads.append(thread)
+            if job.deadline is not None and self._sweeper is None:
+                self._sweeper = Thread(target=self._sweep, daemon=True, name='FFScheduler sweeper')
+                self._sweeper.start()
+            self._condition.notify_all()  # a dispatcher and the sweeper (earlier deadline)
+        return job.future
+
+    def _reject(self, job: _Job, reason: str) -> Future:
+        self.counts['rejected'] += 1
+        job.future.set_result({'error': f'rejected: {reason}'})
+        return job.future
+
+    def _sweep(self):
+        """
+        Resolves the queued jobs whose deadline has passed, so their callers are not waiting on the running jobs.
+        """
+        with self._condition:
+            while not self._closing:
+                now = time.time()
+                expired = [entry for entry in self._queue if entry[1] <= now]
+                for entry in expired:
+                    self._queue.remove(entry)
+                    job = entry[-1]
+                    if job.future.cancelled():
+                        self.counts['cancelled'] += 1
+                    else:
+                        self.counts['expired'] += 1
+                        job.future.set_result({'error': 'deadline exceeded'})
+                if expired:
+                    heapq.heapify(self._queue)
+                earliest = min((entry[1] for entry in self._queue), default=float('inf'))
+                self._condition.wait(earliest - now if earliest != float('inf') else None)
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closing:
+                    self._condition.wait()
+                if self._closing:
+                    return
+                job = heapq.heappop(self._queue)[-1]
+                if not job.future.set_running_or_notify_cancel():
+                    self.counts['cancelled'] += 1
+                    continue
+                job.started = time.time()
+                if job.deadline is not None and job.started >= job.deadline:
+                    self.counts['expired'] += 1
+                    job.future.set_result({'error': 'deadline exceeded'})
+                    continue
+                self._running.append(job)
+            timeout = job.deadline - job.started if job.deadline is not None else None
+            try:
+                result = self.pool.submit(job.method, job.init_settings, *job.args, timeout=timeout)
+            except BaseException as error:
+                result = {'error': f'{error.__class__.__name__}:{error}'}
+            duration = time.time() - job.started
+            with self._condition:
+                self._running.remove(job)
+                if isinstance(result, dict) and result.get('error') == 'timeout':
+                    self.counts['expired'] += 1
+                    result = {'error': 'deadline exceeded'}
+                elif isinstance(result, dict) and 'error' in result:
+                    self.counts['failed'] += 1
+                else:
+                    self.counts['completed'] += 1
+                    self._record(job, duration)
+            job.future.set_result(result)
+
+    def close(self):
+        """
+        Stops the threads: the queued jobs are rejected, the running ones are waited for. Further jobs start new ones.
+        """
+        with self._condition:
+            self._closing = True
+            for entry in self._queue:
+                job = entry[-1]
+                if job.future.cancelled():
+                    self.counts['cancelled'] += 1
+                else:
+                    self._reject(job, 'closed')
+            self._queue = []
+            self._condition.notify_all()
+            threads = self._threads + ([self._sweeper] if self._sweeper is not None else [])
+        for thread in threads:
+            thread.join()
+        with self._condition:
+            self._threads = []
+            self._sweeper = None
+            self._closing = False
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        :return: queued (per priority), running, predicted wait per priority (seconds) and the counts.
+        """
+        with self._condition:
+            queued = {name: 0 for name in self.priorities}
+            names = {rank: name for name, rank in self.priorities.items()}
+            for rank, deadline, sequence, job in self._queue:
+                if not job.future.cancelled():
+                    queued[names[rank]] += 1
+            return {'queued': queued,
+                    'running': len(self._running),
+                    'predicted_wait': {name: self.predict_wait(rank) for name, rank in self.priorities.items()},
+                    **self.counts}
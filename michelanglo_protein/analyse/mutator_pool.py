@@ -0,0 +1,198 @@
+__doc__ = """
+A pool of long-lived worker processes for the pyrosetta jobs of ``ProteinAnalyser`` (``analyse_FF`` and co.).
+
+Pyrosetta segfaults if anything is done incorrectly, so the jobs cannot run in the main process.
+Forking a fresh process per job means initialising pyrosetta and its score function tables every time:
+the workers here do that once and then wait for jobs, ``(Mutator method, Mutator init settings, arguments)``.
+
+    >>> pool = MutatorPool.get_default()
+    >>> pool.submit('analyse_mutation', init_settings, 'W')
+    {'ddG': ..., 'scores': ...}
+
+* The caller waits on the pipe and the process sentinel (``multiprocessing.connection.wait``), not in a polling loop.
+* A worker that dies mid job (segfault) is replaced and only that job gets ``{'error': 'segmentation fault'}``.
+* A job over its ``timeout`` gets ``{'error': 'timeout'}`` and its worker is killed and replaced.
+* A worker is retired and replaced after ``max_jobs`` jobs, as pyrosetta memory usage only grows.
+* ``size`` workers at most, by default one per CPU (at least two): that many jobs run at once, the others wait
+  for a free worker. Before the pool every job forked a process of its own, so there was no limit;
+  lower ``MutatorPool.size`` (before the first job) if memory is short, as each worker holds its own pyrosetta.
+
+Nothing here imports pyrosetta: the workers do (``warm_mutator``).
+"""
+
+import multiprocessing, queue, os
+from multiprocessing.connection import wait
+from threading import Lock
+from typing import Optional, Callable, Dict, Any
+
+
+def warm_mutator():
+    """
+    Run once per worker: importing ``pyrosetta_modifier`` initialises pyrosetta, the score function loads the tables.
+    """
+    from .pyrosetta_modifier import Mutator
+    import pyrosetta
+    pyrosetta.get_fa_scorefxn()
+
+
+def run_mutator_job(method: str, init_settings: Dict, args: tuple) -> Any:
+    """
+    ``Mutator(**init_settings).method(*args)``
+    """
+    from .pyrosetta_modifier import Mutator
+    return getattr(Mutator(**init_settings), method)(*args)
+
+
+def _serve(connection, runner: Callable, warmer: Optional[Callable]):
+    """
+    Worker process loop. A job of None ends it.
+    """
+    if warmer is not None:
+        warmer()
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:  # parent gone.
+            break
+        if job is None:
+            break
+        try:
+            result = runner(*job)
+        except BaseException as error:
+            result = {'error': f'{error.__class__.__name__}:{error}'}
+        connection.send(result)
+
+
+class _Worker:
+    __slots__ = ('process', 'connection', 'jobs')
+
+    def __init__(self, process, connection):
+        self.process = process
+        self.connection = connection
+        self.jobs = 0
+
+
+class MutatorPool:
+    size = max(2, os.cpu_count() or 1)  #: number of worker processes
+    max_jobs = 20  #: jobs a worker does before being replaced. 0: never.
+    start_method = None  #: multiprocessing start method. None: the platform default (fork on Linux)
+    _default = None
+    _default_lock = Lock()
+
+    def __init__(self, size: Optional[int] = None, max_jobs: Optional[int] = None,
+                 runner: Callable = run_mutator_job, warmer: Optional[Callable] = warm_mutator):
+        """
+        Workers are started when first needed.
+
+        :param size: number of worker processes (default: class attribute)
+        :param max_jobs: jobs per worker before it is replaced (default: class attribute)
+        :param runner: function(method, init_settings, args) run in the workers
+        :param warmer: function run once when a worker starts
+        """
+        self.size = size if size is not None else self.size
+        self.max_jobs = max_jobs if max_jobs is not None else self.max_jobs
+        self.runner = runner
+        self.warmer = warmer
+        self._context = multiprocessing.get_context(self.start_method)
+        self._idle = queue.Queue()
+        self._started = 0
+        self._lock = Lock()
+        self.crashes = 0  #: workers that died mid job
+        self.recycled = 0  #: workers retired after max_jobs
+
+    @classmethod
+    def get_default(cls) -> 'MutatorPool':
+        """
+        The pool shared by the ``ProteinAnalyser`` instances of the process.
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def _spawn(self) -> _Worker:
+        parent_connection, child_connection = self._context.Pipe()
+        process = self._context.Process(target=_serve, args=(child_connection, self.runner, self.warmer),
+                                        name='pyrosetta', daemon=True)
+        process.start()
+        child_connection.close()
+        return _Worker(process, parent_connection)
+
+    def _acquire(self) -> _Worker:
+        try:
+            worker = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                spawn = self._started < self.size
+                if spawn:
+                    self._started += 1
+            worker = self._spawn() if spawn else self._idle.get()  # blocks till a worker is free
+        if not worker.process.is_alive():  # died while idle (e.g. killed): its job had not started.
+            self._discard(worker)
+            worker = self._spawn()
+        return worker
+
+    def _discard(self, worker: _Worker):
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join()
+        worker.connection.close()
+
+    def _retire(self, worker: _Worker):
+        try:
+            worker.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        worker.process.join(timeout=5)
+        self._discard(worker)
+
+    def submit(self, method: str, init_settings: Dict, *args, timeout: Optional[float] = None) -> Any:
+        """
+        Runs ``Mutator(**init_settings).method(*args)`` in a worker and waits for the result (blocking).
+
+        :param timeout: seconds. None: no limit.
+        :return: the result or a dict with the key error
+        """
+        worker = self._acquire()
+        replace = False
+        try:
+            worker.connection.send((method, init_settings, args))
+            ready = wait([worker.connection, worker.process.sentinel], timeout)
+            if worker.connection in ready:
+                result = worker.connection.recv()
+            elif ready:
+                raise EOFError
+            else:
+                replace = True
+                result = {'error': 'timeout'}
+        except (EOFError, BrokenPipeError, ConnectionResetError):
+            replace = True
+            self.crashes += 1
+            result = {'error': 'segmentation fault'}
+        except BaseException:  # e.g. KeyboardInterrupt: the worker may still be on the job.
+            replace = True
+            raise
+        finally:
+            worker.jobs += 1
+            if replace:
+                self._discard(worker)
+                worker = self._spawn()
+            elif self.max_jobs and worker.jobs >= self.max_jobs:
+                self._retire(worker)
+                self.recycled += 1
+                worker = self._spawn()
+            self._idle.put(worker)
+        return result
+
+    def close(self):
+        """
+        Ends the idle workers. Further jobs start new ones.
+        """
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._retire(worker)
+            with self._lock:
+                self._started -= 1
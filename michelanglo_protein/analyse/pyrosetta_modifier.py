@@ -5,7 +5,7 @@ It is called by ``ProteinAnalyser.analyse_FF``.
 To avoid segmentation faults it is run on a separate process byt this.
 
 Pyrosetta will throw a segmentation fault if anything is done incorrectly. Such as editing a non-existent atom.
-As a result ProteinAnalyser.analyse_FF uses multiprocessing to do the job on a different core.
+As a result ProteinAnalyser.analyse_FF sends the job to a worker process of ``MutatorPool`` (see mutator_pool.py).
 """
 
 import pyrosetta, pymol2, re, os
@@ -202,6 +202,46 @@ class Mutator:
                 'mutant_residue_terms': self.get_res_score_terms(self.pose)
                 }
 
+    def relax_native(self) -> str:
+        """
+        Relaxes around the target without mutating, for ``.saturate`` (``relax_native=False``) in other processes.
+
+        :return: PDB block of the relaxed pose
+        """
+        self.do_relax()
+        self.mark('relaxed')
+        self.native = self.pose.clone()
+        return self.output_pdbblock()
+
+    def saturate(self, alt_resns: Optional[List[str]] = None, relax_native: bool = True) -> Dict[str, float]:
+        """
+        Saturation mutagenesis of the target: the native is relaxed once and each alternative is mutated
+        and relaxed from a clone of it.
+
+        :param alt_resns: one letter codes. Default: the 19 other than the native
+        :param relax_native: False if ``.pdbblock`` is already relaxed (``.relax_native``), as when split across processes
+        :return: ddG (kcal/mol) per alternative
+        """
+        if relax_native:
+            self.relax_native()
+        else:
+            self.mark('relaxed')
+            self.native = self.pose.clone()
+        native_resn = self.native.residue(self.target_pdb2pose(self.target)).name1()
+        if alt_resns is None:
+            alt_resns = [aa for aa in 'ACDEFGHIKLMNPQRSTVWY' if aa != native_resn]
+        ddG = {}
+        for alt_resn in alt_resns:
+            if alt_resn == native_resn:
+                ddG[alt_resn] = 0.
+                continue
+            self.pose = self.native.clone()
+            self.mutate(alt_resn)
+            self.do_relax()
+            ddG[alt_resn] = self.scorefxn(self.pose) - self.scores['relaxed']
+        self.pose = self.native.clone()
+        return ddG
+
     def make_phospho(self, ptms):
         phospho = self.pose.clone()
         MutateResidue = pyrosetta.rosetta.protocols.simple_moves.MutateResidue
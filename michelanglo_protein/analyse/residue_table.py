@@ -0,0 +1,207 @@
+__doc__ = """
+Per residue structural annotation of a whole structure: heavy atom count, SASA (total and side chain),
+secondary structure, residues within 3 Å and the closest ligand atom, as compact arrays.
+``StructureAnalyser`` computes these for one residue per mutation; here they are done for every residue in one
+PyMOL session (one ``get_area`` with per atom areas, one ``find_pairs``, one distance matrix to the ligands)
+at generation (``sandbox.annotate_residues``), and ``StructureAnalyser`` reads the row of the mutated residue
+when the table of its coordinates is present, without opening PyMOL.
+
+    >>> table = ResidueTable.get(coordinates)  # None if not precomputed
+    >>> table.get_residue('A', 23)
+    {'N_atoms': 8, 'SASA': 35.1, 'SASA_sidechain': 20.4, 'SS': 'H', 'neighbours': [...], 'closest_ligand': ..., ...}
+
+Tables are keyed by the coordinates (the residue numbers depend on the renumbering) and stored as .npz files
+in ``temp/residues``. The neighbours are in compressed sparse row form (``neighbour_offsets``, ``neighbours``).
+"""
+
+import os, hashlib
+from threading import Lock
+from typing import Dict, Optional, List, Tuple
+import numpy as np
+from ..settings_handler import global_settings  # the instance not the class.
+from ..atom_array import pdb_to_atoms
+from ..ligand_inventory import LigandInventory
+
+
+class ResidueTable:
+    settings = global_settings
+    subfolder = 'residues'  #: within the temp folder
+    backbone = ('N', 'H', 'C', 'CA', 'HA', 'O', 'OXT')  #: not side chain for SASA_sidechain
+    neighbour_distance = 3  #: Å, as ``StructureAnalyser.get_neighbours``
+    fields = ('chain', 'resi', 'resn', 'n_atoms', 'sasa', 'sasa_sidechain', 'ss', 'neighbour_offsets', 'neighbours',
+              'closest', 'distance')
+    _folder = None
+    _memory = {}  #: coordinates key -> instance. small: cleared when over memory_size.
+    memory_size = 100
+    _lock = Lock()
+
+    def __init__(self, data: Dict[str, np.ndarray]):
+        """
+        :param data: the arrays of ``.fields``. ``ss`` is '?' for residues without CA, ``distance`` NaN without ligands.
+        """
+        for field in self.fields:
+            setattr(self, field, data[field])
+        self._rows = {(chain, resi): i for i, (chain, resi) in enumerate(zip(self.chain, self.resi))}
+
+    def __len__(self):
+        return len(self.chain)
+
+    def lookup(self, chain: str, resi) -> Optional[int]:
+        """
+        :param resi: residue number (and insertion code) as in PyMOL, int or str.
+        :return: row or None
+        """
+        return self._rows.get((chain, str(resi)))
+
+    def get_neighbours(self, row: int) -> List[Dict[str, str]]:
+        """
+        As ``StructureAnalyser.get_neighbours``: resi, resn and chain of the residues with a CA within 3 Å.
+        """
+        return [{'resi': str(self.resi[i]), 'resn': str(self.resn[i]), 'chain': str(self.chain[i])}
+                for i in self.neighbours[self.neighbour_offsets[row]:self.neighbour_offsets[row + 1]]]
+
+    def get_residue(self, chain: str, resi) -> Optional[Dict]:
+        row = self.lookup(chain, resi)
+        if row is None:
+            return None
+        no_ligand = np.isnan(self.distance[row])
+        return {'N_atoms': int(self.n_atoms[row]),
+                'SASA': float(self.sasa[row]),
+                'SASA_sidechain': float(self.sasa_sidechain[row]),
+                'SS': str(self.ss[row]),
+                'neighbours': self.get_neighbours(row),
+                'closest_ligand': None if no_ligand else str(self.closest[row]),
+                'distance_to_closest_ligand': None if no_ligand else float(self.distance[row])}
+
+    ############################## computation
+
+    @classmethod
+    def compute(cls, session: Dict, coordinates: str, code: str = '', name: str = 'myprotein') -> 'ResidueTable':
+        """
+        :param session: as returned by ``StructureAnalyser.load_session`` (coordinates loaded, hydrogens added)
+        :param coordinates: the PDB block loaded (for the ligands)
+        :param code: for the ligand catalog
+        """
+        cmd = session['pymol'].cmd
+        cmd.set('dot_solvent', 1)
+        cmd.set('dot_density', 3)
+        cmd.get_area(name, load_b=1)  # per atom areas in b.
+        space = {'atoms': []}
+        cmd.iterate(name, "atoms.append((index, chain, resi, resn, name, b, ss))", space=space)
+        rows = {}  # (chain, resi) -> row
+        atom_rows = {}  # index -> row
+        chain, resi, resn, sasa, sidechain, ss, first = [], [], [], [], [], [], []
+        for index, atom_chain, atom_resi, atom_resn, atom_name, area, atom_ss in space['atoms']:
+            key = (atom_chain, atom_resi)
+            if key not in rows:
+                rows[key] = len(chain)
+                chain.append(atom_chain)
+                resi.append(atom_resi)
+                resn.append(atom_resn)
+                sasa.append(0.)
+                sidechain.append(0.)
+                ss.append('?')
+            row = rows[key]
+            atom_rows[index] = row
+            sasa[row] += area
+            if atom_name == 'CA':
+                ss[row] = atom_ss
+            if (atom_resn == 'GLY' and atom_name == 'CA') or (atom_resn != 'GLY' and atom_name not in cls.backbone):
+                sidechain[row] += area
+        # neighbours
+        neighbours = [set() for i in range(len(chain))]
+        for (model_a, index_a), (model_b, index_b) in cmd.find_pairs(name, name, cutoff=cls.neighbour_distance):
+            a, b = atom_rows[index_a], atom_rows[index_b]
+            if a != b:
+                neighbours[a].add(b)
+                neighbours[b].add(a)
+        has_ca = [s != '?' for s in ss]
+        offsets = np.zeros(len(chain) + 1, dtype='i4')
+        flat = []
+        for row, found in enumerate(neighbours):
+            flat.extend(sorted(i for i in found if has_ca[i]))
+            offsets[row + 1] = len(flat)
+        closest, distance = cls._compute_ligand_distances(coordinates, code, rows)
+        counts = session['atom_counts']
+        return cls({'chain': np.array(chain, dtype='U4'),
+                    'resi': np.array(resi, dtype='U8'),
+                    'resn': np.array(resn, dtype='U4'),
+                    'n_atoms': np.array([counts.get(key, 0) for key in zip(chain, resi)], dtype='i4'),
+                    'sasa': np.array(sasa, dtype='f4'),
+                    'sasa_sidechain': np.array(sidechain, dtype='f4'),
+                    'ss': np.array(ss, dtype='U1'),
+                    'neighbour_offsets': offsets,
+                    'neighbours': np.array(flat, dtype='i4'),
+                    'closest': closest,
+                    'distance': distance})
+
+    @staticmethod
+    def _compute_ligand_distances(coordinates: str, code: str, rows: Dict[Tuple[str, str], int],
+                                  chunk: int = 4096) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Closest ligand atom (label as ``LigandInventory.get_closest``) to each residue (heavy atoms, no insertion code).
+        """
+        closest = np.full(len(rows), '', dtype='U32')
+        distance = np.full(len(rows), np.nan, dtype='f4')
+        ligands = LigandInventory.get(code, coordinates).atoms
+        if len(ligands) == 0:
+            return closest, distance
+        atoms = pdb_to_atoms(coordinates)
+        atoms = atoms[atoms.icode == '']
+        nearest = np.empty(len(atoms), dtype='i4')
+        nearest_distance = np.empty(len(atoms), dtype='f4')
+        for start in range(0, len(atoms), chunk):
+            d = np.linalg.norm(atoms.xyz[start:start + chunk, None, :] - ligands.xyz[None, :, :], axis=2)
+            nearest[start:start + chunk] = d.argmin(axis=1)
+            nearest_distance[start:start + chunk] = d.min(axis=1)
+        distance[:] = 99999
+        for i, (atom_chain, atom_resi) in enumerate(zip(atoms.chain, atoms.resi)):
+            row = rows.get((str(atom_chain), str(atom_resi)))
+            if row is not None and nearest_distance[i] < distance[row]:
+                distance[row] = nearest_distance[i]
+                ligand = ligands[nearest[i]]
+                closest[row] = f'[{ligand.resn}]{ligand.resi}{ligand.icode}.{ligand.name}:{ligand.chain}'
+        return closest, distance
+
+    ############################## store
+
+    @classmethod
+    def get_folder(cls) -> str:
+        if cls._folder is None:
+            cls._folder = os.path.join(cls.settings.temp_folder, cls.subfolder)
+        if not os.path.exists(cls._folder):
+            os.makedirs(cls._folder, exist_ok=True)
+        return cls._folder
+
+    @classmethod
+    def get_path(cls, coordinates: str) -> str:
+        return os.path.join(cls.get_folder(), hashlib.sha1(coordinates.encode()).hexdigest() + '.npz')
+
+    @classmethod
+    def get(cls, coordinates: str) -> Optional['ResidueTable']:
+        """
+        :return: the precomputed table of the coordinates (memory or disk) or None.
+        """
+        path = cls.get_path(coordinates)
+        if path in cls._memory:
+            return cls._memory[path]
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            table = cls({field: data[field] for field in cls.fields})
+        cls._remember(path, table)
+        return table
+
+    @classmethod
+    def _remember(cls, path: str, table: 'ResidueTable'):
+        with cls._lock:
+            if len(cls._memory) >= cls.memory_size:
+                cls._memory.clear()
+            cls._memory[path] = table
+
+    def save(self, coordinates: str):
+        path = self.get_path(coordinates)
+        temp = f'{path}.{os.getpid()}.tmp.npz'  # numpy adds .npz if missing.
+        np.savez_compressed(temp, **{field: getattr(self, field) for field in self.fields})
+        os.replace(temp, path)
+        self._remember(path, self)
@@ -0,0 +1,47 @@
+__doc__ = """
+Parsed, array-backed coordinates. A numpy record array with a row per atom, so geometry can be done without
+reparsing the PDB block in PyMOL, pyrosetta or the transpiler.
+
+    >>> atoms = structure.atoms  # generated once from structure.coordinates
+    >>> ca = atoms[(atoms.chain == 'A') & (atoms.name == 'CA')]
+    >>> ca.xyz.mean(axis=0)
+    >>> save_atoms(atoms, 'model.npz'); load_atoms('model.npz')
+"""
+
+import numpy as np
+from .pdb_parser import iter_atoms
+
+atom_dtype = np.dtype([('hetero', '?'),
+                       ('serial', 'i4'),
+                       ('name', 'U4'),
+                       ('altloc', 'U1'),
+                       ('resn', 'U3'),
+                       ('chain', 'U4'),
+                       ('resi', 'i4'),
+                       ('icode', 'U1'),
+                       ('xyz', 'f4', (3,)),
+                       ('occupancy', 'f4'),
+                       ('b', 'f4'),
+                       ('element', 'U2')])
+
+
+def pdb_to_atoms(pdbblock: str) -> np.recarray:
+    """
+    :param pdbblock: PDB block (first model only is read)
+    :return: record array of dtype ``atom_dtype``
+    """
+    rows = [(record == 'HETATM', serial, name, altloc, resn, chain, resi, icode, (x, y, z), occupancy, b, element)
+            for record, serial, name, altloc, resn, chain, resi, icode, x, y, z, occupancy, b, element in iter_atoms(pdbblock)]
+    return np.array(rows, dtype=atom_dtype).view(np.recarray)
+
+
+def save_atoms(atoms: np.ndarray, file: str):
+    """
+    Saves to a compressed .npz (numpy adds the extension if missing).
+    """
+    np.savez_compressed(file, atoms=np.asarray(atoms))
+
+
+def load_atoms(file: str) -> np.recarray:
+    with np.load(file, allow_pickle=False) as data:
+        return data['atoms'].view(np.recarray)
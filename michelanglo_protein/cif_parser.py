@@ -0,0 +1,276 @@
+__doc__ = """
+mmCIF and BinaryCIF readers for the entries that have no legacy PDB file (large assemblies) or are too big for it to be sensible.
+They yield the same atom tuples as ``pdb_parser.iter_atoms`` (author numbering and chains, first model only)
+and ``atoms_to_pdb`` writes these as the PDB block the rest of the module (transpiler, PyMOL, pyrosetta) expects.
+
+    >>> pdbblock, aliases = cif_to_pdb(response.iter_lines(decode_unicode=True), chains=['A', 'B'])
+    >>> pdbblock, aliases = bcif_to_pdb(response.content, chains=['A'])
+
+* mmCIF is read line by line, so a download can be parsed as it streams and only the chosen chains are kept.
+* BinaryCIF is column-wise. The columns are decoded with numpy and the rows filtered before making tuples.
+  It requires ``msgpack``, which is optional.
+* Chain identifiers longer than a character (big assemblies) do not fit in a PDB file:
+  they are given free single letters and the renaming is returned (``aliases``, original -> new).
+"""
+
+import re
+from typing import Iterator, Iterable, Optional, Tuple, List, Dict
+import numpy as np
+from .pdb_parser import Atom
+
+try:
+    import msgpack
+except ModuleNotFoundError:
+    msgpack = None
+
+_token = re.compile(r"""'(.*?)'(?=\s|$)|"(.*?)"(?=\s|$)|(\S+)""")
+
+
+def _tokenize(line: str) -> List[str]:
+    return [a or b or c for a, b, c in _token.findall(line)]
+
+
+def _null(value: str) -> bool:
+    return value in ('.', '?')
+
+
+def _make_atom(row: Dict[str, str]) -> Atom:
+    """
+    :param row: column name (without ``_atom_site.``) -> value
+    """
+
+    def get(*names, default=''):
+        for name in names:
+            value = row.get(name)
+            if value is not None and not _null(value):
+                return value
+        return default
+
+    return (get('group_PDB', default='ATOM'),
+            int(get('id', default='0')),
+            get('auth_atom_id', 'label_atom_id'),
+            get('label_alt_id'),
+            get('auth_comp_id', 'label_comp_id'),
+            get('auth_asym_id', 'label_asym_id'),
+            int(get('auth_seq_id', 'label_seq_id', default='0')),
+            get('pdbx_PDB_ins_code'),
+            float(row['Cartn_x']),
+            float(row['Cartn_y']),
+            float(row['Cartn_z']),
+            float(get('occupancy', default='1')),
+            float(get('B_iso_or_equiv', default='0')),
+            get('type_symbol').upper())
+
+
+def iter_cif_atoms(lines: Iterable[str], chains: Optional[Iterable[str]] = None) -> Iterator[Atom]:
+    """
+    Yields the atoms of the first model of an mmCIF, reading the ``_atom_site`` loop as it comes.
+
+    :param lines: str of the whole file or any iterable of lines (file handle, ``response.iter_lines(decode_unicode=True)``)
+    :param chains: only these author chain ids (None: all)
+    """
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+    if chains is not None:
+        chains = set(chains)
+    columns = []
+    in_loop = False
+    in_text = False
+    tokens = []
+    model = None
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode()
+        if line.startswith(';'):  # multiline text field. never within _atom_site
+            in_text = not in_text
+            continue
+        elif in_text:
+            continue
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped == 'loop_':
+            if columns:
+                break  # _atom_site is over.
+            in_loop = True
+            continue
+        if stripped.startswith('_atom_site.') and in_loop:
+            columns.append(stripped.split()[0][len('_atom_site.'):])
+            continue
+        if not columns:
+            if stripped[0] == '_' or stripped[0] == '#' or stripped.startswith('data_'):
+                in_loop = False
+            continue
+        if stripped[0] in ('_', '#') or stripped.startswith('loop_') or stripped.startswith('data_'):
+            break  # end of the _atom_site rows.
+        tokens.extend(_tokenize(stripped))
+        if len(tokens) < len(columns):
+            continue  # row spans lines.
+        row = dict(zip(columns, tokens))
+        tokens = []
+        number = row.get('pdbx_PDB_model_num')
+        if model is None:
+            model = number
+        elif number != model:
+            break
+        chain = row.get('auth_asym_id', row.get('label_asym_id'))
+        if chains is not None and chain not in chains:
+            continue
+        yield _make_atom(row)
+
+
+## BinaryCIF. see https://github.com/molstar/BinaryCIF/blob/master/encoding.md
+_bcif_types = {1: '<i1', 2: '<i2', 3: '<i4', 4: '<u1', 5: '<u2', 6: '<u4', 32: '<f4', 33: '<f8'}
+
+
+def _integer_unpack(data: np.ndarray, encoding: Dict) -> np.ndarray:
+    if encoding['isUnsigned']:
+        upper = 0xFF if encoding['byteCount'] == 1 else 0xFFFF
+        lower = upper  # only one limit when unsigned.
+    else:
+        upper = 0x7F if encoding['byteCount'] == 1 else 0x7FFF
+        lower = -upper - 1
+    data = data.astype(np.int64)
+    ends = (data != upper) & (data != lower)
+    if ends.all():
+        return data
+    starts = np.flatnonzero(np.concatenate([[True], ends[:-1]]))
+    return np.add.reduceat(data, starts)
+
+
+def _decode(data, encodings: List[Dict]):
+    """
+    Undoes the encodings, last first.
+    """
+    for encoding in reversed(encodings):
+        kind = encoding['kind']
+        if kind == 'ByteArray':
+            data = np.frombuffer(data, dtype=_bcif_types[encoding['type']])
+        elif kind == 'FixedPoint':
+            data = np.asarray(data, dtype=np.float64) / encoding['factor']
+        elif kind == 'IntervalQuantization':
+            step = (encoding['max'] - encoding['min']) / (encoding['numSteps'] - 1)
+            data = encoding['min'] + np.asarray(data, dtype=np.float64) * step
+        elif kind == 'RunLength':
+            data = np.asarray(data)
+            data = np.repeat(data[0::2], data[1::2])
+        elif kind == 'Delta':
+            data = np.asarray(data, dtype=np.int64).copy()
+            if len(data):
+                data[0] += encoding['origin']
+            data = np.cumsum(data)
+        elif kind == 'IntegerPacking':
+            data = _integer_unpack(np.asarray(data), encoding)
+        elif kind == 'StringArray':
+            offsets = _decode(encoding['offsets'], encoding['offsetEncoding'])
+            indices = _decode(data, encoding['dataEncoding'])
+            text = encoding['stringData']
+            strings = np.array([text[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)] + [''], dtype=object)
+            data = strings[np.asarray(indices, dtype=np.int64)]  # -1 is the '' appended.
+        else:
+            raise ValueError(f'Unknown BinaryCIF encoding {kind}')
+    return data
+
+
+def _decode_column(column: Dict) -> np.ndarray:
+    values = np.asarray(_decode(column['data']['data'], column['data']['encoding']))
+    mask = column.get('mask')
+    if mask:
+        mask = np.asarray(_decode(mask['data'], mask['encoding']))
+        values = values.astype(object)
+        values[mask != 0] = None
+    return values
+
+
+def iter_bcif_atoms(data: Dict, chains: Optional[Iterable[str]] = None) -> Iterator[Atom]:
+    """
+    Yields the atoms of the first model of an unpacked BinaryCIF.
+
+    :param data: ``msgpack.unpackb(content, raw=False)``
+    :param chains: only these author chain ids (None: all)
+    """
+    category = next((category for block in data['dataBlocks'] for category in block['categories']
+                     if category['name'] == '_atom_site'), None)
+    if category is None:
+        return
+    columns = {column['name']: column for column in category['columns']}
+    decoded = {}
+
+    def get(*names, default=None):
+        for name in names:
+            if name in columns:
+                if name not in decoded:
+                    decoded[name] = _decode_column(columns[name])
+                return decoded[name]
+        return np.full(category['rowCount'], default, dtype=object)
+
+    chain_ids = get('auth_asym_id', 'label_asym_id')
+    selected = np.ones(category['rowCount'], dtype=bool)
+    models = get('pdbx_PDB_model_num')
+    if models[0] is not None:
+        selected &= models == models[0]
+    if chains is not None:
+        selected &= np.isin(chain_ids.astype(str), list(chains))
+    rows = np.flatnonzero(selected)
+    fields = (get('group_PDB', default='ATOM'), get('id', default=0), get('auth_atom_id', 'label_atom_id', default=''),
+              get('label_alt_id', default=''), get('auth_comp_id', 'label_comp_id', default=''), chain_ids,
+              get('auth_seq_id', 'label_seq_id', default=0), get('pdbx_PDB_ins_code', default=''),
+              get('Cartn_x'), get('Cartn_y'), get('Cartn_z'), get('occupancy', default=1.),
+              get('B_iso_or_equiv', default=0.), get('type_symbol', default=''))
+    for i in rows:
+        record, serial, name, altloc, resn, chain, resi, icode, x, y, z, occupancy, b, element = (f[i] for f in fields)
+        yield (record or 'ATOM', int(serial or 0), name or '', altloc or '', resn or '', chain or '', int(resi or 0),
+               icode or '', float(x), float(y), float(z),
+               1. if occupancy is None else float(occupancy), 0. if b is None else float(b), (element or '').upper())
+
+
+def format_atom_line(atom: Atom) -> str:
+    record, serial, name, altloc, resn, chain, resi, icode, x, y, z, occupancy, b, element = atom
+    padded = name if len(name) >= 4 or len(element) == 2 else ' ' + name
+    return (f'{record:<6}{serial % 100000:>5} {padded:<4}{altloc[:1]:1}{resn:>3} {chain[:1]:1}{resi:>4}{icode[:1]:1}   '
+            f'{x:8.3f}{y:8.3f}{z:8.3f}{occupancy:6.2f}{b:6.2f}          {element:>2}')
+
+
+def atoms_to_pdb(atoms: Iterable[Atom]) -> Tuple[str, Dict[str, str]]:
+    """
+    :param atoms: atom tuples
+    :return: PDB block, chain aliases (chain ids longer than one letter -> the letter used)
+    """
+    atoms = list(atoms)
+    used = {atom[5] for atom in atoms if len(atom[5]) == 1}
+    free = (letter for letter in 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789' if letter not in used)
+    aliases = {}
+    lines = []
+    previous = None
+    for atom in atoms:
+        chain = atom[5]
+        if len(chain) > 1:
+            if chain not in aliases:
+                aliases[chain] = next(free, chain[0])
+            atom = atom[:5] + (aliases[chain],) + atom[6:]
+        if previous is not None and atom[5] != previous:
+            lines.append('TER')
+        previous = atom[5]
+        lines.append(format_atom_line(atom))
+    lines.append('END')
+    return '\n'.join(lines) + '\n', aliases
+
+
+def cif_to_pdb(lines: Iterable[str], chains: Optional[Iterable[str]] = None) -> Tuple[str, Dict[str, str]]:
+    """
+    :param lines: mmCIF as str or iterable of lines
+    :param chains: only these author chain ids (None: all)
+    :return: PDB block, chain aliases
+    """
+    return atoms_to_pdb(iter_cif_atoms(lines, chains))
+
+
+def bcif_to_pdb(content: bytes, chains: Optional[Iterable[str]] = None) -> Tuple[str, Dict[str, str]]:
+    """
+    :param content: BinaryCIF bytes
+    :param chains: only these author chain ids (None: all)
+    :return: PDB block, chain aliases
+    """
+    if msgpack is None:
+        raise ModuleNotFoundError('BinaryCIF requires msgpack (pip install msgpack)')
+    return atoms_to_pdb(iter_bcif_atoms(msgpack.unpackb(content, raw=False), chains))
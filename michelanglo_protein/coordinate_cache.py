@@ -0,0 +1,179 @@
+__doc__ = """
+Local cache of the coordinates fetched by ``Structure.get_coordinates`` (RCSB, SWISS-MODEL and www).
+
+Each entry is keyed by ``(type, code or url)``, the key is hashed to give the filename and the PDB block is gzipped.
+
+* LRU eviction: the access time of a file is set on every read and the least recently read files go first once ``max_size`` (bytes on disk) is exceeded.
+* TTL: the modification time is the fetch time. Entries older than ``ttl`` seconds are refetched (``ttl=None`` never expires).
+* offline: serve only from the cache (expired entries included), never fetch.
+
+    >>> Structure.coordinate_cache.offline = True
+    >>> Structure.coordinate_cache.max_size = 5e9
+
+The URL templates are on ``Structure`` (``.rcsb_url``) so a local HTTP server can stand in for RCSB.
+"""
+
+import os, gzip, hashlib, time
+from threading import Lock
+from typing import Optional, Callable
+from warnings import warn
+import requests
+from .settings_handler import global_settings  # the instance not the class.
+
+
+class CoordinateCache:
+    settings = global_settings
+
+    def __init__(self, folder: Optional[str] = None, max_size: float = 2e9, ttl: Optional[float] = 30 * 24 * 3600,
+                 offline: bool = False, enabled: bool = True):
+        """
+        :param folder: defaults to ``coordinates`` in the temp folder (decided at first use as settings may not be started).
+        :param max_size: bytes on disk before evicting.
+        :param ttl: seconds before an entry is refetched. None for never.
+        :param offline: only serve from cache.
+        :param enabled: if False it fetches every time (old behaviour) and stores nothing.
+        """
+        self._folder = folder
+        self.max_size = max_size
+        self.ttl = ttl
+        self.offline = offline
+        self.enabled = enabled
+        self._size = None  # bytes on disk. computed at first put.
+        self._lock = Lock()
+        self.session = requests.Session()  # pools connections to the same host.
+
+    @property
+    def folder(self) -> str:
+        if self._folder is None:
+            self._folder = os.path.join(self.settings.temp_folder, 'coordinates')
+        if not os.path.exists(self._folder):
+            os.makedirs(self._folder, exist_ok=True)
+        return self._folder
+
+    @folder.setter
+    def folder(self, folder: str):
+        self._folder = folder
+        self._size = None
+
+    @staticmethod
+    def get_key(kind: str, reference: str) -> str:
+        """
+        :param kind: Structure.type. rcsb | swissmodel | www
+        :param reference: code or url
+        :return: hex digest used as filename
+        """
+        return hashlib.sha1(f'{kind.lower()}:{reference}'.encode()).hexdigest()
+
+    def get_path(self, kind: str, reference: str) -> str:
+        return os.path.join(self.folder, self.get_key(kind, reference) + '.pdb.gz')
+
+    def is_fresh(self, path: str) -> bool:
+        if self.ttl is None:
+            return True
+        return time.time() - os.stat(path).st_mtime < self.ttl
+
+    def get(self, kind: str, reference: str, allow_stale: bool = False) -> Optional[str]:
+        """
+        :return: PDB block or None if absent (or expired and not allow_stale)
+        """
+        path = self.get_path(kind, reference)
+        if not os.path.exists(path):
+            return None
+        elif not allow_stale and not self.is_fresh(path):
+            return None
+        try:
+            with gzip.open(path, 'rt') as fh:
+                coordinates = fh.read()
+        except (OSError, EOFError):  # truncated by a crash. the write is atomic, but still.
+            warn(f'Corrupt cached coordinates {path} removed')
+            self._remove(path)
+            return None
+        os.utime(path, (time.time(), os.stat(path).st_mtime))  # atime = last read, mtime = fetched.
+        return coordinates
+
+    def put(self, kind: str, reference: str, coordinates: str) -> str:
+        """
+        Stores the coordinates. Writes to a temporary file and renames so readers never see half a file.
+
+        :return: path
+        """
+        path = self.get_path(kind, reference)
+        temp = f'{path}.{os.getpid()}.{id(self)}.tmp'
+        with gzip.open(temp, 'wt') as fh:
+            fh.write(coordinates)
+        with self._lock:
+            if self._size is None:
+                self._size = self.get_size()
+            if os.path.exists(path):  # replaced (e.g. expired): not counted twice.
+                self._size -= os.stat(path).st_size
+            os.replace(temp, path)
+            self._size += os.stat(path).st_size
+            if self._size > self.max_size:
+                self._evict()
+        return path
+
+    def fetch(self, kind: str, reference: str, url: str, getter: Optional[Callable] = None,
+              parser: Optional[Callable] = None) -> Optional[str]:
+        """
+        Get from cache or from the url.
+
+        :param kind: Structure.type
+        :param reference: code or url
+        :param url: where to get it.
+        :param getter: function that given a url returns a ``requests.Response``. Default: ``.session.get``
+        :param parser: function that given the (streamed) ``requests.Response`` returns the PDB block, e.g. from mmCIF.
+            Default: the text of the response.
+        :return: PDB block or None if it failed (or offline and not cached).
+        """
+        if not self.enabled:
+            return self._download(url, getter, parser)
+        coordinates = self.get(kind, reference, allow_stale=self.offline)
+        if coordinates is not None:
+            return coordinates
+        elif self.offline:
+            warn(f'Offline mode: {kind} {reference} is not cached.')
+            return None
+        coordinates = self._download(url, getter, parser)
+        if coordinates is not None:
+            self.put(kind, reference, coordinates)
+        return coordinates
+
+    def _download(self, url: str, getter: Optional[Callable] = None, parser: Optional[Callable] = None) -> Optional[str]:
+        if getter is None:
+            getter = self.session.get
+        if parser is None:
+            r = getter(url, allow_redirects=True)
+            return r.text if r.status_code == 200 else None
+        r = getter(url, allow_redirects=True, stream=True)
+        with r:
+            return parser(r) if r.status_code == 200 else None
+
+    def get_size(self) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(self.folder) if entry.name.endswith('.pdb.gz'))
+
+    def _remove(self, path: str):
+        try:
+            size = os.stat(path).st_size
+            os.remove(path)
+            if self._size is not None:
+                self._size -= size
+        except FileNotFoundError:  # another process got there first.
+            pass
+
+    def _evict(self):
+        """
+        Removes the least recently read files until under 90% of ``max_size``. Call within lock.
+        """
+        entries = sorted((entry for entry in os.scandir(self.folder) if entry.name.endswith('.pdb.gz')),
+                         key=lambda entry: entry.stat().st_atime)
+        for entry in entries:
+            if self._size <= self.max_size * 0.9:
+                break
+            self._remove(entry.path)
+
+    def clear(self):
+        with self._lock:
+            for entry in os.scandir(self.folder):
+                if entry.name.endswith('.pdb.gz'):
+                    os.remove(entry.path)
+            self._size = 0
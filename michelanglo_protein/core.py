@@ -5,9 +5,13 @@ from collections import namedtuple
 import gzip
 from .structure import Structure
 from .gnomad_variant import Variant
+from .model_coverage import ModelCoverage
+from .elm_index import ElmIndex
+from .feature_index import FeatureIndex
+from .gnomad_index import GnomADIndex
 
 from warnings import warn
-from typing import Dict
+from typing import Dict, List, Tuple
 
 
 class ProteinCore:
@@ -100,6 +104,10 @@ class ProteinCore:
         self.pdb_matches =[] #{'match': align.title[0:50], 'match_score': hsp.score, 'match_start': hsp.query_start, 'match_length': hsp.align_length, 'match_identity': hsp.identities / hsp.align_length}
         self.swissmodel = [] #parse_swissmodel() fills it.
         self.percent_modelled = -1
+        self.model_coverage = None  # ModelCoverage. see self.get_model_coverage()
+        self.elm_index = None  # ElmIndex. see self.get_elm_index()
+        self.feature_index = None  # FeatureIndex. see self.get_feature_index()
+        self.gnomAD_index = None  # GnomADIndex. see self.get_gnomAD_index()
         ### junk
         self.other = other ### this is a garbage bin. But a handy one.
         self.logbook = [] # debug purposes only. See self.log()
@@ -242,6 +250,57 @@ class ProteinCore:
         else:
             return self.uniprot
 
+    def get_model_coverage(self, refresh: bool = False) -> ModelCoverage:
+        """
+        The table of best model per residue. Built if absent (older pickles) or if the models have changed.
+        """
+        if refresh or self.model_coverage is None or not self.model_coverage.is_current(self):
+            self.model_coverage = ModelCoverage(self)
+        return self.model_coverage
+
+    def get_best_model_at(self, position: int) -> Structure:
+        """
+        The best model covering the position (see ``ModelCoverage`` for the ranking) or None.
+        """
+        return self.get_model_coverage().get_best(self, position)
+
+    def get_elm_index(self, refresh: bool = False) -> ElmIndex:
+        """
+        The wild type ELM motif matches of the sequence. Made at generation. Remade if the ELM release changed.
+        """
+        if refresh or self.elm_index is None or not self.elm_index.is_current():
+            self.elm_index = ElmIndex(self.sequence)
+        return self.elm_index
+
+    def get_feature_index(self, refresh: bool = False) -> FeatureIndex:
+        """
+        The interval index of the features and the gnomAD tallies per residue.
+        Built if absent (older pickles) or if the features or gnomAD variants have changed.
+        """
+        if refresh or self.feature_index is None or not self.feature_index.is_current(self):
+            self.feature_index = FeatureIndex(self)
+        return self.feature_index
+
+    def get_gnomAD_index(self, refresh: bool = False) -> GnomADIndex:
+        """
+        The gnomAD variants deduplicated and sorted by position. Built if absent (older pickles) or if gnomAD has changed.
+        """
+        if refresh or self.gnomAD_index is None or not self.gnomAD_index.is_current(self.gnomAD):
+            self.gnomAD_index = GnomADIndex(self.gnomAD)
+        return self.gnomAD_index
+
+    def get_gnomAD_in_elm(self, identifier: str = '', variant_type: str = 'missense') -> List[Tuple[str, Variant]]:
+        """
+        gnomAD variants that fall in an ELM motif.
+
+        :param identifier: start of the ELMIdentifier, e.g. LIG_SH3. '' for all.
+        :param variant_type: missense | nonsense | other | None for all
+        :return: list of (ELMIdentifier, Variant)
+        """
+        index = self.get_elm_index()
+        return [(name, variant) for variant in self.gnomAD if variant_type is None or variant.type == variant_type
+                for name in index.get_identifiers(variant.x, variant.y) if name.startswith(identifier)]
+
     def complete(self):
         """
         Make sure that all subthreads are complete. Not used for Core!
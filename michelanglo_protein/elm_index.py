@@ -0,0 +1,218 @@
+__doc__ = """
+ELM linear motifs.
+
+``ElmEngine`` loads the ELM classes (``elm_classes.tsv``) and compiles their regexes once per process, shared across threads.
+
+``ElmIndex`` records every wild type match (class, start, end) of a protein's sequence, sorted by start.
+It is made at generation (``ProteinCore.get_elm_index``) and stored with the protein as ``.elm_index``, so
+
+* ``ProteinAnalyser.check_elm`` only reruns the patterns on the mutant sequence around the residue and
+  diffs the matches overlapping it against the stored ones: kept, lost or gained.
+* which motifs overlap a position (say a gnomAD missense) is a bisection: ``.get_overlapping(x, y)``.
+
+An index made with a different ELM release (``signature``) is not used.
+Positions are as in ``Mutation.elm``: x is the 1-based start, y is the 1-based end plus one.
+"""
+
+import re, hashlib
+from array import array
+from bisect import bisect_left, bisect_right
+from threading import Lock
+from typing import List, Tuple, Dict, Optional
+from .settings_handler import global_settings  # the instance not the class.
+
+
+class ElmEngine:
+    settings = global_settings
+    header = ("Accession", "ELMIdentifier", "FunctionalSiteName", "Description", "Regex", "Probability",
+              "#Instances", "#Instances_in_PDB")
+    _data = []
+    _patterns = []  #: list of (ELM record, compiled regex)
+    _signature = None
+    _lock = Lock()
+
+    @classmethod
+    def get_data(cls) -> List[dict]:
+        if not len(cls._data):
+            with cls._lock:
+                if not len(cls._data):  # another thread may have got there first.
+                    data = []
+                    with cls.settings.open('elm', retrieve=False) as fh:  # no prompt on the server
+                        for line in fh:
+                            if line[0] == '#':
+                                continue
+                            if "Accession" in line:
+                                continue
+                            data.append(dict(zip(cls.header, line.replace('"', '').split('\t'))))
+                    cls._data = data
+        return cls._data
+
+    @classmethod
+    def set_data(cls, data: List[dict]):
+        """
+        Replaces the ELM classes (say a subset or a newer release). Recompiles.
+        """
+        with cls._lock:
+            cls._data = list(data)
+            cls._patterns = []
+            cls._signature = None
+
+    @classmethod
+    def get_patterns(cls) -> List[Tuple[dict, 're.Pattern']]:
+        """
+        The ELM regexes compiled once. ``re`` caches far fewer patterns than there are ELM classes.
+        """
+        if not len(cls._patterns):
+            data = cls.get_data()
+            with cls._lock:
+                if not len(cls._patterns):
+                    cls._patterns = [(r, re.compile(r['Regex'])) for r in data]
+        return cls._patterns
+
+    @classmethod
+    def get_signature(cls) -> str:
+        """
+        Identifies the ELM release: an index is only valid for the patterns it was made with.
+        """
+        if cls._signature is None:
+            cls._signature = hashlib.sha1('\n'.join(r['Regex'] for r in cls.get_data()).encode()).hexdigest()
+        return cls._signature
+
+
+class ElmIndex:
+    margin = 30  #: residues either side of a mutation rescanned. Longer motifs are cut.
+
+    def __init__(self, sequence: str):
+        """
+        Scans the whole sequence with every pattern of ``ElmEngine``.
+        Every start with a match is recorded (overlapping matches of a class included).
+        """
+        self.signature = ElmEngine.get_signature()
+        self.length = len(sequence)
+        matches = []
+        for i, (record, rex) in enumerate(ElmEngine.get_patterns()):
+            matches.extend((start, end, i) for start, end in self._iter_matches(rex, sequence))
+        matches.sort()
+        self.starts = array('i', [m[0] for m in matches])  # 0-based
+        self.ends = array('i', [m[1] for m in matches])  # 0-based, exclusive
+        self.classes = array('i', [m[2] for m in matches])  # index in ElmEngine.get_patterns()
+        self.max_length = max((end - start for start, end, i in matches), default=0)
+
+    @staticmethod
+    def _iter_matches(rex: 're.Pattern', sequence: str, start: int = 0, stop: Optional[int] = None):
+        """
+        (start, end) of the leftmost match at each start. Empty matches are skipped.
+        """
+        position = start
+        while True:
+            found = rex.search(sequence, position)
+            if not found or (stop is not None and found.start() >= stop):
+                return
+            if found.end() > found.start():
+                yield found.start(), found.end()
+            position = found.start() + 1
+
+    def is_current(self) -> bool:
+        return self.signature == ElmEngine.get_signature()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def get_overlapping(self, x: int, y: Optional[int] = None) -> List[Tuple[int, int, int]]:
+        """
+        :param x: first residue (1-based)
+        :param y: last residue (1-based, inclusive). Default: x
+        :return: list of (x, y, class index) as in the module docstring.
+        """
+        if y is None:
+            y = x
+        first = bisect_left(self.starts, x - 1 - self.max_length)
+        last = bisect_right(self.starts, y - 1)
+        return [(self.starts[i] + 1, self.ends[i] + 1, self.classes[i]) for i in range(first, last)
+                if self.ends[i] > x - 1]
+
+    def get_delta(self, sequence: str, position: int, to_residue: str) -> List[Dict]:
+        """
+        Motifs overlapping the residue that are kept, lost or gained with the substitution.
+
+        :param sequence: wild type sequence (the one indexed)
+        :param position: 1-based
+        :param to_residue: one letter
+        :return: list of dict with name, description, regex, probability, x, y, status (as ``Mutation.elm``)
+        """
+        begin, end = self._get_window(len(sequence), position)
+        wild = {}
+        for x, y, i in self.get_overlapping(position):
+            if x - 1 >= begin and y - 1 <= end:  # longer motifs are cut, as in the rescan of the mutant.
+                wild.setdefault(i, (x, y))  # leftmost per class
+        return self._diff(wild, sequence, position, to_residue)
+
+    @classmethod
+    def scan_delta(cls, sequence: str, position: int, to_residue: str) -> List[Dict]:
+        """
+        As ``.get_delta`` for a protein without index: the wild type is scanned around the residue like the mutant.
+        """
+        return cls._diff(cls._scan_overlapping(sequence, position), sequence, position, to_residue)
+
+    @classmethod
+    def _get_window(cls, length: int, position: int) -> Tuple[int, int]:
+        """
+        The stretch within ``margin`` residues of the position: 0-based start and exclusive end.
+        """
+        return max(0, position - 1 - cls.margin), min(length, position + cls.margin)
+
+    @classmethod
+    def _scan_overlapping(cls, sequence: str, position: int) -> Dict[int, Tuple[int, int]]:
+        """
+        Leftmost match per class overlapping the residue, within ``margin`` residues of it.
+        The window is padded so ^ and $ only match at the real ends.
+
+        :return: class index -> (x, y) as in the module docstring
+        """
+        begin, end = cls._get_window(len(sequence), position)
+        pre = 'X' * 3 if begin > 0 else ''
+        post = 'X' * 3 if end < len(sequence) else ''
+        window = pre + sequence[begin:end] + post
+        offset = begin - len(pre)
+        found = {}
+        for i, (record, rex) in enumerate(ElmEngine.get_patterns()):
+            for start, stop in cls._iter_matches(rex, window, stop=position - offset):
+                if start < len(pre) or stop > len(window) - len(post):
+                    continue  # matched the padding
+                if stop + offset > position - 1:
+                    found[i] = (start + offset + 1, stop + offset + 1)
+                    break
+        return found
+
+    @classmethod
+    def _diff(cls, wild: Dict[int, Tuple[int, int]], sequence: str, position: int, to_residue: str) -> List[Dict]:
+        """
+        :param wild: wild type matches overlapping the residue, class index -> (x, y)
+        """
+        patterns = ElmEngine.get_patterns()
+        # mutant: rescan a window.
+        mutated = cls._scan_overlapping(sequence[:position - 1] + to_residue + sequence[position:], position)
+        results = []
+        for i in sorted(set(wild) | set(mutated)):
+            record = patterns[i][0]
+            if i in wild and i in mutated:
+                (x, y), status = wild[i], 'kept'
+            elif i in wild:
+                (x, y), status = wild[i], 'lost'
+            else:
+                (x, y), status = mutated[i], 'gained'
+            results.append({'name': record['FunctionalSiteName'],
+                            'description': record['Description'],
+                            'regex': record['Regex'],
+                            'probability': float(record['Probability']),
+                            'x': x,
+                            'y': y,
+                            'status': status})
+        return results
+
+    def get_identifiers(self, x: int, y: Optional[int] = None) -> List[str]:
+        """
+        ELMIdentifiers (e.g. LIG_SH3_3) of the motifs overlapping x-y.
+        """
+        patterns = ElmEngine.get_patterns()
+        return sorted({patterns[i][0]['ELMIdentifier'] for start, end, i in self.get_overlapping(x, y)})
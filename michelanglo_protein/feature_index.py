@@ -0,0 +1,138 @@
+__doc__ = """
+Interval index over the features of a protein (``.features``, ``PSP_modified_residues`` included)
+with cumulative counts of gnomAD missenses and nonsenses per residue. Made by ``ProteinCore.get_feature_index``,
+(at generation, after gnomAD and PTMs are added) and stored with the protein, so
+
+* the features overlapping a position ±wobble is a centred interval tree query, O(log n + k), not a loop over all
+  the features (``ProteinAnalyser.get_features_near_position``).
+* the gnomAD missense and nonsense tally of a range is a difference of two prefix sums (``.tally``)
+  instead of a scan of the variants, each retyped by regex, per feature.
+
+An index made from different features or variants (``signature``) is rebuilt.
+"""
+
+import hashlib
+from array import array
+from typing import List, Tuple, Dict, Optional
+
+
+class _Node:
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+    def __init__(self, intervals: List[Tuple[int, int, int]]):
+        """
+        :param intervals: (x, y, ordinal)
+        """
+        ends = sorted(p for x, y, i in intervals for p in (x, y))
+        self.center = ends[len(ends) // 2]
+        here = [interval for interval in intervals if interval[0] <= self.center <= interval[1]]
+        self.by_start = sorted(here)
+        self.by_end = sorted(here, key=lambda interval: -interval[1])
+        left = [interval for interval in intervals if interval[1] < self.center]
+        right = [interval for interval in intervals if interval[0] > self.center]
+        self.left = _Node(left) if left else None
+        self.right = _Node(right) if right else None
+
+
+class FeatureIndex:
+    tallied = ('missense', 'nonsense')  #: ``Variant.type`` values counted
+
+    def __init__(self, protein):
+        """
+        :param protein: ProteinCore or subclass instance
+        """
+        self.signature = self.get_signature(protein)
+        self.entries = []  #: (x, y, feature type, feature dict), in the order of ``.features``
+        for kind, features in protein.features.items():
+            for feature in features:
+                if 'x' in feature:
+                    self.entries.append((int(feature['x']), int(feature['y']), kind, feature))
+                elif 'residue_index' in feature:  # phosphosite plus differs.
+                    self.entries.append((int(feature['residue_index']), int(feature['residue_index']), kind, feature))
+        intervals = [(min(x, y), max(x, y), i) for i, (x, y, kind, feature) in enumerate(self.entries)]
+        self.root = _Node(intervals) if intervals else None
+        # prefix sums of the single residue variants. cumulative[type][i]: variants at positions < i.
+        variants = [(variant.x, variant.y if variant.y is not None else variant.x, variant.type)
+                    for variant in protein.gnomAD if variant.x is not None and variant.x >= 0]
+        length = max([len(protein.sequence)] + [y for x, y, kind in variants])
+        counts = {kind: array('i', [0]) * (length + 2) for kind in self.tallied}
+        self.spanning = []  #: (x, y, type) of the multiresidue variants (few), checked one by one.
+        for x, y, kind in variants:
+            if kind not in counts:
+                continue
+            elif x == y:
+                counts[kind][x + 1] += 1
+            else:
+                self.spanning.append((x, y, kind))
+        for kind in self.tallied:
+            for i in range(1, len(counts[kind])):
+                counts[kind][i] += counts[kind][i - 1]
+        self.cumulative = counts
+
+    @staticmethod
+    def get_signature(protein) -> str:
+        """
+        Hash of the length of the sequence, the (type, x, y) of the features and the (x, y, id, type) of the variants:
+        a feature moved or a re-parsed gnomAD list of the same counts is not taken as the same.
+        sha1, not ``hash``, as the index is pickled and str hashes differ between processes.
+        """
+        digest = hashlib.sha1(f'{len(protein.sequence)}\n'.encode())
+        for kind, features in protein.features.items():
+            for feature in features:
+                x = feature.get('x', feature.get('residue_index'))
+                digest.update(f'{kind}\t{x}\t{feature.get("y", x)}\n'.encode())
+        for variant in protein.gnomAD:
+            digest.update(f'{variant.x}\t{variant.y}\t{variant.id}\t{variant.type}\n'.encode())
+        return digest.hexdigest()
+
+    def is_current(self, protein) -> bool:
+        return self.signature == self.get_signature(protein)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_overlapping(self, x: int, y: Optional[int] = None) -> List[Tuple[int, int, str, dict]]:
+        """
+        :param x: first residue
+        :param y: last residue (inclusive). Default: x
+        :return: the entries (x, y, feature type, feature dict) overlapping x-y, in the order of ``.features``
+        """
+        if y is None:
+            y = x
+        found = []
+        nodes = [self.root] if self.root is not None else []
+        while nodes:
+            node = nodes.pop()
+            if y < node.center:
+                for start, end, i in node.by_start:
+                    if start > y:
+                        break
+                    found.append(i)
+                if node.left is not None:
+                    nodes.append(node.left)
+            elif x > node.center:
+                for start, end, i in node.by_end:
+                    if end < x:
+                        break
+                    found.append(i)
+                if node.right is not None:
+                    nodes.append(node.right)
+            else:
+                found.extend(i for start, end, i in node.by_start)
+                nodes.extend(child for child in (node.left, node.right) if child is not None)
+        return [self.entries[i] for i in sorted(found)]
+
+    def tally(self, x: int, y: int) -> Dict[str, int]:
+        """
+        The gnomAD variants within x-y (both inclusive) by type, as ``ProteinAnalyser._tally_gnomad``.
+        """
+        tally = {}
+        for kind in self.tallied:
+            cumulative = self.cumulative[kind]
+            start = min(max(x, 0), len(cumulative) - 1)
+            stop = min(max(y + 1, 0), len(cumulative) - 1)
+            tally[kind] = cumulative[stop] - cumulative[start] if stop > start else 0
+        for start, end, kind in self.spanning:
+            if x <= start and end <= y:
+                tally[kind] += 1
+        return tally
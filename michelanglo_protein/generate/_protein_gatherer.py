@@ -24,6 +24,7 @@ from ._protein_uniprot_mixin import _UniprotMixin
 from ._protein_base_mixin import _BaseMixin
 from ._protein_disused_mixin import _DisusedMixin
 from ..core import ProteinCore, Variant, Structure
+from ..prefetch import prefetch_structures
 from Bio.SeqUtils import ProtParam, ProtParamData
 
 class ProteinGatherer(ProteinCore, _BaseMixin, _DisusedMixin, _UniprotMixin):
@@ -625,6 +626,7 @@ class ProteinGatherer(ProteinCore, _BaseMixin, _DisusedMixin, _UniprotMixin):
         return self
 
     def get_resolutions(self):
+        # lookup_resolution reads the map shared by all Structure instances, so this is cheap per structure.
         for m in self.pdbs:
             m.lookup_resolution()
         return self
@@ -668,7 +670,8 @@ class ProteinGatherer(ProteinCore, _BaseMixin, _DisusedMixin, _UniprotMixin):
                 return False
         return True
 
-    def get_structures(self):
+    def get_structures(self, concurrency=8):
+        prefetch_structures(self, concurrency=concurrency)  # parallel download into the coordinate cache.
         for model in self.pdbs:
             model.get_coordinates()
         return self
@@ -115,6 +115,8 @@ class ProteomeGatherer:
                 protein.gnomAD = []
                 protein.parse_gnomAD()
                 protein.get_PTM()
+                protein.get_feature_index(refresh=True)
+                protein.get_gnomAD_index(refresh=True)
                 protein.dump()
             except:
                 pass
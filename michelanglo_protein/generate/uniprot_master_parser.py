@@ -12,6 +12,8 @@ from ._protein_gatherer import ProteinGatherer as Protein
 from warnings import warn
 
 from michelanglo_protein.generate.split_gnomAD import gnomAD
+from ..sifts_index import SiftsIndex
+from ..structure import Structure
 
 from collections import defaultdict
 
@@ -144,10 +146,8 @@ class UniprotMasterReader:
         self._lock = Lock()
         idleness = active_count()
         # preload some steps to speed up
-        with Protein.settings.open('resolution') as fh:
-            resolutions = {entry['IDCODE']: float(entry['RESOLUTION']) for entry in json.load(fh) if
-                           entry['RESOLUTION'].strip()}
-        self.resolutions = resolutions
+        Structure.load_resolutions()
+        SiftsIndex.build()  # prot.get_offsets() of every thread reads it.
         ## run
         for entry in self.iter_all():
             Thread(target=self.parse, args=[entry]).start()
@@ -189,12 +189,14 @@ class UniprotMasterReader:
             return None
         #print('getting offsets')
         prot.get_offsets()
-        #.get_resolutions() too slow.
-        self.get_resolutions_for_prot(prot)
+        prot.get_resolutions()
         if prot.organism['common'] == 'Human':
             prot.parse_swissmodel()
             pass
         prot.compute_params()
+        prot.get_model_coverage()
+        prot.get_elm_index()
+        prot.get_feature_index()
         ### dict
         chosen_name = getattr(prot, self.chosen_attribute)
         # update the organism dex
@@ -255,11 +257,5 @@ class UniprotMasterReader:
 
 
     def get_resolutions_for_prot(self, prot):
-        # modified from lookup_resolution
-        for pdb in prot.pdbs:
-            if pdb.type != 'rcsb':
-                pass
-            elif pdb.code in self.resolutions:
-                pdb.resolution = self.resolutions[pdb.code]
-            else:
-                warn(f'No resolution info for {pdb.code}')
+        # formerly a copy of lookup_resolution with a preloaded dict. Structure now has a shared map.
+        prot.get_resolutions()
@@ -0,0 +1,63 @@
+__doc__ = """
+The gnomAD variants of a protein (``.gnomAD``) deduplicated by description (genome and exome calls of the same variant)
+and sorted by position, so the variants at, near or within positions are found by bisection
+(``ProteinAnalyser.get_gnomAD_near_position``, ``.get_gnomAD_in_range`` and ``.annotate_neighbours``).
+Made by ``ProteinCore.get_gnomAD_index`` (at generation, after gnomAD is added) and stored with the protein.
+An index made from a different variant list (``signature``) is rebuilt.
+"""
+
+import hashlib
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List, Optional
+from .gnomad_variant import Variant
+
+
+class GnomADIndex:
+
+    def __init__(self, variants: List[Variant]):
+        self.signature = self.get_signature(variants)
+        unique = {variant.description: variant for variant in variants if variant.x is not None}  # last one wins.
+        self.variants = sorted(unique.values(), key=lambda variant: variant.x)  #: stable: ties as given
+        self.starts = array('i', [variant.x for variant in self.variants])
+        self.ends = array('i', [variant.y if variant.y is not None else variant.x for variant in self.variants])
+        self.max_span = max((end - start for start, end in zip(self.starts, self.ends)), default=0)
+
+    @staticmethod
+    def get_signature(variants: List[Variant]) -> str:
+        """
+        Hash of the (x, y, id) of the variants: a re-parsed list of the same length is not taken as the same.
+        sha1, not ``hash``, as the index is pickled and str hashes differ between processes.
+        """
+        digest = hashlib.sha1()
+        for variant in variants:
+            digest.update(f'{variant.x}\t{variant.y}\t{variant.id}\n'.encode())
+        return digest.hexdigest()
+
+    def is_current(self, variants: List[Variant]) -> bool:
+        return self.signature == self.get_signature(variants)
+
+    def __len__(self):
+        return len(self.variants)
+
+    def get_at(self, position: int) -> List[Variant]:
+        """
+        Variants starting at the position.
+        """
+        return self.variants[bisect_left(self.starts, position):bisect_right(self.starts, position)]
+
+    def get_near(self, position: int, wobble: int = 5) -> List[Variant]:
+        """
+        Variants for which ``x - wobble < position < y + wobble``, by position.
+        """
+        first = bisect_right(self.starts, position - wobble - self.max_span)
+        last = bisect_left(self.starts, position + wobble)
+        return [self.variants[i] for i in range(first, last) if self.ends[i] > position - wobble]
+
+    def get_in_range(self, x: int, y: int) -> List[Variant]:
+        """
+        Variants within x and y (both inclusive), by position.
+        """
+        first = bisect_left(self.starts, x)
+        last = bisect_right(self.starts, y)
+        return [self.variants[i] for i in range(first, last) if self.ends[i] <= y]
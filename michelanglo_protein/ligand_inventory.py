@@ -0,0 +1,213 @@
+__doc__ = """
+The non-boring ligands of a structure (not water, ions, buffers or amino acids as per ``PyMolTranspiler``)
+with their atoms as a numpy record array (see atom_array.py), so the ligand list and the closest ligand
+to a residue are lookups and a distance matrix, not iterations over every atom in PyMOL.
+
+    >>> inventory = LigandInventory.get('1UBQ', pdbblock)
+    >>> inventory.get_ligand_list()
+    {'HEM'}
+    >>> inventory.get_closest(target_atoms)
+    {'target': '23.CA:A', 'closest': '[HEM]201.FE:A', 'distance': 4.2}
+
+Inventories are keyed by the coordinates they come from (the labels depend on the renumbering)
+and stored as .npz files in ``temp/ligands``: past ``max_size`` bytes the least recently used are deleted,
+as every distinct block (custom uploads, renumberings) gets one. The ligand names of each PDB code also go in the catalog ``temp/ligands/catalog.tsv``,
+so which codes (``.find``) or Uniprot accessions (``.find_uniprots``, via SIFTS) have a given ligand is a dictionary lookup.
+``sandbox.catalog_ligands`` fills it for a taxon.
+"""
+
+import os, hashlib
+from threading import Lock
+from typing import Dict, Set, List
+import numpy as np
+from michelanglo_transpiler import PyMolTranspiler
+from .settings_handler import global_settings  # the instance not the class.
+from .atom_array import pdb_to_atoms, save_atoms, load_atoms
+from .sifts_index import SiftsIndex
+
+
+class LigandInventory:
+    settings = global_settings
+    _folder = None
+    _catalog = None  #: code -> set of ligand names
+    _by_ligand = None  #: ligand name -> set of codes
+    _memory = {}  #: coordinates key -> instance. small: cleared when over memory_size.
+    memory_size = 100
+    max_size = 2 ** 30  #: bytes of .npz files on disk
+    _size = None  #: bytes used, counted once per process then kept up to date.
+    _lock = Lock()
+
+    def __init__(self, atoms: np.ndarray):
+        """
+        :param atoms: the ligand atoms (atom_array.atom_dtype records). Use ``.from_pdbblock`` for a whole structure.
+        """
+        self.atoms = atoms.view(np.recarray)
+
+    @staticmethod
+    def get_exclusion() -> Set[str]:
+        return set(PyMolTranspiler.boring_ligand + PyMolTranspiler.water_ligand + PyMolTranspiler.aa_ligand)
+
+    @classmethod
+    def from_pdbblock(cls, pdbblock: str) -> 'LigandInventory':
+        atoms = pdb_to_atoms(pdbblock)
+        if len(atoms) == 0:
+            return cls(atoms)
+        resn = np.char.upper(atoms.resn.astype(str))
+        return cls(atoms[~np.isin(resn, list(cls.get_exclusion()))])
+
+    def get_ligand_list(self) -> Set[str]:
+        return {name.upper() for name in np.unique(self.atoms.resn)}
+
+    def __len__(self):
+        return len(self.atoms)
+
+    def get_closest(self, target: np.ndarray) -> Dict:
+        """
+        Closest ligand atom to any of the target atoms (say those of a residue).
+
+        :param target: atom records (``structure.atoms[...]``)
+        :return: {'target': target atom, 'closest': ligand atom, 'distance': Ang distance}. Values None if there are no ligands.
+        """
+        if len(self.atoms) == 0:
+            return {'target': None, 'closest': None, 'distance': None}
+        elif len(target) == 0:
+            return {'target': '', 'closest': '', 'distance': 99999}
+        target = target.view(np.recarray)
+        distances = np.linalg.norm(target.xyz[:, None, :] - self.atoms.xyz[None, :, :], axis=2)
+        t, closest = np.unravel_index(np.argmin(distances), distances.shape)
+        ligand = self.atoms[closest]
+        target = target[t]
+        return {'target': f'{target.resi}{target.icode}.{target.name}:{target.chain}',
+                'closest': f'[{ligand.resn}]{ligand.resi}{ligand.icode}.{ligand.name}:{ligand.chain}',
+                'distance': float(distances[t, closest])}
+
+    ############################## store
+
+    @classmethod
+    def get_folder(cls) -> str:
+        if cls._folder is None:
+            cls._folder = os.path.join(cls.settings.temp_folder, 'ligands')
+        if not os.path.exists(cls._folder):
+            os.makedirs(cls._folder, exist_ok=True)
+        return cls._folder
+
+    @classmethod
+    def get(cls, code: str, pdbblock: str) -> 'LigandInventory':
+        """
+        From memory, disk or made from the PDB block (and stored).
+
+        :param code: PDB code or other name, for the catalog
+        :param pdbblock: the coordinates the labels refer to.
+        """
+        key = hashlib.sha1(pdbblock.encode()).hexdigest()
+        if key in cls._memory:
+            return cls._memory[key]
+        path = os.path.join(cls.get_folder(), key + '.npz')
+        try:
+            inventory = cls(load_atoms(path))
+            os.utime(path)  # recently used
+        except (FileNotFoundError, OSError, ValueError):  # absent or evicted by another process meanwhile
+            inventory = cls.from_pdbblock(pdbblock)
+            cls._store(inventory, path)
+            if code:
+                cls.add_to_catalog(code, inventory.get_ligand_list())
+        with cls._lock:
+            if len(cls._memory) >= cls.memory_size:
+                cls._memory.clear()
+            cls._memory[key] = inventory
+        return inventory
+
+    @classmethod
+    def _store(cls, inventory: 'LigandInventory', path: str):
+        temp = f'{path}.{os.getpid()}.tmp.npz'  # numpy adds .npz if missing.
+        save_atoms(inventory.atoms, temp)
+        with cls._lock:
+            if cls._size is None:
+                cls._size = cls._measure()
+            if os.path.exists(path):  # replaced: not counted twice.
+                cls._size -= os.path.getsize(path)
+            os.replace(temp, path)
+            cls._size += os.path.getsize(path)
+            if cls._size > cls.max_size:
+                cls._evict()
+
+    @classmethod
+    def _iter_files(cls):
+        for entry in os.scandir(cls.get_folder()):
+            if entry.name.endswith('.npz') and '.tmp' not in entry.name:
+                yield entry.path
+
+    @classmethod
+    def _measure(cls) -> int:
+        return sum(os.path.getsize(path) for path in cls._iter_files())
+
+    @classmethod
+    def _evict(cls):
+        """
+        Deletes the least recently used inventories till 90% of ``max_size``. Call within ``cls._lock``.
+        The catalog is kept.
+        """
+        stats = sorted(((os.stat(path), path) for path in cls._iter_files()), key=lambda s: s[0].st_mtime)
+        size = sum(stat.st_size for stat, path in stats)
+        for stat, path in stats:
+            if size <= cls.max_size * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= stat.st_size
+        cls._size = size
+
+    @classmethod
+    def get_catalog_file(cls) -> str:
+        return os.path.join(cls.get_folder(), 'catalog.tsv')
+
+    @classmethod
+    def load_catalog(cls) -> Dict[str, Set[str]]:
+        catalog = {}
+        if os.path.exists(cls.get_catalog_file()):
+            with open(cls.get_catalog_file()) as fh:
+                for row in fh:
+                    code, ligands = row.rstrip('\n').split('\t')
+                    catalog[code] = set(ligands.split(',')) - {''}
+        by_ligand = {}
+        for code, ligands in catalog.items():
+            for ligand in ligands:
+                by_ligand.setdefault(ligand, set()).add(code)
+        cls._catalog = catalog
+        cls._by_ligand = by_ligand
+        return catalog
+
+    @classmethod
+    def add_to_catalog(cls, code: str, ligands: Set[str]):
+        code = code.upper()
+        with cls._lock:
+            catalog = cls._catalog if cls._catalog is not None else cls.load_catalog()
+            if catalog.get(code) == ligands:
+                return
+            for ligand in catalog.get(code, set()):
+                cls._by_ligand[ligand].discard(code)
+            catalog[code] = set(ligands)
+            for ligand in ligands:
+                cls._by_ligand.setdefault(ligand, set()).add(code)
+            with open(cls.get_catalog_file(), 'a') as fh:  # append only. a later row wins.
+                fh.write(f'{code}\t{",".join(sorted(ligands))}\n')
+
+    @classmethod
+    def find(cls, ligand: str) -> List[str]:
+        """
+        :param ligand: residue name e.g. HEM
+        :return: the catalogued PDB codes with that ligand
+        """
+        if cls._catalog is None:
+            cls.load_catalog()
+        return sorted(cls._by_ligand.get(ligand.upper(), ()))
+
+    @classmethod
+    def find_uniprots(cls, ligand: str) -> Set[str]:
+        """
+        :param ligand: residue name e.g. HEM
+        :return: Uniprot accessions with a catalogued PDB entry that has that ligand (via SIFTS)
+        """
+        return {row['SP_PRIMARY'] for code in cls.find(ligand) for row in SiftsIndex.get(code)}
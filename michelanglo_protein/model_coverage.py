@@ -0,0 +1,80 @@
+__doc__ = """
+Per protein table of which model (``Structure`` in ``.pdbs`` or ``.swissmodel``) best covers each residue.
+It is built once (``ProteinCore.get_model_coverage``, done at generation) and stored with the protein,
+so ``ProteinAnalyser.get_best_model`` is an array lookup instead of looping and sorting per mutation.
+
+Ranking: type (rcsb, then swissmodel, then the rest), then resolution (non-positive, i.e. unknown, last),
+then the length covered (longer first), then the original order.
+"""
+
+from array import array
+from typing import List, Tuple
+
+
+class ModelCoverage:
+    groups = ('pdbs', 'swissmodel')  #: attributes of the protein holding structures
+    type_ranks = {'rcsb': 0, 'swissmodel': 1}
+
+    def __init__(self, protein):
+        """
+        :param protein: ProteinCore or subclass instance
+        """
+        self.length = len(protein.sequence)
+        self.signature = self.get_signature(protein)
+        candidates = []
+        for group in self.groups:
+            for i, structure in enumerate(getattr(protein, group)):
+                candidates.append(((group, i), structure))
+        candidates.sort(key=lambda c: self.rank_key(c[1]))
+        self.ranking = [reference for reference, structure in candidates]  #: List[Tuple[group, index]] best first
+        self.spans = [(structure.x, structure.y) for reference, structure in candidates]  #: aligned with ranking
+        # best[position] = index in ranking. -1: no model. position 0 unused.
+        self.best = array('i', [-1]) * (self.length + 1)
+        for rank in reversed(range(len(self.ranking))):  # worst first, so better ones overwrite
+            x, y = self.spans[rank]
+            x, y = max(1, x), min(self.length, y)
+            if x <= y:
+                self.best[x:y + 1] = array('i', [rank]) * (y - x + 1)
+
+    @classmethod
+    def rank_key(cls, structure) -> Tuple:
+        resolution = structure.resolution if structure.resolution and structure.resolution > 0 else float('inf')
+        return (cls.type_ranks.get(structure.type, len(cls.type_ranks)), resolution, -(structure.y - structure.x))
+
+    @classmethod
+    def get_signature(cls, protein) -> Tuple:
+        """
+        Check that the models have not changed since the table was built: what ``rank_key`` and ``spans`` use
+        (type, resolution, x and y) of each model, so loading resolutions or realigning rebuilds the table.
+        """
+        return (len(protein.sequence), *(tuple((structure.type, structure.resolution, structure.x, structure.y)
+                                               for structure in getattr(protein, group)) for group in cls.groups))
+
+    def is_current(self, protein) -> bool:
+        return self.signature == self.get_signature(protein)
+
+    def _resolve(self, protein, rank: int):
+        group, i = self.ranking[rank]
+        return getattr(protein, group)[i]
+
+    def get_best(self, protein, position: int):
+        """
+        :param protein: the protein this was built from.
+        :param position: residue index (Uniprot)
+        :return: Structure or None
+        """
+        if not 0 < position <= self.length:
+            return None
+        rank = self.best[position]
+        return self._resolve(protein, rank) if rank >= 0 else None
+
+    def get_ranked(self, protein, position: int) -> List:
+        """
+        All the models covering the position, best first (the fallback list).
+        """
+        return [self._resolve(protein, rank) for rank, (x, y) in enumerate(self.spans) if x <= position <= y]
+
+    def get_covered_fraction(self) -> float:
+        if self.length == 0:
+            return 0.
+        return sum(1 for rank in self.best[1:] if rank >= 0) / self.length
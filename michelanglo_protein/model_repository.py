@@ -0,0 +1,243 @@
+__doc__ = """
+A set of local models (in-house, predicted...) as a directory or an uncompressed tarball, with an index of
+Uniprot accession and range to member, offset and size, so adding a model set to the proteome is one index build.
+
+    >>> repository = ModelRepository('/data/alphafold_human.tar')
+    >>> repository.build()  # once. writes /data/alphafold_human.tar.index.tsv
+    >>> repository.attach(protein)  # adds Structure(type='local') entries to protein.swissmodel
+    >>> repository.attach_to_folder(os.path.join(global_settings.pickle_folder, 'taxid9606'))  # all the pickles
+
+The ``.url`` of the structures is ``{repository path}::{member}``. ``Structure.get_coordinates`` reads these
+with ``ModelRepository.read_url``, which for a tarball is a slice of a memory map of it.
+Members may be PDB or mmCIF, gzipped or not.
+
+By default the accession is taken from the member name (e.g. ``AF-P12345-F1-model_v4.pdb``) and the range
+is that of the residues with a CA of the first chain, i.e. the model is assumed to be in Uniprot numbering.
+For other conventions pass an ``identify`` function to ``.build``.
+"""
+
+import os, re, gzip, mmap, tarfile
+from collections import namedtuple
+from threading import Lock
+from typing import Dict, List, Optional, Callable, Iterator, Tuple
+from warnings import warn
+from .structure import Structure
+from .core import ProteinCore
+from .pdb_parser import iter_atoms
+from .cif_parser import cif_to_pdb
+
+ModelEntry = namedtuple('ModelEntry', ['uniprot', 'x', 'y', 'chain', 'member', 'offset', 'size'])
+
+_accession = re.compile(r'([OPQ][0-9][A-Z0-9]{3}[0-9]|[A-NR-Z][0-9](?:[A-Z][A-Z0-9]{2}[0-9]){1,2})')
+
+
+def identify_by_name(member: str, coordinates: str) -> Optional[Dict]:
+    """
+    Default identifier: accession from the name, range and chain from the CA atoms of the first chain.
+
+    :param member: name of the file in the repository
+    :param coordinates: PDB block
+    :return: dict with uniprot, x, y and chain or None to skip the model.
+    """
+    match = _accession.search(os.path.basename(member))
+    if match is None:
+        return None
+    chain, residues = None, []
+    for atom in iter_atoms(coordinates):
+        if atom[2] != 'CA' or atom[4] == 'CA':
+            continue
+        if chain is None:
+            chain = atom[5]
+        elif atom[5] != chain:
+            break
+        residues.append(atom[6])
+    if not residues:
+        return None
+    return {'uniprot': match.group(1), 'x': min(residues), 'y': max(residues), 'chain': chain}
+
+
+def decode_member(member: str, raw: bytes) -> str:
+    """
+    :return: PDB block from the bytes of a member (.pdb, .ent, .cif, optionally .gz)
+    """
+    if member.endswith('.gz'):
+        raw = gzip.decompress(raw)
+        member = member[:-3]
+    text = raw.decode()
+    if member.endswith('.cif'):
+        return cif_to_pdb(text)[0]
+    return text
+
+
+class ModelRepository:
+    headers = ModelEntry._fields
+    _open = {}  #: path -> instance. so the memory maps and indices of ``read_url`` are reused.
+    _lock = Lock()
+
+    def __init__(self, path: str, index_file: Optional[str] = None):
+        """
+        :param path: directory or uncompressed tarball of models
+        :param index_file: defaults to ``{path}.index.tsv``
+        """
+        self.path = os.path.abspath(path)
+        self.index_file = index_file if index_file is not None else self.path.rstrip(os.sep) + '.index.tsv'
+        self.is_tarball = os.path.isfile(self.path)
+        self._entries = None  # uniprot -> list of ModelEntry
+        self._members = None  # member -> ModelEntry
+        self._map = None  # mmap of the tarball
+        self._map_lock = Lock()
+
+    ############################## index
+
+    def _iter_members(self) -> Iterator[Tuple[str, int, int, bytes]]:
+        """
+        :return: member, offset, size, content
+        """
+        if self.is_tarball:
+            with tarfile.open(self.path, 'r:') as tar:  # r: as offsets into a compressed tarball are useless.
+                for info in tar:
+                    if info.isfile():
+                        yield info.name, info.offset_data, info.size, tar.extractfile(info).read()
+        else:
+            for folder, subfolders, files in os.walk(self.path):
+                for file in sorted(files):
+                    fullfile = os.path.join(folder, file)
+                    with open(fullfile, 'rb') as fh:
+                        yield os.path.relpath(fullfile, self.path), 0, os.path.getsize(fullfile), fh.read()
+
+    def build(self, identify: Optional[Callable] = None) -> int:
+        """
+        Scans the models and writes the index.
+
+        :param identify: function(member, PDB block) -> dict(uniprot, x, y, chain) or None to skip. Default ``identify_by_name``
+        :return: number of models indexed
+        """
+        if identify is None:
+            identify = identify_by_name
+        temp = f'{self.index_file}.{os.getpid()}.tmp'
+        n = 0
+        with open(temp, 'w') as w:
+            w.write('\t'.join(self.headers) + '\n')
+            for member, offset, size, raw in self._iter_members():
+                try:
+                    details = identify(member, decode_member(member, raw))
+                except Exception as error:
+                    warn(f'{member} could not be read: {error.__class__.__name__} {error}')
+                    continue
+                if details is None:
+                    continue
+                w.write(f'{details["uniprot"]}\t{details["x"]}\t{details["y"]}\t{details["chain"]}\t{member}\t{offset}\t{size}\n')
+                n += 1
+        os.replace(temp, self.index_file)
+        self._entries = None
+        self._members = None
+        return n
+
+    def load_index(self):
+        entries = {}
+        members = {}
+        with open(self.index_file) as fh:
+            next(fh)  # header
+            for row in fh:
+                uniprot, x, y, chain, member, offset, size = row.rstrip('\n').split('\t')
+                entry = ModelEntry(uniprot, int(x), int(y), chain, member, int(offset), int(size))
+                entries.setdefault(uniprot, []).append(entry)
+                members[member] = entry
+        self._entries = entries
+        self._members = members
+        return self
+
+    @property
+    def entries(self) -> Dict[str, List[ModelEntry]]:
+        if self._entries is None:
+            self.load_index()
+        return self._entries
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.entries.values())
+
+    ############################## reading
+
+    def read(self, member: str) -> str:
+        """
+        :param member: name of the file in the repository
+        :return: PDB block
+        """
+        if self._members is None:
+            self.load_index()
+        entry = self._members[member]
+        if self.is_tarball:
+            with self._map_lock:
+                if self._map is None:
+                    with open(self.path, 'rb') as fh:
+                        self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            raw = self._map[entry.offset: entry.offset + entry.size]
+        else:
+            with open(os.path.join(self.path, member), 'rb') as fh:
+                raw = fh.read()
+        return decode_member(member, raw)
+
+    def get_url(self, entry: ModelEntry) -> str:
+        return f'{self.path}::{entry.member}'
+
+    @classmethod
+    def read_url(cls, url: str) -> str:
+        """
+        :param url: ``{repository path}::{member}`` as in ``Structure.url`` of attached models
+        :return: PDB block
+        """
+        path, member = url.split('::', 1)
+        with cls._lock:
+            if path not in cls._open:
+                cls._open[path] = cls(path)
+            repository = cls._open[path]
+        return repository.read(member)
+
+    ############################## attaching
+
+    def get_structures(self, uniprot: str) -> List[Structure]:
+        structures = []
+        for entry in self.entries.get(uniprot, []):
+            name = os.path.basename(entry.member)
+            structures.append(Structure(id=name, description=f'local model {name}', x=entry.x, y=entry.y,
+                                        code=name, type='local', chain=entry.chain, url=self.get_url(entry)))
+        return structures
+
+    def attach(self, protein, group: str = 'swissmodel') -> int:
+        """
+        Adds the models of the protein as ``Structure`` entries (type local) to ``protein.swissmodel`` (or ``group``).
+        Models already present (same url) are skipped.
+
+        :return: number added
+        """
+        present = {structure.url for structure in getattr(protein, group)}
+        added = [structure for structure in self.get_structures(protein.uniprot) if structure.url not in present]
+        getattr(protein, group).extend(added)
+        return len(added)
+
+    def attach_to_folder(self, folder: str, group: str = 'swissmodel') -> int:
+        """
+        Attaches the models to the pickled proteins of a folder (e.g. ``pickle/taxid9606``) and resaves them.
+        Only the proteins in the index are opened.
+
+        :return: number of proteins changed
+        """
+        changed = 0
+        for uniprot in self.entries:
+            for extension in ('.p', '.pgz'):
+                file = os.path.join(folder, uniprot + extension)
+                if not os.path.exists(file):
+                    continue
+                protein = ProteinCore()
+                if extension == '.p':
+                    protein.load(file)
+                else:
+                    protein.gload(file)
+                if not self.attach(protein, group):
+                    continue
+                elif extension == '.p':
+                    protein.dump(file)
+                else:
+                    protein.gdump(file)
+                changed += 1
+        return changed
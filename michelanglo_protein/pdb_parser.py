@@ -0,0 +1,87 @@
+__doc__ = """
+A lightweight streaming reader of PDB blocks, for when a PyMOL session is overkill (sequence of a chain, sanity checks).
+It reads the fixed columns of ATOM/HETATM records only. First model only.
+
+    >>> sequence, residues = get_ca_trace(pdbblock, 'A')
+"""
+
+from typing import Iterator, Tuple, List, Optional, Iterable
+
+aa3to1 = {'CYS': 'C', 'ASP': 'D', 'SER': 'S', 'GLN': 'Q', 'LYS': 'K',
+          'ILE': 'I', 'PRO': 'P', 'THR': 'T', 'PHE': 'F', 'ASN': 'N',
+          'GLY': 'G', 'HIS': 'H', 'LEU': 'L', 'ARG': 'R', 'TRP': 'W',
+          'ALA': 'A', 'VAL': 'V', 'GLU': 'E', 'TYR': 'Y', 'MET': 'M',
+          'MSE': 'M', 'SEC': 'U', 'PYL': 'O'}
+
+# record, serial, name, altloc, resn, chain, resi, icode, x, y, z, occupancy, b-factor, element
+Atom = Tuple[str, int, str, str, str, str, int, str, float, float, float, float, float, str]
+
+
+def _float(text: str, default: float = 0.) -> float:
+    text = text.strip()
+    return float(text) if text else default
+
+
+def parse_atom_line(line: str) -> Atom:
+    """
+    Fixed columns as per the PDB format v3.3. The element is guessed from the name if the columns are missing.
+    """
+    name = line[12:16].strip()
+    element = line[76:78].strip() if len(line) >= 78 else ''
+    if not element:
+        element = name.lstrip('0123456789')[:1]
+    return (line[0:6].strip(),
+            int(line[6:11]) if line[6:11].strip().isdigit() else 0,
+            name,
+            line[16:17].strip(),
+            line[17:20].strip(),
+            line[21:22],
+            int(line[22:26]),
+            line[26:27].strip(),
+            float(line[30:38]),
+            float(line[38:46]),
+            float(line[46:54]),
+            _float(line[54:60], 1.),
+            _float(line[60:66]),
+            element.upper())
+
+
+def iter_atoms(pdbblock: str, chains: Optional[Iterable[str]] = None) -> Iterator[Atom]:
+    """
+    Yields the atoms of the first model.
+
+    :param pdbblock: PDB block (str)
+    :param chains: only these chain letters (None: all)
+    """
+    if chains is not None:
+        chains = set(chains)
+    for line in pdbblock.splitlines():
+        record = line[0:6]
+        if record == 'ATOM  ' or record == 'HETATM':
+            if chains is not None and line[21:22] not in chains:
+                continue
+            yield parse_atom_line(line)
+        elif record == 'ENDMDL':
+            break
+
+
+def get_ca_trace(pdbblock: str, chain: str) -> Tuple[str, List[Tuple[int, str]]]:
+    """
+    The one letter sequence of the residues with a CA in a chain, alongside their (resi, icode).
+    Non-standard residues are X. Alternative conformations are counted once.
+
+    :param pdbblock: PDB block (str)
+    :param chain: chain letter
+    :return: sequence, list of (resi, icode)
+    """
+    sequence = []
+    residues = []
+    for atom in iter_atoms(pdbblock, chains=(chain,)):
+        if atom[2] != 'CA' or atom[4] == 'CA':  # calcium...
+            continue
+        residue = (atom[6], atom[7])
+        if residues and residues[-1] == residue:
+            continue
+        residues.append(residue)
+        sequence.append(aa3to1.get(atom[4], 'X'))
+    return ''.join(sequence), residues
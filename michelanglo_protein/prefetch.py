@@ -0,0 +1,126 @@
+__doc__ = """
+Fetches the coordinates of all the models of a protein (``.pdbs`` and ``.swissmodel``) in parallel into ``Structure.coordinate_cache``,
+so the later ``Structure.get_coordinates`` calls (by the analysers or ``ProteinGatherer.get_structures``) are cache hits.
+
+    >>> prefetch_structures(protein, concurrency=8)
+    {'1GOT': True, '5be4a9c602efd0e456a7ffeb': True, ...}
+
+* the threads share one ``requests.Session`` whose connection pool is as large as ``concurrency``.
+* 429 and 5xx replies and connection errors are retried with exponential backoff.
+* ``rate_limiter`` is module level, so it caps the request rate across all prefetches in the process.
+
+The cache is warmed, not ``Structure.coordinates``: RCSB entries still need renumbering (``get_offset_coordinates``).
+The downloads are those of ``Structure._fetch_remote`` (same format choice, cache key and parser),
+so with ``Structure.rcsb_format`` set to cif or bcif, or for the entries without a PDB file, the mmCIF is what is warmed.
+"""
+
+import time
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from warnings import warn
+import requests
+from requests.adapters import HTTPAdapter
+from .structure import Structure
+
+
+class RateLimiter:
+    """
+    Spaces out calls to ``.wait()`` to at most ``rate`` per second across threads. ``rate=0`` is unlimited.
+    """
+
+    def __init__(self, rate: float = 10):
+        self.rate = rate
+        self._next = 0.
+        self._lock = Lock()
+
+    def wait(self):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + 1 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+
+rate_limiter = RateLimiter(rate=10)  #: shared by all prefetches. RCSB asks for politeness.
+retriable_status_codes = (429, 500, 502, 503, 504)
+
+
+def _make_getter(session: requests.Session, retries: int, backoff: float, timeout: float):
+    """
+    Returns a function that given a url returns a response, retrying with backoff. Used as getter by ``CoordinateCache.fetch``.
+    """
+
+    def getter(url, **kwargs):
+        for attempt in range(retries + 1):
+            rate_limiter.wait()
+            try:
+                response = session.get(url, timeout=timeout, **kwargs)
+                if response.status_code not in retriable_status_codes:
+                    return response
+            except requests.RequestException:
+                if attempt == retries:
+                    raise
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt)
+        return response
+
+    return getter
+
+
+def prefetch_structures(protein, concurrency: int = 8, retries: int = 3, backoff: float = 0.5,
+                        timeout: float = 60, session: Optional[requests.Session] = None) -> Dict[str, bool]:
+    """
+    Fetches in parallel the coordinates of ``protein.pdbs`` and ``protein.swissmodel`` into ``Structure.coordinate_cache``.
+
+    :param protein: ProteinCore or subclass instance.
+    :param concurrency: number of threads (and pooled connections).
+    :param retries: attempts after the first for 429/5xx/connection errors.
+    :param backoff: seconds before the first retry. doubles each time.
+    :param timeout: seconds per request.
+    :param session: a requests.Session to use instead of a new pooled one.
+    :return: dict of code (or url) -> whether the coordinates (of all its chains) are now cached.
+    """
+    cache = Structure.coordinate_cache
+    if not cache.enabled:
+        warn('The coordinate cache is disabled. There is nothing to prefetch into.')
+        return {}
+    # chains of the same entry are one download (``Structure.get_fetch_key``).
+    jobs = {}
+    for structure in list(protein.pdbs) + list(protein.swissmodel):
+        if structure.type == 'rcsb' and structure.rcsb_format != 'pdb' and not structure.chain_definitions:
+            # the chains read from a mmCIF are those of the chain definitions, as in ``get_offset_coordinates``.
+            try:
+                structure.lookup_sifts()
+            except Exception as error:
+                warn(f'No SIFTS data for {structure.code}: {error.__class__.__name__} {error}')
+        key = structure.get_fetch_key()
+        if key is not None:
+            jobs.setdefault(key, []).append(structure)
+    if not jobs:
+        return {}
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+    getter = _make_getter(session, retries, backoff, timeout)
+
+    def fetch(structures) -> bool:
+        # the first downloads, the others are cache hits unless the entry turns out to be mmCIF only,
+        # in which case the chains differ.
+        try:
+            return all([structure._fetch_remote(getter=getter) is not None for structure in structures])
+        except requests.RequestException as error:
+            warn(f'Prefetch of {structures[0].get_remote_reference()[0]} failed: {error.__class__.__name__} {error}')
+            return False
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [(key[1], executor.submit(fetch, structures)) for key, structures in jobs.items()]
+        for reference, future in futures:
+            results[reference] = results.get(reference, True) and future.result()
+    return results
@@ -6,10 +6,12 @@ from .core import ProteinCore
 from .gnomad_variant import Variant
 from .mutation import Mutation
 from .structure import Structure
+from .elm_index import ElmEngine, ElmIndex
 import re
 import io, os
-from .analyse import StructureAnalyser, Mutator
-from multiprocessing import Process, Pipe  # pyrosetta can throw segfaults.
+from concurrent.futures import ThreadPoolExecutor
+from .analyse import StructureAnalyser, Mutator, FFScheduler, EnergeticsCache
+from .analyse.mutator_pool import run_mutator_job
 from typing import Union, List, Dict, Tuple, Optional
 
 
@@ -31,25 +33,18 @@ class ProteinAnalyser(ProteinCore):
         self.energetics = None
         self.rosetta_params_filenames = []
         self.energetics_gnomAD = None
+        self.energetics_saturation = None
 
     ############## elm
-    _elmdata = []
+    # the ELM classes and their compiled regexes are loaded once per process by ElmEngine (elm_index.py).
 
     @property
     def elmdata(self) -> List[dict]:
-        ### load only when needed basically...
-        if not len(self._elmdata):
-            with open(os.path.join(self.settings.reference_folder, 'elm_classes.tsv')) as fh:
-                header = ("Accession", "ELMIdentifier", "FunctionalSiteName", "Description", "Regex", "Probability",
-                          "#Instances", "#Instances_in_PDB")
-                for line in fh:
-                    if line[0] == '#':
-                        continue
-                    if "Accession" in line:
-                        continue
-                    self._elmdata.append(dict(zip(header, line.replace('"', '').split('\t'))))
-            self.__class__._elmdata = self._elmdata  ## change the class attribute too!
-        return self._elmdata
+        return ElmEngine.get_data()
+
+    @property
+    def elm_engine(self) -> List[Tuple[dict, 're.Pattern']]:
+        return ElmEngine.get_patterns()
 
     def _set_mutation(self, mutation):
         if isinstance(mutation, str):
@@ -173,62 +168,54 @@ class ProteinAnalyser(ProteinCore):
 
     ################################# ELM
 
-    def _rex_elm(self, neighbours: str, regex: str, starter: bool = False, ender: bool = False):
+    @staticmethod
+    def _pad_elm(neighbours: str, starter: bool = False, ender: bool = False) -> Tuple[str, int]:
+        """
+        The padding in neighbours is to stop ^ and $ matching.
+
+        :return: padded neighbours, offset of the first residue in it.
+        """
+        if starter:
+            return neighbours + 'XXX', 0
+        elif ender:
+            return 'X' * 3 + neighbours, 3
+        else:
+            return 'X' * 3 + neighbours + 'X' * 3, 3
+
+    def _rex_elm(self, neighbours: str, regex: Union[str, 're.Pattern'], starter: bool = False, ender: bool = False):
         """
         The padding in neighbours is to stop ^ and $ matching.
 
         :param neighbours: sequence around the mutation
         :type neighbours: str
-        :param regex: ELM regex
+        :param regex: ELM regex (str or compiled)
         :type regex: str
         :param starter: is it at the start?
         :param ender: is it at the end?
         :return: None or tuple(start:int, stop:int)
         """
-        if starter:
-            offset = 0
-            rex = re.search(regex, neighbours + 'XXX')
-        elif ender:
-            offset = 3
-            rex = re.search(regex, 'X' * offset + neighbours)
-        else:
-            offset = 3
-            rex = re.search(regex, 'X' * offset + neighbours + 'X' * offset)
+        padded, offset = self._pad_elm(neighbours, starter, ender)
+        rex = re.search(regex, padded)
         if rex:
             return (rex.start() - offset, rex.end() - offset)
         else:
             return False
 
     def check_elm(self):
+        """
+        Fills ``.mutation.elm`` with the ELM motifs overlapping the residue that are kept, lost or gained.
+        With a current ``.elm_index`` (made at generation) only the mutant is scanned.
+        Otherwise the wild type is scanned around the residue as well: the result is the same.
+        Motifs near the residue that do not overlap it are not listed (they used to come out as kept)
+        and motifs longer than the rescanned window (``ElmIndex.margin``) are cut.
+        """
         assert self.sequence, 'No sequence defined.'
         position = self.mutation.residue_index
-        neighbours = self._neighbours(midresidue=self.sequence[position - 1], position=position, span=10, marker='')
-        mut_neighbours = self._neighbours(midresidue=self.mutation.to_residue, position=position, span=10, marker='')
-        results = []
-        elm = self.elmdata
-        for r in elm:
-            starter = position < 5
-            ender = position + 5 > len(self.sequence)
-            w = self._rex_elm(neighbours, r['Regex'], starter, ender)
-            m = self._rex_elm(mut_neighbours, r['Regex'], starter, ender)
-            if w != False or m != False:
-                match = {'name': r['FunctionalSiteName'],
-                         'description': r['Description'],
-                         'regex': r['Regex'],
-                         'probability': float(r['Probability'])}
-                if w != False and m != False:
-                    match['x'] = w[0] + position - 5
-                    match['y'] = w[1] + position - 5
-                    match['status'] = 'kept'
-                elif w != False and m == False:
-                    match['x'] = w[0] + position - 5
-                    match['y'] = w[1] + position - 5
-                    match['status'] = 'lost'
-                else:
-                    match['x'] = m[0] + position - 5
-                    match['y'] = m[1] + position - 5
-                    match['status'] = 'gained'
-                results.append(match)
+        index = getattr(self, 'elm_index', None)
+        if index is not None and index.is_current() and index.length == len(self.sequence):
+            results = index.get_delta(self.sequence, position, self.mutation.to_residue)
+        else:
+            results = ElmIndex.scan_delta(self.sequence, position, self.mutation.to_residue)
         self.mutation.elm = sorted(results, key=lambda m: m['probability'] + int(m['status'] == 'kept'))
         return self
 
@@ -243,25 +230,24 @@ class ProteinAnalyser(ProteinCore):
         return self.get_features_near_position(position, wobble=0)
 
     def get_features_near_position(self, position=None, wobble=10):
+        """
+        Features within wobble residues of the position, with the gnomAD tally of each (see ``self.get_feature_index()``).
+        """
         position = position if position is not None else self.mutation.residue_index
+        index = self.get_feature_index()
         valid = []
-        for g in self.features:
-            for f in self.features[g]:
-                if 'x' in f:
-                    if f['x'] - wobble <= position and position <= f['y'] + wobble:
-                        gnomad = self.get_gnomAD_in_range(f['x'], f['y'])
-                        valid.append({**f,
-                                      'type': g,
-                                      'gnomad': self._tally_gnomad(gnomad)})
-                elif 'residue_index' in f:  ## TODO FIX THIS DAMN DIFFERENT STANDARD.
-                    if f['residue_index'] - wobble <= position and position <= f['residue_index'] + wobble:
-                        ## PTM from phosphosite plus are formatted differently. the feature viewer and the .structural known this.
-                        gnomad = self.get_gnomAD_in_range(f['residue_index'], f['residue_index'])
-                        valid.append({'x': f['residue_index'],
-                                      'y': f['residue_index'],
-                                      'description': self.ptm_definitions[f['ptm']],
-                                      'type': 'Post translational',
-                                      'gnomad': self._tally_gnomad(gnomad)})
+        for x, y, g, f in index.get_overlapping(position - wobble, position + wobble):
+            if 'x' in f:
+                valid.append({**f,
+                              'type': g,
+                              'gnomad': index.tally(x, y)})
+            else:  ## TODO FIX THIS DAMN DIFFERENT STANDARD.
+                ## PTM from phosphosite plus are formatted differently. the feature viewer and the .structural known this.
+                valid.append({'x': x,
+                              'y': y,
+                              'description': self.ptm_definitions[f['ptm']],
+                              'type': 'Post translational',
+                              'gnomad': index.tally(x, y)})
         svalid = sorted(valid, key=lambda v: int(v['y']) - int(v['x']))
         return svalid
 
@@ -278,11 +264,7 @@ class ProteinAnalyser(ProteinCore):
         :return: list of gnomAD mutations, which are named touples e.g. {'id': 'gnomAD_19_19_rs562294556', 'description': 'R19Q (rs562294556)', 'x': 19, 'y': 19, 'impact': 'MODERATE'}
         """
         position = position if position is not None else self.mutation.residue_index
-        # valid = [g for g in self.gnomAD if g.x - wobble < position < g.y + wobble]
-        # svalid = sorted(valid, key=lambda v: v.y - v.x)
-        valid = {g.description: g for g in self.gnomAD if g.x - wobble < position < g.y + wobble}
-        svalid = sorted(valid.values(), key=lambda v: v.x)
-        return svalid
+        return self.get_gnomAD_index().get_near(position, wobble)
 
     def get_gnomAD_in_range(self, x: int, y: int) -> List[Variant]:
         """
@@ -290,9 +272,9 @@ class ProteinAnalyser(ProteinCore):
 
         :param x: begin
         :param y: end
-        :return: list of gnomad mutations between x and y
+        :return: list of gnomad mutations between x and y (deduplicated, by position)
         """
-        return [variant for variant in self.gnomAD if x <= variant.x and y >= variant.y]
+        return self.get_gnomAD_index().get_in_range(x, y)
 
     # def _get_structures_with_position(self, position):
     #     """
@@ -306,24 +288,11 @@ class ProteinAnalyser(ProteinCore):
 
     def get_best_model(self) -> Structure:
         """
-        This currently just gets the first PDB based on resolution. It ought to check what is the best properly.
-        it checks pdbs first, then swissmodel.
+        The best model covering the mutation: RCSB first, then swissmodel, by resolution, then coverage.
+        It is a lookup in the table stored with the protein (``self.get_model_coverage()``).
         :return:
         """
-        for l in (self.pdbs, self.swissmodel):
-            if l:
-                good = []
-                for model in l:  # model is a structure object.
-                    if model.includes(self.mutation.residue_index):
-                        good.append(model)
-                if good:
-                    good.sort(key=lambda x: x.resolution)
-                    return good[0]
-                else:  # no models with mutation.
-                    pass
-            else:  # no models in group
-                pass
-        return None
+        return self.get_best_model_at(self.mutation.residue_index)
 
     @property
     def property_at_mutation(self):
@@ -337,6 +306,15 @@ class ProteinAnalyser(ProteinCore):
         if not structure:
             self.structural = None
             return self
+        self._fill_chain_definitions(structure)
+        self.structural = StructureAnalyser(structure, self.mutation)
+        if self.structural and self.structural.neighbours:
+            ## see mutation.exposure_effect
+            self.mutation.surface_expose = 'buried' if self.structural.buried else 'surface'
+            self.annotate_neighbours()
+        return self
+
+    def _fill_chain_definitions(self, structure: Structure):
         if not structure.chain_definitions and structure.type != 'custom':
             # this is not supposed to happen! Swissmodel.
             print(f'definitionless structure: {structure.code}')
@@ -355,18 +333,60 @@ class ProteinAnalyser(ProteinCore):
                                             'name': self.gene_name,
                                             'note': 'Retroactively filled data. May be wrong.'
                                             }]
-        self.structural = StructureAnalyser(structure, self.mutation)
-        if self.structural and self.structural.neighbours:
-            ## see mutation.exposure_effect
-            self.mutation.surface_expose = 'buried' if self.structural.buried else 'surface'
-            self.annotate_neighbours()
-        return self
+
+    def predict_effects(self, mutations: List[Union[str, Mutation]], structural: bool = True) -> List[Dict]:
+        """
+        ``predict_effect`` and ``analyse_structure`` for several mutations of the protein, which is loaded once (this instance).
+        The mutations are grouped by best model, so each model is fetched, renumbered and opened in PyMOL once
+        (``StructureAnalyser.analyse_many``).
+        A mutation that fails (e.g. ``mutation_discrepancy``) gets its error, it does not stop the others.
+
+        :param mutations: list of Mutation or str (e.g. ``['p.A23G', 'K45R']``)
+        :param structural: run ``StructureAnalyser``
+        :return: list in the order given of dict with mutation (Mutation or None), structure (Structure or None),
+            structural (StructureAnalyser or None) and error (str or None)
+        """
+        original_mutation, original_structural = self._mutation, self.structural
+        results = []
+        by_model = {}
+        for mutation in mutations:
+            result = {'mutation': None, 'structure': None, 'structural': None, 'error': None}
+            results.append(result)
+            try:
+                self.mutation = mutation
+                result['mutation'] = self.mutation
+                self.predict_effect()
+                if structural and StructureAnalyser is not None:
+                    structure = self.get_best_model()
+                    if structure:
+                        result['structure'] = structure
+                        by_model.setdefault(id(structure), (structure, []))[1].append(result)
+            except Exception as error:
+                result['error'] = f'{error.__class__.__name__}: {error}'
+        for structure, group in by_model.values():
+            try:
+                self._fill_chain_definitions(structure)
+                analysers = StructureAnalyser.analyse_many(structure, [result['mutation'] for result in group])
+            except Exception as error:
+                analysers = [error] * len(group)
+            for result, analyser in zip(group, analysers):
+                if isinstance(analyser, Exception):
+                    result['error'] = f'{analyser.__class__.__name__}: {analyser}'
+                    continue
+                result['structural'] = analyser
+                if analyser.neighbours:
+                    self._mutation, self.structural = result['mutation'], analyser
+                    result['mutation'].surface_expose = 'buried' if analyser.buried else 'surface'
+                    self.annotate_neighbours()
+        self._mutation, self.structural = original_mutation, original_structural
+        return results
 
     def annotate_neighbours(self):
         """
         The structural neighbours does not contain data re features.
         :return:
         """
+        index = self.get_gnomAD_index()
         for neigh in self.structural.neighbours:
             neigh['resn'] = Mutation.aa3to1(neigh['resn'])
             if neigh['chain'] != 'A':
@@ -374,7 +394,7 @@ class ProteinAnalyser(ProteinCore):
             else:
                 specials = []
                 r = int(neigh['resi'])
-                gnomad = ['gnomAD:' + g.description for g in self.gnomAD if r == g.x]
+                gnomad = ['gnomAD:' + g.description for g in index.get_at(r)]
                 specials.extend(gnomad)
                 for k in ('initiator methionine',
                           'modified residue',
@@ -417,92 +437,64 @@ class ProteinAnalyser(ProteinCore):
         else:
             return self.structural.coordinates
 
-    def _subprocess_factory(self, fun, **kwargs):
-        """
-        Returns a function that requires a Connection to be run as a subprocess
-
-        :param fun:
-        :param kwargs:
-        :return:
+    def _run_mutator(self, method: str, init_settings: Dict, *args, spit_process: bool = True,
+                     priority: str = 'interactive', deadline: Optional[float] = None):
         """
-        def subprocess(child_conn):  # Pipe <- Union[dict, None]:
-            try:
-                data = fun(**kwargs)
-                child_conn.send(data)
-            except BaseException as error:
-                child_conn.send({'error': f'{error.__class__.__name__}:{error}'})
+        ``Mutator(**init_settings).method(*args)``. Pyrosetta tends to raise segfaults, so by default this is queued
+        in ``FFScheduler.get_default()`` and done by one of the warm worker processes of ``MutatorPool``,
+        which replaces crashed workers. Results are stored in and taken from ``EnergeticsCache``.
 
-        return subprocess
-
-    def _run_subprocess(self, subpro):
+        :param spit_process: run in a worker process to avoid segfaults?
+        :param priority: interactive or batch (see ``FFScheduler``)
+        :param deadline: epoch seconds after which the result is of no use. None: no limit
+        :return: the result or a dict with the key error
         """
-        Run a function (subpro) and wait for it.
-
-        :param subpro: unbound function.
-        :return:
-        """
-        parent_conn, child_conn = Pipe()
-        p = Process(target=subpro, args=((child_conn),))
-        p.start()
-        while 1:
-            if parent_conn.poll():
-                break
-            elif not p.is_alive():
-                child_conn.send({'error': 'segmentation fault'})
-                break
-            else:
-                pass
-        return parent_conn.recv()
+        cached = EnergeticsCache.enabled and method in EnergeticsCache.cached_methods
+        if cached:
+            key = EnergeticsCache.get_key(method, init_settings, args)
+            result = EnergeticsCache.get(key)
+            if result is not None:
+                return result
+        if not spit_process:
+            result = run_mutator_job(method, init_settings, args)
+        else:
+            result = FFScheduler.get_default().submit(method, init_settings, *args,
+                                                      priority=priority, deadline=deadline).result()
+        if cached:
+            EnergeticsCache.put(key, result)
+        return result
 
-    def analyse_FF(self, spit_process=True) -> Union[Dict, None]:
+    def analyse_FF(self, spit_process=True, **scheduling) -> Union[Dict, None]:
         """
         Calls the pyrosetta, which tends to raise segfaults, hence the whole subpro business.
 
         :param spit_process: run as a separate process to avoid segfaults?
+        :param scheduling: priority and deadline (see ``._run_mutator``)
         :return:
         """
         if self.pdbblock is None:
             return None
-        ##### perpare.
-        init_settings = self._init_settings
-
-        def analysis(to_resn, init_settings):
-            mut = Mutator(**init_settings)
-            return mut.analyse_mutation(to_resn)
-
-        if not spit_process:
-            msg = analysis(init_settings=init_settings, to_resn=self.mutation.to_residue)
-        else:
-            msg = self._run_subprocess(
-                self._subprocess_factory(analysis, to_resn=self.mutation.to_residue, init_settings=init_settings))
+        msg = self._run_mutator('analyse_mutation', self._init_settings, self.mutation.to_residue,
+                                spit_process=spit_process, **scheduling)
         self.energetics = msg
         return msg
 
-    def analyse_gnomad_FF(self, spit_process=True) -> Union[Dict, None]:
+    def analyse_gnomad_FF(self, spit_process=True, **scheduling) -> Union[Dict, None]:
         """
         Calls the pyrosetta, which tends to raise segfaults, hence the whole subpro business.
 
         :param spit_process: run as a separate process to avoid segfaults?
+        :param scheduling: priority and deadline (see ``._run_mutator``)
         :return:
         """
         if self.pdbblock is None:
             return None
-        ##### perpare.
-        init_settings = self._init_settings
-
-        def analysis(gnomads, init_settings):
-            mut = Mutator(**init_settings)
-            return mut.score_gnomads(gnomads)
-
-        if not spit_process:
-            msg = analysis(init_settings=init_settings, gnomads=self.gnomAD)
-        else:
-            msg = self._run_subprocess(
-                self._subprocess_factory(analysis, gnomads=self.gnomAD, init_settings=init_settings))
+        msg = self._run_mutator('score_gnomads', self._init_settings, self.gnomAD,
+                                spit_process=spit_process, **scheduling)
         self.energetics_gnomAD = msg
         return msg
 
-    def analyse_other_FF(self, mutation: Union[Mutation, str], algorithm, spit_process=True) -> Union[Dict, None]:
+    def analyse_other_FF(self, mutation: Union[Mutation, str], algorithm, spit_process=True, **scheduling) -> Union[Dict, None]:
         ## sort out mutation
         if isinstance(mutation, str):
             mutation = Mutation(mutation)
@@ -515,42 +507,91 @@ class ProteinAnalyser(ProteinCore):
             return None
         ##### perpare.
         init_settings = self._init_settings
-        init_settings['target_resi'] = mutation.residue_index
-
-        def relax(resi, from_resn, to_resn, init_settings):
-            mut = Mutator(**init_settings) ##altered target_residue from taht of the mutation!
-            results = mut.analyse_mutation(to_resn)
-            return {'coordinates': results['mutant'], 'ddg': results['ddG']}
-
-        def repack(resi, from_resn, to_resn, init_settings):
-            mut = Mutator(**init_settings)
-            return mut.repack_other(resi, from_resn, to_resn)
-
+        init_settings['target_resi'] = mutation.residue_index  ##altered target_residue from taht of the mutation!
         if algorithm == 'relax':
-            analysis = relax
+            results = self._run_mutator('analyse_mutation', init_settings, mutation.to_residue,
+                                        spit_process=spit_process, **scheduling)
+            if 'error' in results:
+                return results
+            return {'coordinates': results['mutant'], 'ddg': results['ddG']}
         elif algorithm == 'repack':
-            analysis = repack
-        else:
-            ValueError(f'What is this {algorithm}')
-        if not spit_process:
-            msg = analysis(init_settings=init_settings,
-                           to_resn=mutation.to_residue,
-                           from_resn=mutation.from_residue,
-                           resi=mutation.residue_index)
+            return self._run_mutator('repack_other', init_settings,
+                                     mutation.residue_index, mutation.from_residue, mutation.to_residue,
+                                     spit_process=spit_process, **scheduling)
         else:
-            msg = self._run_subprocess(
-                self._subprocess_factory(analysis,
-                                         to_resn=mutation.to_residue,
-                                         from_resn=mutation.from_residue,
-                                         resi=mutation.residue_index,
-                                         init_settings=init_settings))
-        return msg
+            raise ValueError(f'What is this {algorithm}')
 
-    def phosphorylate_FF(self, spit_process=True) -> Union[str, None]:
+    def analyse_saturation_FF(self, x: Optional[int] = None, y: Optional[int] = None, chunks: Optional[int] = None,
+                              spit_process=True, **scheduling) -> Union[Dict, None]:
+        """
+        Saturation mutagenesis: ddG of every substitution at the mutated residue or at each residue from x to y.
+        Each native is relaxed once (``Mutator.relax_native``), then its alternatives, split in ``chunks`` jobs,
+        are mutated and relaxed from it (``Mutator.saturate``). The jobs go through ``FFScheduler``,
+        so they run on the workers of ``MutatorPool`` at once.
+
+        :param x: first residue. Default: that of the mutation
+        :param y: last residue (inclusive). Default: x
+        :param chunks: jobs per residue. Default: the workers of the scheduler, i.e. of ``MutatorPool`` (one per CPU, at least two),
+            or one if not spit_process
+        :param spit_process: run as a separate process to avoid segfaults?
+        :param scheduling: priority and deadline (see ``._run_mutator``)
+        :return: positions, amino_acids, ddG (list per position of kcal/mol per amino acid, 0 for the native and None if failed) and errors
+        """
+        if self.pdbblock is None:
+            return None
+        if x is None:
+            x = self.mutation.residue_index
+        if y is None:
+            y = x
+        assert 0 < x <= y <= len(self.sequence), f'Range {x}-{y} out of the sequence (1-{len(self.sequence)})'
+        amino_acids = list('ACDEFGHIKLMNPQRSTVWY')
+        positions = list(range(x, y + 1))
+        if chunks is None:
+            chunks = FFScheduler.get_default().workers if spit_process else 1
+        errors = {}
+
+        def run(method, position, *args):
+            init_settings = self._init_settings
+            init_settings['target_resi'] = position
+            if method == 'saturate':  # from the relaxed native.
+                init_settings['pdbblock'] = natives[position]
+            result = self._run_mutator(method, init_settings, *args, spit_process=spit_process, **scheduling)
+            if isinstance(result, dict) and 'error' in result:
+                errors[f'{self.sequence[position - 1]}{position}:{method}'] = result['error']
+                return None
+            return result
+
+        # the executor threads only wait on the scheduler. max_workers keeps the scheduler queue short.
+        workers = FFScheduler.get_default().workers + 1 if spit_process else 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            natives = dict(zip(positions, executor.map(lambda position: run('relax_native', position), positions)))
+            jobs = []
+            for position in positions:
+                if natives[position] is None:
+                    continue
+                alternatives = [aa for aa in amino_acids if aa != self.sequence[position - 1]]
+                for i in range(min(chunks, len(alternatives))):
+                    jobs.append((position, alternatives[i::chunks]))
+            results = executor.map(lambda job: (job[0], run('saturate', job[0], job[1], False)), jobs)
+            ddG = {position: dict.fromkeys(amino_acids) for position in positions}
+            for position, result in results:
+                if result is not None:
+                    ddG[position].update(result)
+        for position in positions:
+            if natives[position] is not None:
+                ddG[position][self.sequence[position - 1]] = 0.
+        self.energetics_saturation = {'positions': positions,
+                                      'amino_acids': amino_acids,
+                                      'ddG': [[ddG[position][aa] for aa in amino_acids] for position in positions],
+                                      'errors': errors}
+        return self.energetics_saturation
+
+    def phosphorylate_FF(self, spit_process=True, **scheduling) -> Union[str, None]:
         """
                 Calls the pyrosetta, which tends to raise segfaults, hence the whole subpro business.
 
                 :param spit_process: run as a separate process to avoid segfaults?
+                :param scheduling: priority and deadline (see ``._run_mutator``)
                 :return:
                 """
         if self.pdbblock is None:
@@ -562,17 +603,8 @@ class ProteinAnalyser(ProteinCore):
         elif not self.features['PSP_modified_residues']:
             print('no features2')
             return None
-        ##### perpare.
-        init_settings = self._init_settings
-
-        def analysis(ptms, init_settings):
-            mut = Mutator(**init_settings)
-            return mut. make_phospho(ptms)
-        if not spit_process:
-            msg = analysis(init_settings=init_settings, ptms=self.features['PSP_modified_residues'])
-        else:
-            msg = self._run_subprocess(
-                self._subprocess_factory(analysis, ptms=self.features['PSP_modified_residues'], init_settings=init_settings))
+        msg = self._run_mutator('make_phospho', self._init_settings, self.features['PSP_modified_residues'],
+                                spit_process=spit_process, **scheduling)
         #self.phosphorylated_pdbblcok = msg
         return msg
 
@@ -0,0 +1,149 @@
+__doc__ = """
+Local alignment (Smith-Waterman, linear gap penalty) with the rows vectorised in numpy.
+Used by ``Structure.get_offset_from_PDB`` to align the CA trace of a chain against the Uniprot sequence.
+
+The horizontal gap term is the only one within a row that depends on the row itself.
+With a linear penalty it is a running maximum: ``H[j] = max_k(T[k] + g*k) - g*j``, where T is the best of zero, diagonal and vertical.
+So each row is a handful of numpy operations.
+
+Memory is linear in the target bar the aligned window: a first pass keeps two rows and finds where the best
+alignment ends, a second (anchored, on the reversed prefixes) where it starts, and only that window is filled in full
+for the traceback. A TTN-sized target with unknown begin/end no longer means a query × target matrix.
+"""
+
+import numpy as np
+from collections import Counter
+from typing import Dict, List, Tuple
+
+
+def _row_scores(q: np.ndarray, t: np.ndarray, i: int, match: int, mismatch: int) -> np.ndarray:
+    """
+    Substitution scores of query letter i against the target (int32). X matches nothing.
+    """
+    row = np.full(len(t), mismatch, dtype=np.int32)
+    if q[i] != ord('X'):
+        row[t == q[i]] = match
+    return row
+
+
+def _next_row(prior: np.ndarray, scores: np.ndarray, ramp: np.ndarray, gap: int, first: int, local: bool) -> np.ndarray:
+    """
+    :param first: value of the row at column 0
+    :param local: floor at zero (Smith-Waterman) or not (anchored at the corner)
+    """
+    row = np.empty(len(prior), dtype=np.int32)
+    row[0] = first
+    row[1:] = np.maximum(prior[:-1] + scores, prior[1:] - gap)
+    if local:
+        np.maximum(row, 0, out=row)
+    return np.maximum.accumulate(row + ramp) - ramp
+
+
+def _find_end(q: np.ndarray, t: np.ndarray, match: int, mismatch: int, gap: int) -> Tuple[int, int, int]:
+    """
+    Best local score and the first cell (row major) with it, keeping one row.
+    """
+    ramp = np.arange(len(t) + 1, dtype=np.int32) * gap
+    prior = np.zeros(len(t) + 1, dtype=np.int32)
+    best, end = 0, (0, 0)
+    for i in range(1, len(q) + 1):
+        prior = _next_row(prior, _row_scores(q, t, i - 1, match, mismatch), ramp, gap, 0, True)
+        j = int(np.argmax(prior))
+        if prior[j] > best:
+            best, end = int(prior[j]), (i, j)
+    return best, end[0], end[1]
+
+
+def _find_start(q: np.ndarray, t: np.ndarray, best: int, match: int, mismatch: int, gap: int) -> Tuple[int, int]:
+    """
+    Length (rows, columns) of the shortest alignment anchored at the start of q and t that scores best.
+    q and t are the reversed prefixes that end at the end cell, so this is where the best alignment starts.
+    """
+    ramp = np.arange(len(t) + 1, dtype=np.int32) * gap
+    prior = -ramp
+    if best == 0:
+        return 0, 0
+    for i in range(1, len(q) + 1):
+        prior = _next_row(prior, _row_scores(q, t, i - 1, match, mismatch), ramp, gap, -gap * i, False)
+        found = np.flatnonzero(prior == best)
+        if len(found):
+            return i, int(found[0])
+    return len(q), len(t)
+
+
+def local_align(query: str, target: str, match: int = 2, mismatch: int = -1, gap: int = 2) -> Tuple[int, List[Tuple[int, int]]]:
+    """
+    :param query: e.g. the sequence of the chain
+    :param target: e.g. the Uniprot sequence
+    :param match: score of identical letters. X matches nothing.
+    :param mismatch: score of differing letters
+    :param gap: penalty per gap position (positive)
+    :return: score, list of aligned (query index, target index) pairs (0-based, gaps omitted)
+    """
+    m, n = len(query), len(target)
+    if m == 0 or n == 0:
+        return 0, []
+    q = np.frombuffer(query.encode(), dtype=np.uint8)
+    t = np.frombuffer(target.encode(), dtype=np.uint8)
+    best, end_i, end_j = _find_end(q, t, match, mismatch, gap)
+    if best == 0:
+        return 0, []
+    rows, columns = _find_start(q[:end_i][::-1], t[:end_j][::-1], best, match, mismatch, gap)
+    begin_i, begin_j = end_i - rows, end_j - columns
+    # the window of the alignment in full, for the traceback.
+    wq, wt = q[begin_i:end_i], t[begin_j:end_j]
+    ramp = np.arange(len(wt) + 1, dtype=np.int32) * gap
+    H = np.zeros((len(wq) + 1, len(wt) + 1), dtype=np.int32)
+    for i in range(1, len(wq) + 1):
+        H[i] = _next_row(H[i - 1], _row_scores(wq, wt, i - 1, match, mismatch), ramp, gap, 0, True)
+    i, j = len(wq), len(wt)
+    pairs = []
+    while i > 0 and j > 0 and H[i, j] > 0:
+        score = match if wq[i - 1] == wt[j - 1] and wq[i - 1] != ord('X') else mismatch
+        if H[i, j] == H[i - 1, j - 1] + score:
+            i, j = i - 1, j - 1
+            pairs.append((int(i) + begin_i, int(j) + begin_j))
+        elif H[i, j] == H[i - 1, j] - gap:
+            i -= 1
+        elif H[i, j] == H[i, j - 1] - gap:
+            j -= 1
+        else:
+            break
+    pairs.reverse()
+    return best, pairs
+
+
+def get_offset_by_alignment(chain_sequence: str, residues: List[Tuple[int, str]], sequence: str, start: int = 1) -> Dict:
+    """
+    Aligns the CA trace of a chain (see ``pdb_parser.get_ca_trace``) against the Uniprot sequence (or a stretch of it).
+
+    The offset is as in ``Structure.offset``, the number *subtracted* from the PDB index to match Uniprot,
+    i.e. uniprot position - PDB resi, and is the most common across the aligned pairs.
+
+    :param chain_sequence: one letter sequence of the residues with coordinates
+    :param residues: (resi, icode) of the above
+    :param sequence: Uniprot sequence or a stretch of it
+    :param start: Uniprot position of the first letter of ``sequence``
+    :return: {'offset': int or None, 'identity': matched/aligned, 'coverage': aligned/chain residues,
+              'aligned': int, 'gaps': gap openings, 'gap_length': gap positions, 'consensus': fraction of pairs agreeing on the offset,
+              'score': alignment score}
+    """
+    score, pairs = local_align(chain_sequence, sequence)
+    details = {'offset': None, 'identity': 0., 'coverage': 0., 'aligned': len(pairs), 'gaps': 0, 'gap_length': 0,
+               'consensus': 0., 'score': score}
+    if not pairs:
+        return details
+    matched = [(qi, ti) for qi, ti in pairs if chain_sequence[qi] == sequence[ti]]
+    offsets = Counter(ti + start - residues[qi][0] for qi, ti in matched)
+    if offsets:
+        offset, votes = offsets.most_common(1)[0]
+        details['offset'] = offset
+        details['consensus'] = votes / len(matched)
+    for (qa, ta), (qb, tb) in zip(pairs, pairs[1:]):
+        skipped = (qb - qa - 1) + (tb - ta - 1)
+        if skipped:
+            details['gaps'] += 1
+            details['gap_length'] += skipped
+    details['identity'] = len(matched) / len(pairs)
+    details['coverage'] = len(pairs) / len(chain_sequence)
+    return details
@@ -12,8 +12,10 @@ This is old code.
 """
 ################## Environment ###########################
 
-import os, json
+import os, json, time
 import zipfile
+from threading import Lock, Timer
+from collections import defaultdict
 from pprint import PrettyPrinter
 
 #these are needed for reference file retrieval
@@ -49,6 +51,140 @@ _refs = (
     'ftp://ftp.ebi.ac.uk/pub/databases/msd/sifts/flatfiles/tsv/pdb_chain_uniprot.tsv.gz')
 
 
+class ReferenceTelemetry:
+    """
+    Tallies of how the reference files are used, per ``kind`` (as in ``global_settings.open(kind)``).
+
+    * ``opens`` times the file was opened
+    * ``bytes_read`` characters read off the handle (text mode, so bytes for these ascii files)
+    * ``seconds`` time between opening and closing/exhausting the handle, i.e. the scan duration
+    * ``cache_hits`` times a cached/indexed copy was used instead of opening the file. See ``.hit(kind)``
+
+    Thread safe as UniprotMasterReader runs 50 threads.
+    """
+    fields = ('opens', 'bytes_read', 'seconds', 'cache_hits')
+
+    def __init__(self):
+        self._lock = Lock()
+        self._tally = defaultdict(lambda: dict.fromkeys(self.fields, 0))
+        self._timer = None
+
+    def record(self, kind:str, **increments):
+        with self._lock:
+            for field, value in increments.items():
+                self._tally[kind][field] += value
+
+    def hit(self, kind:str):
+        """
+        Records that a lookup was served from memory/index instead of the reference file.
+        """
+        self.record(kind, cache_hits=1)
+
+    def snapshot(self) -> dict:
+        """
+        :return: dict of kind -> dict of field -> value. A copy, safe to json.dump.
+        """
+        with self._lock:
+            return {kind: {**fields, 'seconds': round(fields['seconds'], 6)} for kind, fields in self._tally.items()}
+
+    def reset(self):
+        with self._lock:
+            self._tally.clear()
+
+    def dump(self, filename:str):
+        """
+        Writes the snapshot to file as JSON (with a timestamp).
+        """
+        with open(filename, 'w') as fh:
+            json.dump({'timestamp': time.time(), 'references': self.snapshot()}, fh)
+
+    def start_periodic_dump(self, filename:str, interval:float=60):
+        """
+        Dumps the snapshot to ``filename`` every ``interval`` seconds on a daemon timer thread.
+        Call ``.stop_periodic_dump()`` to stop.
+        """
+        self.stop_periodic_dump()
+
+        def repeat():
+            self.dump(filename)
+            self.start_periodic_dump(filename, interval)
+
+        self._timer = Timer(interval, repeat)
+        self._timer.daemon = True
+        self._timer.start()
+        return self
+
+    def stop_periodic_dump(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return self
+
+
+class _TelemetryHandle:
+    """
+    Wraps a file handle opened by ``GlobalSettings.open`` so that reads are tallied in ``ReferenceTelemetry``.
+    It behaves as the file handle (iteration, ``with``, ``.read``, ``.readline`` and the rest via ``__getattr__``).
+    """
+
+    def __init__(self, fh, kind:str, telemetry:ReferenceTelemetry):
+        self._fh = fh
+        self._kind = kind
+        self._telemetry = telemetry
+        self._start = time.perf_counter()
+        self._bytes = 0
+        self._finished = False
+        telemetry.record(kind, opens=1)
+
+    def _finish(self):
+        if not self._finished:
+            self._finished = True
+            self._telemetry.record(self._kind,
+                                   bytes_read=self._bytes,
+                                   seconds=time.perf_counter() - self._start)
+
+    def read(self, *args):
+        data = self._fh.read(*args)
+        self._bytes += len(data)
+        return data
+
+    def readline(self, *args):
+        line = self._fh.readline(*args)
+        self._bytes += len(line)
+        return line
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            line = next(self._fh)
+        except StopIteration:
+            self._finish()
+            raise
+        self._bytes += len(line)
+        return line
+
+    def close(self):
+        self._finish()
+        return self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        # several parsers never close the handle...
+        self._finish()
+
+    def __getattr__(self, item):
+        if item[0] == '_':  # avoids recursion if __init__ failed.
+            raise AttributeError(item)
+        return getattr(self._fh, item)
+
+
 class GlobalSettings(metaclass=Singleton):
     """
     This class is container for the paths, which are used by both Variant and Tracker classes.
@@ -104,6 +240,7 @@ class GlobalSettings(metaclass=Singleton):
         self._obodict={}
         self.home_url = home_url
         self._initialised = False
+        self.telemetry = ReferenceTelemetry() #: tallies of reference file usage per kind. see .telemetry.snapshot()
 
     def startup(self, data_folder='data'):
         if self._initialised:
@@ -220,16 +357,25 @@ class GlobalSettings(metaclass=Singleton):
             pass #not a compressed file
         return self
 
-    def _open_reference(self, file, mode='r'):
+    def _open_reference(self, file, mode='r', retrieve=True):
         fullfile = os.path.join(self.reference_folder, file)
         if mode == 'w':
             return open(fullfile, 'w')
-        elif not os.path.isfile(fullfile):
+        elif not os.path.isfile(fullfile) and retrieve:
             self.retrieve_references(issue = fullfile)
         ## handle compression
-        return open(fullfile)
+        return open(fullfile, mode)
 
-    def open(self, kind):
+    def open(self, kind, mode='r', retrieve=True):
+        """
+        Opens a reference file by kind. The handle is tallied in ``.telemetry``.
+
+        :param kind: see kdex. or swissmodel + taxid
+        :param mode: r or rb (the latter for indexing by byte offset)
+        :param retrieve: if the file is missing, offer to retrieve the references (interactive).
+            False raises FileNotFoundError instead, for what runs on the server (e.g. ``check_elm``).
+        :return: file handle
+        """
         kdex = {'ExAC_pLI': 'fordist_cleaned_exac_r03_march16_z_pli_rec_null_data.txt',
                 'ExAC_vep': 'ExAC.r1.sites.vep.vcf',
                 'ID_mapping': 'HUMAN_9606_idmapping_selected.tab',
@@ -249,20 +395,43 @@ class GlobalSettings(metaclass=Singleton):
             taxid = kind.replace('swissmodel','')
             if taxid == '':
                 taxid = '9606' #legacy.
-            return self._open_reference(f'{taxid}_meta/SWISS-MODEL_Repository/INDEX.json')
+            fh = self._open_reference(f'{taxid}_meta/SWISS-MODEL_Repository/INDEX.json', mode, retrieve)
         else:
             assert kind in kdex, 'This is weird. unknown kind, should be: {0}'.format(list(kdex.keys()))
-            return self._open_reference(kdex[kind])
+            fh = self._open_reference(kdex[kind], mode, retrieve)
+        return _TelemetryHandle(fh, kind, self.telemetry)
+
+    def dump_telemetry(self, filename=None, interval=0):
+        """
+        Writes the reference usage tallies (``.telemetry.snapshot()``) to a JSON file.
+
+        :param filename: defaults to reference_telemetry.json in the data folder.
+        :param interval: if non-zero, keep dumping every ``interval`` seconds (``.telemetry.stop_periodic_dump()`` stops it).
+        :return: filename
+        """
+        if filename is None:
+            filename = os.path.join(self.data_folder, 'reference_telemetry.json')
+        if interval:
+            self.telemetry.start_periodic_dump(filename, interval)
+        else:
+            self.telemetry.dump(filename)
+        return filename
 
     def create_json_from_idx(self, infile, outfile):
+        """
+        Converts resolu.idx to a JSON dictionary of IDCODE to resolution (float or None if blank).
+        It used to be a list of dict, which required a linear scan per lookup. ``Structure.load_resolutions`` reads both.
+        """
         # resolu.idx is in the weirdest format.
         fh = self._open_reference(infile)
         for row in fh:
             if not row.strip():
                 break
-        header = next(fh).split()
+        header = [h.strip() for h in next(fh).split(';')]  # IDCODE\t\t;\tRESOLUTION
         next(fh) #dashes
         parts = [dict(zip(header, [f.strip() for f in row.split(';')])) for row in fh if row.strip()]
-        json.dump(parts, self. _open_reference(outfile, mode='w'))
+        keyed = {part['IDCODE']: float(part['RESOLUTION']) if part.get('RESOLUTION') else None for part in parts}
+        with self._open_reference(outfile, mode='w') as w:
+            json.dump(keyed, w)
 
 global_settings = GlobalSettings()
\ No newline at end of file
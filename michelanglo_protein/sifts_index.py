@@ -0,0 +1,90 @@
+__doc__ = """
+The SIFTS table ``pdb_chain_uniprot.tsv`` has hundreds of thousands of rows and is sorted by PDB code.
+Scanning it for every structure (``Structure._get_sifts``) made generation do millions of full-file scans.
+
+``SiftsIndex`` scans it once per process and keeps the byte spans of the rows of each PDB code,
+so the rows of a code are a seek and a short read.
+
+    >>> SiftsIndex.get('1ubq')
+    [{'PDB': '1ubq', 'CHAIN': 'A', 'SP_PRIMARY': 'P0CG48', 'RES_BEG': '1', ...}]
+
+The index is shared across threads (UniprotMasterReader) and across forked processes if built before the fork (``SiftsIndex.build()``).
+"""
+
+import os
+from threading import Lock
+from typing import Dict, List, Tuple
+from .settings_handler import global_settings  # the instance not the class.
+
+
+class SiftsIndex:
+    settings = global_settings
+    kind = 'pdb_chain_uniprot'
+    headers = 'PDB     CHAIN   SP_PRIMARY      RES_BEG RES_END PDB_BEG PDB_END SP_BEG  SP_END'.split()
+    _spans = None  #: dict of lowercase PDB code -> list of (start, stop) byte offsets
+    _path = None
+    _lock = Lock()
+
+    @classmethod
+    def build(cls, refresh=False) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        Scans ``pdb_chain_uniprot.tsv`` once. Thread safe. Called by ``.get`` if not done already.
+
+        :param refresh: rescan even if done (say the file was updated).
+        :return: the spans dictionary.
+        """
+        with cls._lock:
+            if cls._spans is not None and not refresh:
+                return cls._spans
+            spans = {}
+            with cls.settings.open(cls.kind, mode='rb') as fh:
+                position = 0
+                for row in fh:
+                    start = position
+                    position += len(row)
+                    if row[:1] == b'#' or row[:3] == b'PDB':  # comment and header
+                        continue
+                    code = row[0:4].decode()
+                    if code in spans and spans[code][-1][1] == start:
+                        spans[code][-1] = (spans[code][-1][0], position)  # extend contiguous block
+                    else:
+                        spans.setdefault(code, []).append((start, position))
+                cls._path = fh.name
+            cls._spans = spans
+            return spans
+
+    @classmethod
+    def get_rows(cls, code: str) -> List[str]:
+        """
+        :param code: PDB code (any case)
+        :return: the raw rows for the code.
+        """
+        spans = cls._spans if cls._spans is not None else cls.build()
+        code = code.lower()
+        if code not in spans:
+            return []
+        cls.settings.telemetry.hit(cls.kind)
+        rows = []
+        with open(cls._path, 'rb') as fh:
+            for start, stop in spans[code]:
+                fh.seek(start)
+                rows.extend(fh.read(stop - start).decode().splitlines())
+        return rows
+
+    @classmethod
+    def get(cls, code: str) -> List[Dict[str, str]]:
+        """
+        :param code: PDB code (any case)
+        :return: list of dict with the SIFTS headers as keys (values are str, as in the file). One per chain.
+        """
+        return [dict(zip(cls.headers, row.split())) for row in cls.get_rows(code) if row.strip()]
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._spans = None
+            cls._path = None
+
+    @classmethod
+    def is_built(cls) -> bool:
+        return cls._spans is not None
@@ -0,0 +1,317 @@
+__doc__ = """
+Residue level Uniprot <-> PDB numbering of the chains of a PDB entry, as integer arrays.
+A single offset per chain (``Structure.offset``) is wrong for chains with gaps, insertion codes or several segments.
+
+    >>> mapping = SiftsMapping.get('1ubq', 'A')
+    >>> mapping.to_pdb(10)  # Uniprot position -> (resi, icode) or None
+    (10, '')
+    >>> mapping.to_uniprot(10, '')
+    10
+
+Sources, best first:
+
+* the store: per entry .npz files of the residue pairs (``{code}.npz`` in ``reference/sifts``) made from the XMLs
+  at generation (``SiftsMapping.generate``, ``sandbox.store_sifts_mappings``) or when an XML is first read.
+  The file name is the index: a lookup reads one small file, not the XML.
+* the residue level SIFTS XML of the entry (``{code}.xml.gz`` in ``reference/sifts``, see ``SiftsMapping.xml_url``),
+  which has every residue, insertion codes and all.
+* the segments of ``pdb_chain_uniprot.tsv`` via ``SiftsIndex``. A segment whose PDB ends have insertion codes
+  or whose Uniprot and PDB spans differ in length cannot be interpolated and is skipped.
+
+Parsed mappings are kept in a class level LRU (``SiftsMapping.memory_size`` entries).
+The renumbering of the coordinates (``Structure.get_offset_coordinates``) is still done by PyMOL:
+these mappings are for translating positions.
+"""
+
+import os, gzip, re
+from warnings import warn
+from array import array
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Tuple, Optional, Iterable
+from xml.etree import ElementTree
+import numpy as np
+from .settings_handler import global_settings  # the instance not the class.
+from .sifts_index import SiftsIndex
+
+missing = -2 ** 31  #: array value for no counterpart
+
+
+class ChainMapping:
+    """
+    Uniprot position -> PDB (resi, icode) and back for one chain. Lookups are array indexing.
+    Residues with insertion codes (rare) are kept in dictionaries aside.
+    """
+    __slots__ = ('code', 'chain', 'uniprot', 'sp_start', 'pdb_start', '_to_resi', '_to_uniprot', '_icodes', '_icoded')
+
+    def __init__(self, code: str, chain: str, uniprot: str, pairs: Iterable[Tuple[int, int, str]]):
+        """
+        :param pairs: (uniprot position, PDB resi, PDB icode)
+        """
+        self.code = code
+        self.chain = chain
+        self.uniprot = uniprot
+        pairs = sorted(set(pairs))
+        self._icodes = {}  # uniprot position -> icode
+        self._icoded = {}  # (resi, icode) -> uniprot position
+        plain = [(position, resi) for position, resi, icode in pairs if not icode]
+        for position, resi, icode in pairs:
+            if icode:
+                self._icodes[position] = icode
+                self._icoded[(resi, icode)] = position
+        self.sp_start = min((p[0] for p in pairs), default=0)
+        self.pdb_start = min((p[1] for p in plain), default=0)
+        sp_end = max((p[0] for p in pairs), default=-1)
+        pdb_end = max((p[1] for p in plain), default=-1)
+        self._to_resi = array('i', [missing]) * (sp_end - self.sp_start + 1)
+        self._to_uniprot = array('i', [missing]) * (pdb_end - self.pdb_start + 1)
+        for position, resi, icode in pairs:
+            self._to_resi[position - self.sp_start] = resi
+        for position, resi in plain:
+            self._to_uniprot[resi - self.pdb_start] = position
+
+    def __len__(self):
+        return len(self._to_resi) - self._to_resi.count(missing)
+
+    def to_pdb(self, position: int) -> Optional[Tuple[int, str]]:
+        """
+        :param position: Uniprot position
+        :return: (resi, icode) or None if not in the chain.
+        """
+        i = position - self.sp_start
+        if not 0 <= i < len(self._to_resi) or self._to_resi[i] == missing:
+            return None
+        return self._to_resi[i], self._icodes.get(position, '')
+
+    def to_uniprot(self, resi: int, icode: str = '') -> Optional[int]:
+        """
+        :param resi: PDB residue index
+        :param icode: insertion code
+        :return: Uniprot position or None.
+        """
+        if icode:
+            return self._icoded.get((resi, icode))
+        i = resi - self.pdb_start
+        if not 0 <= i < len(self._to_uniprot) or self._to_uniprot[i] == missing:
+            return None
+        return self._to_uniprot[i]
+
+    def iter_pairs(self) -> Iterable[Tuple[int, int, str]]:
+        """
+        (uniprot position, PDB resi, PDB icode) as given to ``__init__``.
+        """
+        for i, resi in enumerate(self._to_resi):
+            if resi != missing:
+                yield self.sp_start + i, resi, self._icodes.get(self.sp_start + i, '')
+
+    def get_offsets(self) -> Dict[int, int]:
+        """
+        The offsets (as in ``Structure.offset``, Uniprot - PDB) present and how many residues have each.
+        A chain a single offset can describe has one key.
+        """
+        tally = {}
+        for i, resi in enumerate(self._to_resi):
+            if resi != missing and self.sp_start + i not in self._icodes:
+                offset = self.sp_start + i - resi
+                tally[offset] = tally.get(offset, 0) + 1
+        return tally
+
+
+class SiftsMapping:
+    settings = global_settings
+    xml_url = 'ftp://ftp.ebi.ac.uk/pub/databases/msd/sifts/split_xml/{middle}/{code}.xml.gz'  #: for manual download
+    subfolder = 'sifts'  #: within the reference folder. holds {code}.xml.gz and the stored {code}.npz
+    memory_size = 500
+    _memory = OrderedDict()  #: code -> {chain: ChainMapping}
+    _lock = Lock()
+
+    @classmethod
+    def get(cls, code: str, chain: str) -> Optional[ChainMapping]:
+        """
+        :param code: PDB code (any case)
+        :param chain: chain letter
+        :return: ChainMapping or None if the chain is not in SIFTS.
+        """
+        return cls.get_entry(code).get(chain)
+
+    @classmethod
+    def get_entry(cls, code: str) -> Dict[str, ChainMapping]:
+        """
+        :param code: PDB code (any case)
+        :return: dict of chain -> ChainMapping
+        """
+        code = code.lower()
+        with cls._lock:
+            if code in cls._memory:
+                cls._memory.move_to_end(code)
+                return cls._memory[code]
+        entry = cls.load(code)
+        if entry is None:
+            xml_file = cls.get_xml_filename(code)
+            if os.path.exists(xml_file):
+                entry = cls.from_xml(code, xml_file)
+                cls.save(code, entry)
+            else:
+                entry = cls.from_segments(code, SiftsIndex.get(code))
+        with cls._lock:
+            cls._memory[code] = entry
+            while len(cls._memory) > cls.memory_size:
+                cls._memory.popitem(last=False)
+        return entry
+
+    @classmethod
+    def get_folder(cls) -> str:
+        return os.path.join(cls.settings.reference_folder, cls.subfolder)
+
+    @classmethod
+    def get_xml_filename(cls, code: str) -> str:
+        return os.path.join(cls.get_folder(), f'{code.lower()}.xml.gz')
+
+    @classmethod
+    def get_store_filename(cls, code: str) -> str:
+        return os.path.join(cls.get_folder(), f'{code.lower()}.npz')
+
+    ############################## store
+
+    @classmethod
+    def save(cls, code: str, entry: Dict[str, ChainMapping]):
+        """
+        Stores the residue pairs of the chains of an entry as flat arrays (``counts`` splits them by chain).
+        """
+        mappings = list(entry.values())
+        pairs = [list(mapping.iter_pairs()) for mapping in mappings]
+        flat = [pair for chain_pairs in pairs for pair in chain_pairs]
+        os.makedirs(cls.get_folder(), exist_ok=True)
+        path = cls.get_store_filename(code)
+        temp = f'{path}.{os.getpid()}.tmp.npz'  # numpy adds .npz if missing.
+        np.savez_compressed(temp,
+                            chains=np.array([mapping.chain for mapping in mappings], dtype='U4'),
+                            uniprots=np.array([mapping.uniprot for mapping in mappings], dtype='U16'),
+                            counts=np.array([len(chain_pairs) for chain_pairs in pairs], dtype='i4'),
+                            positions=np.array([pair[0] for pair in flat], dtype='i4'),
+                            resis=np.array([pair[1] for pair in flat], dtype='i4'),
+                            icodes=np.array([pair[2] for pair in flat], dtype='U1'))
+        os.replace(temp, path)
+
+    @classmethod
+    def load(cls, code: str) -> Optional[Dict[str, ChainMapping]]:
+        """
+        :return: the stored entry or None if absent or older than its XML.
+        """
+        path = cls.get_store_filename(code)
+        if not os.path.exists(path):
+            return None
+        xml_file = cls.get_xml_filename(code)
+        if os.path.exists(xml_file) and os.path.getmtime(xml_file) > os.path.getmtime(path):
+            return None
+        entry = {}
+        with np.load(path, allow_pickle=False) as data:
+            start = 0
+            for chain, uniprot, count in zip(data['chains'], data['uniprots'], data['counts']):
+                end = start + int(count)
+                entry[str(chain)] = ChainMapping(code, str(chain), str(uniprot),
+                                                 zip(data['positions'][start:end].tolist(),
+                                                     data['resis'][start:end].tolist(),
+                                                     data['icodes'][start:end].tolist()))
+                start = end
+        return entry
+
+    @classmethod
+    def generate(cls, codes: Optional[Iterable[str]] = None, download: bool = False) -> int:
+        """
+        Stores the mappings of the SIFTS XMLs, for generation.
+
+        :param codes: PDB codes. Default: those with an XML in the folder
+        :param download: fetch the missing XMLs (``xml_url``)
+        :return: number of entries stored
+        """
+        folder = cls.get_folder()
+        os.makedirs(folder, exist_ok=True)
+        if codes is None:
+            codes = [file.replace('.xml.gz', '') for file in os.listdir(folder) if file.endswith('.xml.gz')]
+        stored = 0
+        for code in sorted({code.lower() for code in codes}):
+            xml_file = cls.get_xml_filename(code)
+            if not os.path.exists(xml_file) and download:
+                try:
+                    cls.settings._get_url(cls.xml_url.format(middle=code[1:3], code=code), xml_file)
+                except Exception as error:
+                    warn(f'SIFTS XML of {code} failed: {error.__class__.__name__} {error}')
+                    if os.path.exists(xml_file):
+                        os.remove(xml_file)
+                    continue
+            if not os.path.exists(xml_file):
+                continue
+            cls.save(code, cls.from_xml(code, xml_file))
+            stored += 1
+        return stored
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._memory.clear()
+
+    @staticmethod
+    def _split_resi(text: str) -> Optional[Tuple[int, str]]:
+        r = re.match(r'\s*(-?\d+)\s*([A-Za-z]?)\s*$', str(text))
+        if r is None:
+            return None
+        return int(r.group(1)), r.group(2)
+
+    @classmethod
+    def from_segments(cls, code: str, rows: List[Dict[str, str]]) -> Dict[str, ChainMapping]:
+        """
+        :param rows: ``SiftsIndex.get(code)``
+        """
+        pairs = {}
+        for row in rows:
+            key = (row['CHAIN'], row['SP_PRIMARY'])
+            pairs.setdefault(key, [])
+            begin, end = cls._split_resi(row['PDB_BEG']), cls._split_resi(row['PDB_END'])
+            try:
+                sp_begin, sp_end = int(row['SP_BEG']), int(row['SP_END'])
+            except ValueError:
+                continue
+            if begin is None or end is None or begin[1] or end[1]:
+                continue
+            if end[0] - begin[0] != sp_end - sp_begin:
+                continue
+            pairs[key].extend((sp_begin + i, begin[0] + i, '') for i in range(sp_end - sp_begin + 1))
+        return cls._by_chain(code, pairs)
+
+    @classmethod
+    def from_xml(cls, code: str, file: str) -> Dict[str, ChainMapping]:
+        """
+        Streams a residue level SIFTS XML (gzipped or not).
+        """
+        pairs = {}
+        opener = gzip.open if file.endswith('.gz') else open
+        with opener(file, 'rb') as fh:
+            for event, element in ElementTree.iterparse(fh):
+                if element.tag.split('}')[-1] != 'residue':
+                    continue
+                pdb, uniprot = None, None
+                for crossref in element:
+                    if crossref.tag.split('}')[-1] != 'crossRefDb':
+                        continue
+                    source = crossref.get('dbSource')
+                    if source == 'PDB':
+                        pdb = crossref
+                    elif source == 'UniProt':
+                        uniprot = crossref
+                if pdb is not None and uniprot is not None:
+                    resi = cls._split_resi(pdb.get('dbResNum'))
+                    if resi is not None and uniprot.get('dbResNum', '').isdigit():
+                        key = (pdb.get('dbChainId'), uniprot.get('dbAccessionId'))
+                        pairs.setdefault(key, []).append((int(uniprot.get('dbResNum')), resi[0], resi[1]))
+                element.clear()
+        return cls._by_chain(code, pairs)
+
+    @staticmethod
+    def _by_chain(code: str, pairs: Dict[Tuple[str, str], List]) -> Dict[str, ChainMapping]:
+        # a chain mapping to several Uniprot entries (chimeras) keeps the one with most residues.
+        entry = {}
+        for (chain, uniprot), chain_pairs in sorted(pairs.items(), key=lambda item: len(item[1])):
+            if chain_pairs:
+                entry[chain] = ChainMapping(code, chain, uniprot, chain_pairs)
+        return entry
@@ -1,14 +1,25 @@
 import pickle, os, re, json
 from datetime import datetime
 from .settings_handler import global_settings #the instance not the class.
-import gzip, requests
+import gzip, requests, hashlib
 from michelanglo_transpiler import PyMolTranspiler
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import pymol2
 
 from warnings import warn
 from .metadata_from_PDBe import PDBMeta
-from typing import Dict
+from .sifts_index import SiftsIndex
+from .sifts_mapping import SiftsMapping, ChainMapping
+from .coordinate_cache import CoordinateCache
+from .pdb_parser import get_ca_trace, iter_atoms
+from .cif_parser import cif_to_pdb, bcif_to_pdb
+from .sequence_alignment import get_offset_by_alignment
+from .atom_array import pdb_to_atoms
+import numpy as np
+from typing import Dict, List, Optional, Tuple, Callable
+from array import array
+from bisect import bisect_left
+from threading import Lock
 
 class Structure:
     #lolz. a C++ coder would hate this name. Sturcture as in "protein structure"
@@ -20,8 +31,20 @@ class Structure:
     type = rcsb | swissmodel | homologue
     """
     settings = global_settings
+    coordinate_cache = CoordinateCache()  #: shared. see coordinate_cache.py for settings (offline, ttl, max_size)
+    rcsb_url = 'https://files.rcsb.org/download/{code}.pdb'  #: changeable for a local mirror or test server
+    rcsb_cif_url = 'https://files.rcsb.org/download/{code}.cif'
+    rcsb_bcif_url = 'https://models.rcsb.org/{code}.bcif'
+    rcsb_format = 'pdb'  #: pdb | cif | bcif. pdb falls back to cif for the entries without a PDB file (large assemblies).
+    cif_only_codes = set()  #: codes found to have no PDB file this session. Their PDB download is not reattempted.
+
+    # millions of these are held across the proteome, hence slots and a tuple as pickled state.
+    __slots__ = ('id', 'description', 'x', 'y', 'offset', 'offsets', 'resolution', 'code', 'chain_definitions',
+                 'type', 'chain', '_extra', 'coordinates', 'url',
+                 '_atoms', '_atoms_source')
+    _transient = ('_atoms', '_atoms_source')  #: slots not pickled. Always at the end.
+    _state_version = 1  #: first element of the pickled state tuple.
 
-    #__slots__ = ['id', 'description', 'x', 'y', 'url','type','chain','offset', 'coordinates', 'extra']
     def __init__(self, id, description, x:int, y:int, code, type='rcsb',chain='*',offset:int=0, coordinates=None, extra=None, url=''):
         """
         Stores the structural data for easy use by FeatureViewer and co. Can be converted to StructureAnalyser
@@ -33,22 +56,138 @@ class Structure:
         self.y = int(y)  #: end resi in the whole uniprot protein
         self.offset = int(offset) #: offset is the number *subtracted* from the PDB index to make it match the position in Uniprot.
         self.offsets = {} if chain == '*' else {chain: int(offset)} ### this is going to be the only one.
-        self.pdb_start = None  # no longer used. TO be deleted.
-        self.pdb_end = None   # ditto.
         self.resolution = 0 #: crystal resolution. 0 or lower will trigger special cases
         self.code = code
         self.chain_definitions = [] #filled by SIFT. This is a list with a Dict per chain.
         self.type = type.lower() #: str: rcsb | swissmodel | homologue | www | local | custom
         self.chain = chain #: type str: chain letter or * (all)
-        if extra is None:
-            self.extra = {}
-        else:
-            self.extra = extra
+        self._extra = extra if extra else None  # see .extra. Most are empty so no dict is made until needed.
         self.coordinates = coordinates #: PDBblock
         self.url = url  ## for type = www or local or swissmodel
         # https://files.rcsb.org/download/{self.code}.pdb does not work (often) while the url is something odd.
+        self._atoms = None  # see .atoms
+        self._atoms_source = None
+
+    @property
+    def extra(self) -> Dict:
+        if self._extra is None:
+            self._extra = {}
+        return self._extra
+
+    @extra.setter
+    def extra(self, value: Dict):
+        self._extra = value
+
+    @property
+    def atoms(self) -> np.recarray:
+        """
+        The coordinates as a numpy record array (see atom_array.py). Parsed once per coordinates:
+        if ``.coordinates`` changes (e.g. renumbering) it is parsed again.
+        """
+        if self.coordinates is None:
+            self.get_coordinates()
+        if self._atoms is None or self._atoms_source is not self.coordinates:
+            self._atoms = pdb_to_atoms(self.coordinates)
+            self._atoms_source = self.coordinates
+        return self._atoms
 
-    def is_satisfactory(self, resi:int):
+    @atoms.setter
+    def atoms(self, atoms: np.ndarray):
+        # say from atom_array.load_atoms. It is tied to the current coordinates.
+        self._atoms = atoms
+        self._atoms_source = self.coordinates
+
+    def __getstate__(self):
+        persistent = self.__slots__[:-len(self._transient)]
+        return (self._state_version, tuple(getattr(self, k, None) for k in persistent))
+
+    def __setstate__(self, state):
+        """
+        Accepts the current tuple and the ``__dict__`` of pickles made before slots (migrated on load).
+        ``pdb_start``/``pdb_end`` are dropped, while any other unknown legacy attribute ends up in ``.extra``.
+        """
+        for k in self._transient:
+            setattr(self, k, None)
+        if isinstance(state, tuple) and len(state) == 2 and isinstance(state[1], tuple):
+            version, values = state
+            for k, v in zip(self.__slots__, values):
+                setattr(self, k, v)
+            return
+        # legacy __dict__
+        for k in self.__slots__:
+            setattr(self, k, None)
+        if isinstance(state, tuple):  # (dict, slots-dict) form
+            state = {**(state[0] or {}), **(state[1] or {})}
+        state = dict(state)
+        for k in ('pdb_start', 'pdb_end'):
+            state.pop(k, None)
+        if 'extra' in state:
+            state['_extra'] = state.pop('extra') or None
+        for k in self.__slots__:
+            if k in state:
+                setattr(self, k, state.pop(k))
+        if self.offsets is None:
+            self.offsets = {}
+        if self.chain_definitions is None:
+            self.chain_definitions = []
+        if state:
+            self.extra.update(state)
+
+    def is_satisfactory(self, resi: int):
+        """
+        Checks a custom upload: there is a chain A with residue ``resi`` that has N, CA and C atoms.
+        If there are no ``chain_definitions`` they are made from the CA atoms.
+        The PDB block (or mmCIF, which is converted) is read by the streaming parser (pdb_parser.py):
+        PyMOL is started only if the sole chain needs moving to A or if the parser fails on the block.
+
+        :param resi: residue index in chain A
+        :return: None. AssertionError if unsatisfactory.
+        """
+        if self.coordinates.lstrip().startswith('data_'):  # mmCIF upload
+            self.coordinates = cif_to_pdb(self.coordinates)[0]
+        try:
+            residex, chains, names = self._survey_atoms(resi)
+        except ValueError:  # non-standard columns. PyMOL is more lenient.
+            return self._is_satisfactory_by_pymol(resi)
+        if len(residex) == 1 and 'A' not in residex:
+            return self._is_satisfactory_by_pymol(resi)
+        self._define_custom_chains(residex, 'custom protein')
+        assert chains, 'Given protein had no valid data to load'
+        assert 'A' in chains, 'Given protein has no chain A'
+        assert names, f'Given protein has no residue {resi} in chain A'
+        for name in ('N', 'CA', 'C'):
+            assert name in names, f'Given protein has no {name} atom in residue {resi} in chain A'
+
+    def _survey_atoms(self, resi: int) -> Tuple[Dict[str, List[int]], set, set]:
+        """
+        One pass over the atoms for ``is_satisfactory``.
+
+        :return: residex (chain -> resi of CA atoms), chains with any atom, atom names of residue ``resi`` of chain A
+        """
+        residex = defaultdict(list)
+        chains = set()
+        names = set()
+        for atom in iter_atoms(self.coordinates):
+            name, chain, atom_resi, icode = atom[2], atom[5], atom[6], atom[7]
+            chains.add(chain)
+            if name == 'CA':
+                residex[chain].append(atom_resi)
+            if chain == 'A' and atom_resi == resi and not icode:
+                names.add(name)
+        return residex, chains, names
+
+    def _define_custom_chains(self, residex: Dict[str, List], note: str):
+        if not self.chain_definitions:
+            self.chain_definitions = [{'chain': chain,
+                                  'uniprot': "XXX",
+                                  'x': min(residex[chain]),
+                                  'y': max(residex[chain]),
+                                  'offset': 0,
+                                  'range': f'0-9999',
+                                  'name': self.code,
+                                  'description': note} for chain in residex]
+
+    def _is_satisfactory_by_pymol(self, resi: int):
         with pymol2.PyMOL() as pymol:
             pymol.cmd.read_pdbstr(self.coordinates, 'given_protein')
             residex = defaultdict(list)
@@ -62,15 +201,7 @@ class Structure:
                 move = list(residex.values())[0]
                 residex = {'A': move}
                 self.coordinates = pymol.cmd.get_pdbstr()
-            if not self.chain_definitions:
-                self.chain_definitions = [{'chain': chain,
-                                      'uniprot': "XXX",
-                                      'x': min(residex[chain]),
-                                      'y': max(residex[chain]),
-                                      'offset': 0,
-                                      'range': f'0-9999',
-                                      'name': self.code,
-                                      'description': note} for chain in residex]
+            self._define_custom_chains(residex, note)
             assert pymol.cmd.select('given_protein'), 'Given protein had no valid data to load'
             assert pymol.cmd.select('chain A'), 'Given protein has no chain A'
             assert pymol.cmd.select(f'chain A and resi {resi}'), f'Given protein has no residue {resi} in chain A'
@@ -84,43 +215,126 @@ class Structure:
     def __str__(self):
         return str(self.to_dict())
 
-    def get_coordinates(self) -> str:
+    def get_remote_reference(self) -> Optional[Tuple[str, str]]:
         """
-        Gets the coordinates (PDB block) based on ``self.url`` and ``self.type``
-        :return: coordinates
-        :rtype: str
+        What identifies a remotely fetched model in ``coordinate_cache`` and where to get it.
+
+        :return: (code or url, url) or None if the type is local or custom.
         """
         if self.type == 'rcsb':
-            r = requests.get(f'https://files.rcsb.org/download/{self.code}.pdb')
+            return self.code, self.rcsb_url.format(code=self.code)
         elif self.type == 'swissmodel':
             assert self.url, 'No URL provided for SWISSMODEL retrieval'
-            r = requests.get(self.url, allow_redirects=True)
+            return self.url, self.url
         elif self.type == 'www':
             assert self.url, 'No URL provided for www retrieval'
-            r = requests.get(self.url)
-        elif self.type == 'local':
+            return self.url, self.url
+        elif self.type in ('local', 'custom'):
+            return None
+        else:
+            raise ValueError(f'Model type {self.type}  for {self.id} could not be recognised.')
+
+    def get_coordinates(self) -> str:
+        """
+        Gets the coordinates (PDB block) based on ``self.url`` and ``self.type``.
+        Remote ones go via ``Structure.coordinate_cache`` (see coordinate_cache.py), so only the first call fetches.
+        :return: coordinates
+        :rtype: str
+        """
+        remote = self.get_remote_reference()
+        if self.type == 'local':
             assert self.url, 'No filepath provided for local retrieval'
-            self.coordinates = open(self.url).read()
+            if '::' in self.url:  # member of a ModelRepository
+                from .model_repository import ModelRepository  # it imports Structure.
+                self.coordinates = ModelRepository.read_url(self.url)
+            else:
+                self.coordinates = open(self.url).read()
             return self.coordinates
         elif self.type == 'custom': # provided.
             assert self.coordinates, 'No coordinates provided for custom retrieval'
             return self.coordinates
-        else:
-            raise ValueError(f'Model type {self.type}  for {self.id} could not be recognised.')
-        if r.status_code == 200:
-            self.coordinates = r.text
+        coordinates = self._fetch_remote()
+        if coordinates is not None:
+            self.coordinates = coordinates
         else:
             warn(f'Model {self.code} ({self.url}) failed.')
         return self.coordinates
 
+    def _fetch_remote(self, getter: Optional[Callable] = None) -> Optional[str]:
+        """
+        The unrenumbered coordinates of a remote model via the coordinate cache.
+        RCSB entries as mmCIF or BinaryCIF (``.rcsb_format``) are converted to PDB blocks with only the chains of the structure.
+
+        :param getter: see ``CoordinateCache.fetch`` (used by ``prefetch_structures``)
+        """
+        reference, url = self.get_remote_reference()
+        if self.type != 'rcsb':
+            return self.coordinate_cache.fetch(self.type, reference, url, getter=getter)
+        elif self.rcsb_format != 'pdb':
+            return self._fetch_cif(self.rcsb_format, getter)
+        elif self.code not in self.cif_only_codes:
+            coordinates = self.coordinate_cache.fetch(self.type, reference, url, getter=getter)
+            if coordinates is not None:
+                return coordinates
+        coordinates = self._fetch_cif('cif', getter)  # no PDB file. e.g. ribosomes.
+        if coordinates is not None:
+            self.cif_only_codes.add(self.code)
+        return coordinates
+
+    def get_fetch_key(self) -> Optional[Tuple]:
+        """
+        What ``._fetch_remote`` downloads: structures with the same key are one download. None if not remote.
+        """
+        remote = self.get_remote_reference()
+        if remote is None:
+            return None
+        elif self.type == 'rcsb' and (self.rcsb_format != 'pdb' or self.code in self.cif_only_codes):
+            return self.type, remote[0], self.rcsb_format, tuple(self.get_materialised_chains() or ())
+        return self.type, remote[0]
+
+    def get_materialised_chains(self) -> Optional[List[str]]:
+        """
+        The chains worth reading from a mmCIF: those of ``chain_definitions`` and ``.chain``. None for all.
+        """
+        chains = {definition['chain'] for definition in self.chain_definitions or []}
+        if self.chain and self.chain != '*':
+            chains.add(self.chain)
+        return sorted(chains) if chains else None
+
+    def _fetch_cif(self, form: str, getter: Optional[Callable] = None) -> Optional[str]:
+        """
+        :param form: cif | bcif
+        :param getter: see ``CoordinateCache.fetch``
+        """
+        chains = self.get_materialised_chains()
+        url = (self.rcsb_cif_url if form == 'cif' else self.rcsb_bcif_url).format(code=self.code)
+
+        def parser(response):
+            if form == 'cif':  # streamed
+                pdbblock, aliases = cif_to_pdb(response.iter_lines(decode_unicode=True), chains)
+            else:
+                pdbblock, aliases = bcif_to_pdb(response.content, chains)
+            if aliases:
+                warn(f'{self.code} chain identifiers do not fit in a PDB file and were renamed: {aliases}')
+            return pdbblock
+
+        reference = f'{self.code}.{form}:{",".join(chains) if chains else "*"}'
+        return self.coordinate_cache.fetch(self.type, reference, url, getter=getter, parser=parser)
+
     def get_offset_coordinates(self):
         """
         Gets the coordinates and offsets them.
+        The renumbering (a PyMOL session over the whole PDB block) depends only on the coordinates,
+        the chain_definitions and the chain, so the result is cached on those in memory and in ``coordinate_cache``.
         :return:
         """
         if not self.chain_definitions:
             self.lookup_sifts()
-        self.coordinates = PyMolTranspiler().renumber(self.get_coordinates(), self.chain_definitions, make_A=self.chain).raw_pdb
+        coordinates = self.get_coordinates()
+        key = self._get_renumbering_key(coordinates)
+        if self._recall_renumbering(key):
+            return self.coordinates
+        self.coordinates = PyMolTranspiler().renumber(coordinates, self.chain_definitions, make_A=self.chain).raw_pdb
         if self.chain != 'A':
             ### fix this horror.
             for i, c in enumerate(self.chain_definitions):
@@ -135,8 +349,57 @@ class Structure:
                 if self.chain_definitions[i]['chain'] == 'XXX':
                     self.chain_definitions[i]['chain'] = self.chain
                     break
+        self._store_renumbering(key)
         return self.coordinates
 
+    ############## renumbering cache. shared across all instances.
+    _renumbered = OrderedDict()  #: key -> (PDB block, chain_definitions). least recently used first.
+    renumbered_memory_size = 20  #: PDB blocks kept in memory. They can be MBs.
+    _renumbered_lock = Lock()
+
+    def _get_renumbering_key(self, coordinates: str) -> str:
+        definitions = json.dumps(self.chain_definitions, sort_keys=True, default=str)
+        return hashlib.sha1(f'{self.chain}\n{definitions}\n{coordinates}'.encode()).hexdigest()
+
+    def _recall_renumbering(self, key: str) -> bool:
+        """
+        Fills ``.coordinates`` and ``.chain_definitions`` from the memory or disk cache.
+
+        :return: whether it was cached.
+        """
+        with self._renumbered_lock:
+            if key in self._renumbered:
+                self._renumbered.move_to_end(key)
+                coordinates, chain_definitions = self._renumbered[key]
+            else:
+                coordinates, chain_definitions = None, None
+        if coordinates is None and self.coordinate_cache.enabled:
+            stored = self.coordinate_cache.get('renumbered', key, allow_stale=True)  # deterministic, so it never expires.
+            if stored is not None:
+                data = json.loads(stored)
+                coordinates, chain_definitions = data['coordinates'], data['chain_definitions']
+                self._remember_renumbering(key, coordinates, chain_definitions)
+        if coordinates is None:
+            return False
+        self.coordinates = coordinates
+        self.chain_definitions = [dict(definition) for definition in chain_definitions]  # these get altered downstream.
+        return True
+
+    def _store_renumbering(self, key: str):
+        chain_definitions = [dict(definition) for definition in self.chain_definitions]
+        self._remember_renumbering(key, self.coordinates, chain_definitions)
+        if self.coordinate_cache.enabled:
+            self.coordinate_cache.put('renumbered', key, json.dumps({'coordinates': self.coordinates,
+                                                                     'chain_definitions': chain_definitions}))
+
+    @classmethod
+    def _remember_renumbering(cls, key: str, coordinates: str, chain_definitions: List[Dict]):
+        with cls._renumbered_lock:
+            cls._renumbered[key] = (coordinates, chain_definitions)
+            cls._renumbered.move_to_end(key)
+            while len(cls._renumbered) > cls.renumbered_memory_size:
+                cls._renumbered.popitem(last=False)
+
     def includes(self, position, offset=0):
         """
         Generally there should not be an offset as x and y are from Uniprot data so they are already fixed!
@@ -178,20 +441,19 @@ class Structure:
                             detail[k] = None
                         else:
                             detail[k] = int(r.group(1)) #yes. py int is signed
-                ## get offset
+                ## get offset. One per row: it used to be the offset of the last row for all chains.
+                ## it is still a single number per segment. see .get_residue_mapping for the exact numbering.
                 if detail['PDB_BEG'] is not None:  ##nice.
-                    offset = detail['SP_BEG'] - detail['PDB_BEG']
+                    detail['offset'] = detail['SP_BEG'] - detail['PDB_BEG']
                 elif detail['PDB_END'] is not None:
-                    offset = detail['SP_BEG'] - ( detail['PDB_END'] - (detail['SP_END'] - detail['SP_BEG']))
-                elif detail['SP_BEG']:
-                    offset = 0
+                    detail['offset'] = detail['SP_BEG'] - ( detail['PDB_END'] - (detail['SP_END'] - detail['SP_BEG']))
                 else:
-                    offset = 0
+                    detail['offset'] = 0
             self.chain_definitions = [{'chain': d['CHAIN'],
                                        'uniprot': d['SP_PRIMARY'],
                                        'x': d["SP_BEG"],
                                        'y': d["SP_END"],
-                                       'offset': offset,
+                                       'offset': d['offset'],
                                        'range': f'{d["SP_BEG"]}-{d["SP_END"]}',
                                        'name': None,
                                        'description': None} for d in details]
@@ -205,107 +467,142 @@ class Structure:
         self.offsets = {d['chain']: d['offset'] for d in self.chain_definitions}
         return self
 
+    def get_residue_mapping(self, chain: Optional[str] = None) -> Optional[ChainMapping]:
+        """
+        The residue level Uniprot <-> PDB numbering of a chain (see sifts_mapping.py).
+        Unlike ``.offset`` it is right for gaps, insertion codes and segmented chains.
+
+            >>> structure.get_residue_mapping().to_pdb(position)  # (resi, icode) or None
+
+        :param chain: defaults to ``self.chain``
+        :return: ChainMapping or None if not an RCSB entry or not in SIFTS.
+        """
+        if self.type != 'rcsb':
+            return None
+        return SiftsMapping.get(self.code, chain if chain is not None else self.chain)
+
     def _get_sifts(self, all_chains=True): #formerly called .lookup_pdb_chain_uniprot
-        details = []
-        headers = 'PDB     CHAIN   SP_PRIMARY      RES_BEG RES_END PDB_BEG PDB_END SP_BEG  SP_END'.split()
-        with self.settings.open('pdb_chain_uniprot') as fh:
-            for row in fh:
-                if self.code.lower() == row[0:4]:
-                    entry = dict(zip(headers, row.split()))
-                    if self.chain == entry['CHAIN'] or all_chains:
-                        details.append(entry)
-        return details
+        """
+        The SIFTS rows for the code. These come from ``SiftsIndex``, which scans pdb_chain_uniprot.tsv once per process.
+
+        :param all_chains: if False only the rows of ``self.chain``
+        :return: list of dict with keys PDB CHAIN SP_PRIMARY RES_BEG RES_END PDB_BEG PDB_END SP_BEG SP_END (str values)
+        """
+        return [entry for entry in SiftsIndex.get(self.code) if self.chain == entry['CHAIN'] or all_chains]
 
     def get_offset_from_PDB(self, chain_detail: Dict, sequence:str) -> int:
         """
         This gets the offset for a chain in the code given a sequence.
-        It takes 30 ms to run. However, the sequence is problematic.
+        It used to fetch the PDB in PyMOL and slide pepseq windows, which was slow and flaky.
+        Now it aligns the CA trace of the chain against the sequence (see ``.align_chain_to_sequence`` for the statistics).
 
-        :param chain: see SIFTs {'PDB': '5l8o', 'CHAIN': 'C', 'SP_PRIMARY': 'P51161', 'RES_BEG': 1, 'RES_END': 128, 'PDB_BEG': None, 'PDB_END': None, 'SP_BEG': 1, 'SP_END': 128}
-        :type chain: Dict
+        :param chain_detail: see SIFTs {'PDB': '5l8o', 'CHAIN': 'C', 'SP_PRIMARY': 'P51161', 'RES_BEG': 1, 'RES_END': 128, 'PDB_BEG': None, 'PDB_END': None, 'SP_BEG': 1, 'SP_END': 128}
+        :type chain_detail: Dict
         :param sequence: sequence of unirpot
         :type sequence: str
         :return: offset
         :rtype: int
         """
-        aa = {'CYS': 'C', 'ASP': 'D', 'SER': 'S', 'GLN': 'Q', 'LYS': 'K',
-              'ILE': 'I', 'PRO': 'P', 'THR': 'T', 'PHE': 'F', 'ASN': 'N',
-              'GLY': 'G', 'HIS': 'H', 'LEU': 'L', 'ARG': 'R', 'TRP': 'W',
-              'ALA': 'A', 'VAL': 'V', 'GLU': 'E', 'TYR': 'Y', 'MET': 'M'}
-        begin = int(chain_detail['SP_BEG'])
-        end = int(chain_detail['SP_BEG'])
         assert isinstance(chain_detail, dict), 'Chain detail is a Dict of the specific chain. Not whole protein.'
-        debugprint = lambda x: None
-        with pymol2.PyMOL() as pymol:
-            ## Load file
-            pymol.cmd.set('fetch_path', os.path.join(self.settings.temp_folder, 'PDB'))
-            pymol.cmd.fetch(self.code)
-            ## Try different windows
-            for begin_offset in range(0,len(sequence) - begin, 10):
-                ## Try full size window
-                window = 50
-                target = sequence[begin - 1 + begin_offset : begin + window + begin_offset]
-                if len(target) == 0:
-                    # Under what conditions does this happen???
-                    debugprint(f'sequence is {len(sequence)}, while range is {begin+begin_offset}-{end+begin_offset}')
-                    continue
-                sele_target = f"chain {chain_detail['CHAIN']} and pepseq {target} and name CA"
-                ## Shrink window to account for failed selection due to weird atoms or short peptides
-                while pymol.cmd.select(sele_target) == 0:
-                    window -= 10
-                    if window < 10:
-                        debugprint(f'{self.code} ({chain_detail}) does not contain this sequence ({target})')
-                        break #double continue
-                    target = sequence[begin +  begin_offset - 1: begin +  begin_offset + window]
-                    sele_target = f"chain {chain_detail['CHAIN']} and pepseq {target} and name CA"
-                ## double continue
-                if window < 10:
-                    continue
-                ## Iterate
-                atoms = pymol.cmd.get_model(sele_target)
-                prev = 'X'
-                prev_i = -999
-                for atom in atoms.atom:
-                    if int(atom.resi) == prev_i:
-                        continue
-                    if atom.resn in aa:
-                        ## Simplest case:
-                        # if aa[atom.resn] == target[0]:
-                        #     return chain_detail["SP_BEG"] - atom.resi
-                        ## In case there are missing parts.
-                        # for i in range(0, 20):
-                        #     if aa[atom.resn] == target[i]:
-                        #         return (i + chain_detail["SP_BEG"]) - atom.resi
-                        ## In case there are missing parts and repeated residues.
-                        #print(atom.resn, atom.resi, target)
-                        for i in range(1, window): #in case there are missing parts.
-                            if aa[atom.resn] == target[i] and target[i - 1] == prev:
-                                #print(f'YATTA {(i + chain_detail["SP_BEG"]) - int(atom.resi)}')
-                                return (i + int(chain_detail["SP_BEG"])) - int(atom.resi)
-                        prev = aa[atom.resn]
-                    else:
-                        prev = 'X'
-                    prev_i = int(atom.resi)
-                else: #more than 50 aa without coordinates at the N terminus? Engineered residues.
-                    debugprint(f'{self.code} More than {window} AA without a match!! {target} {prev}')
-                    continue
+        details = self.align_chain_to_sequence(chain_detail['CHAIN'], sequence,
+                                               begin=chain_detail.get('SP_BEG'), end=chain_detail.get('SP_END'))
+        if details['offset'] is None:
             warn(f'UTTER FAILURE for {self.code}')
             return 0
+        return details['offset']
+
+    def align_chain_to_sequence(self, chain: str, sequence: str, begin=None, end=None) -> Dict:
+        """
+        Aligns the residues with a CA in a chain of the (unrenumbered) coordinates to the Uniprot sequence. No PyMOL.
+        Remote coordinates come from the coordinate cache.
+
+        :param chain: chain letter
+        :param sequence: Uniprot sequence
+        :param begin: Uniprot start of the chain if known (SP_BEG). The sequence is trimmed around begin-end to speed up.
+        :param end: Uniprot end of the chain if known (SP_END)
+        :return: dict with offset (None if failed), identity, coverage, aligned, gaps, gap_length, consensus and score.
+                 See ``sequence_alignment.get_offset_by_alignment``
+        """
+        if self.get_remote_reference() is not None:
+            coordinates = self._fetch_remote()
+        else:
+            coordinates = self.get_coordinates()
+        if not coordinates:
+            raise ValueError(f'No coordinates for {self.code}')
+        chain_sequence, residues = get_ca_trace(coordinates, chain)
+        start = 1
+        try:
+            # the chain may have tags etc. so give it some slack either side.
+            margin = len(chain_sequence)
+            start = max(1, int(begin) - margin)
+            sequence = sequence[start - 1: int(end) + margin]
+        except (TypeError, ValueError):  # unknown range. whole sequence.
+            start = 1
+        return get_offset_by_alignment(chain_sequence, residues, sequence, start)
 
     def lookup_resolution(self):
+        """
+        Fills ``.resolution`` from the process-wide resolution map (see ``.get_resolution_of``).
+
+        :return: self
+        """
         if self.type != 'rcsb':
             return self
-        with self.settings.open('resolution') as fh:
-            resolution = json.load(fh)
-            for entry in resolution:
-                if entry['IDCODE'] == self.code:
-                    if entry['RESOLUTION'].strip():
-                        self.resolution = float(entry['RESOLUTION'])
-                    break
-            else:
-                warn(f'No resolution info for {self.code}')
+        resolution = self.get_resolution_of(self.code)
+        if resolution is None:
+            warn(f'No resolution info for {self.code}')
+        else:
+            self.resolution = resolution
         return self
 
+    ############## resolution map. shared across all instances.
+    _resolution_codes = None  #: sorted list of IDCODEs
+    _resolution_values = None  #: array of float aligned with the above. 0 = no resolution given (NMR etc.)
+    _resolution_lock = Lock()
+
+    @classmethod
+    def load_resolutions(cls, refresh=False):
+        """
+        Reads resolution.json once per process into a sorted code list and a float array (bisected by ``.get_resolution_of``).
+        resolution.json is ``{IDCODE: resolution}`` as written by ``GlobalSettings.create_json_from_idx``,
+        but the older list of dicts is also accepted. The old parser split the header on whitespace,
+        so the resolution in those is keyed ';' rather than RESOLUTION.
+
+        :param refresh: reload even if done.
+        :return: None
+        """
+        with cls._resolution_lock:
+            if cls._resolution_codes is not None and not refresh:
+                return None
+            with cls.settings.open('resolution') as fh:
+                data = json.load(fh)
+            if isinstance(data, list):  # legacy format
+                legacy = {}
+                for entry in data:
+                    resolution = entry.get('RESOLUTION', entry.get(';'))
+                    if 'IDCODE' in entry and resolution is not None:
+                        legacy[entry['IDCODE']] = resolution.strip()
+                data = legacy
+            codes = sorted(data)
+            cls._resolution_values = array('d', [float(data[code]) if data[code] not in (None, '') else 0. for code in codes])
+            cls._resolution_codes = codes
+
+    @classmethod
+    def get_resolution_of(cls, code: str) -> Optional[float]:
+        """
+        :param code: PDB code (upper case as in resolu.idx)
+        :return: resolution or None if the code is unknown. 0. means known, but no resolution.
+        """
+        if cls._resolution_codes is None:
+            cls.load_resolutions()
+        cls.settings.telemetry.hit('resolution')
+        codes = cls._resolution_codes
+        i = bisect_left(codes, code)
+        if i < len(codes) and codes[i] == code:
+            return float(cls._resolution_values[i])
+        else:
+            return None
+
     def lookup_ligand(self):
         warn('TEMP! Returns the data... not self')
         return PDBMeta(self.code+'_'+self.chain).data
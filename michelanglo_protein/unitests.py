@@ -1,5 +1,27 @@
 import unittest
+import os, tempfile, threading, tarfile, io, signal, time, gzip
+from types import SimpleNamespace
+from http.server import HTTPServer, BaseHTTPRequestHandler
 from . import ProteinCore
+from .structure import Structure
+from .coordinate_cache import CoordinateCache
+from .sifts_mapping import SiftsMapping
+from .cif_parser import cif_to_pdb, format_atom_line
+from .model_repository import ModelRepository
+from .elm_index import ElmEngine, ElmIndex
+from .protein_analysis import ProteinAnalyser
+from . import protein_analysis
+from .gnomad_variant import Variant
+from .analyse.mutator_pool import MutatorPool
+from .analyse.ff_scheduler import FFScheduler
+from .analyse.energetics_cache import EnergeticsCache
+from .analyse.residue_table import ResidueTable
+from .analyse.Pymol_StructureAnalyser import StructureAnalyser
+from .pdb_parser import iter_atoms
+from .sequence_alignment import local_align, get_offset_by_alignment
+from .ligand_inventory import LigandInventory
+from .atom_array import pdb_to_atoms
+from . import prefetch
 
 
 class TestProteinCore(unittest.TestCase):
@@ -46,6 +68,733 @@ class TestProteinCore(unittest.TestCase):
         irak.parse_all(mode='serial')
 
 
+class _StandIn(BaseHTTPRequestHandler):
+    """Local stand-in for RCSB. Serves ``REMARK`` blocks and counts requests."""
+    hits = 0
+
+    def do_GET(self):
+        self.__class__.hits += 1
+        if 'MISS' in self.path:
+            self.send_response(404)
+            self.end_headers()
+            return
+        elif 'FLAKY' in self.path and self.__class__.hits == 1:  # fails the first time.
+            self.send_response(503)
+            self.end_headers()
+            return
+        elif 'HUGE' in self.path and self.path.endswith('.pdb'):  # no legacy PDB file.
+            self.send_response(404)
+            self.end_headers()
+            return
+        elif self.path.endswith('.cif'):
+            body = TestCifParser.cif.encode()
+        else:
+            body = f'REMARK {self.path}\nEND\n'.encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _StandInTestCase(unittest.TestCase):
+    """Points Structure at the local stand-in and a temporary coordinate cache."""
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), _StandIn)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        _StandIn.hits = 0
+        self.original = (Structure.coordinate_cache, Structure.rcsb_url, Structure.rcsb_cif_url,
+                         set(Structure.cif_only_codes))
+        Structure.cif_only_codes.clear()
+        Structure.coordinate_cache = CoordinateCache(folder=tempfile.mkdtemp())
+        Structure.rcsb_url = f'http://127.0.0.1:{self.server.server_port}/{{code}}.pdb'
+        Structure.rcsb_cif_url = f'http://127.0.0.1:{self.server.server_port}/{{code}}.cif'
+
+    def tearDown(self):
+        self.server.shutdown()
+        Structure.coordinate_cache, Structure.rcsb_url, Structure.rcsb_cif_url, codes = self.original
+        Structure.cif_only_codes.clear()
+        Structure.cif_only_codes.update(codes)
+
+
+class TestCoordinateCache(_StandInTestCase):
+
+    def test_cached(self):
+        first = Structure('1UBQ', '', 1, 76, code='1UBQ').get_coordinates()
+        second = Structure('1UBQ', '', 1, 76, code='1UBQ').get_coordinates()
+        self.assertEqual(first, second)
+        self.assertIn('1UBQ', first)
+        self.assertEqual(_StandIn.hits, 1)
+
+    def test_offline(self):
+        Structure.coordinate_cache.offline = True
+        with self.assertWarns(UserWarning):
+            self.assertIsNone(Structure('1UBQ', '', 1, 76, code='1UBQ').get_coordinates())
+        self.assertEqual(_StandIn.hits, 0)
+
+    def test_ttl(self):
+        Structure.coordinate_cache.ttl = 0
+        Structure('1UBQ', '', 1, 76, code='1UBQ').get_coordinates()
+        Structure('1UBQ', '', 1, 76, code='1UBQ').get_coordinates()
+        self.assertEqual(_StandIn.hits, 2)
+        # the first put of a process replacing an expired file does not count it twice.
+        Structure.coordinate_cache = CoordinateCache(folder=Structure.coordinate_cache.folder, ttl=0)
+        Structure('1UBQ', '', 1, 76, code='1UBQ').get_coordinates()
+        self.assertEqual(Structure.coordinate_cache._size, Structure.coordinate_cache.get_size())
+
+    def test_eviction(self):
+        cache = Structure.coordinate_cache
+        cache.max_size = 1
+        for code in ('1AAA', '2BBB', '3CCC'):
+            Structure(code, '', 1, 76, code=code).get_coordinates()
+        self.assertLessEqual(len(os.listdir(cache.folder)), 1)
+
+    def test_failure(self):
+        with self.assertWarns(UserWarning):
+            self.assertIsNone(Structure('MISS', '', 1, 76, code='MISS').get_coordinates())
+        self.assertEqual(os.listdir(Structure.coordinate_cache.folder), [])
+
+    def test_cif_fallback(self):
+        coordinates = Structure('HUGE', '', 1, 76, code='HUGE', chain='A').get_coordinates()
+        self.assertEqual({atom[5] for atom in iter_atoms(coordinates)}, {'A'})  # only the chain of the structure
+        Structure('HUGE', '', 1, 76, code='HUGE', chain='A').get_coordinates()
+        self.assertEqual(_StandIn.hits, 2)  # the PDB attempt and the mmCIF
+
+
+class TestPrefetch(_StandInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.rate = prefetch.rate_limiter.rate
+
+    def tearDown(self):
+        prefetch.rate_limiter.rate = self.rate
+        super().tearDown()
+
+    def test_prefetch(self):
+        protein = ProteinCore(uniprot='P62873')
+        protein.pdbs = [Structure(code, '', 1, 76, code=code, chain=chain) for code, chain in (('1GOT', 'A'), ('1GOT', 'B'), ('2TRC', 'B'))]
+        protein.swissmodel = [Structure('x', '', 1, 76, code='x', type='swissmodel', url=Structure.rcsb_url.format(code='SWISS'))]
+        prefetch.rate_limiter.rate = 0
+        self.assertEqual(prefetch.prefetch_structures(protein, concurrency=4), {'1GOT': True, '2TRC': True, protein.swissmodel[0].url: True})
+        self.assertEqual(_StandIn.hits, 3)
+        protein.pdbs[0].get_coordinates()
+        self.assertEqual(_StandIn.hits, 3)
+
+    def test_retry(self):
+        protein = ProteinCore(uniprot='P62873')
+        protein.pdbs = [Structure('FLAKY', '', 1, 76, code='FLAKY')]
+        protein.swissmodel = []
+        self.assertEqual(prefetch.prefetch_structures(protein, backoff=0.01), {'FLAKY': True})
+        self.assertEqual(_StandIn.hits, 2)
+
+    def test_cif(self):
+        protein = ProteinCore(uniprot='P62873')
+        protein.pdbs = [Structure('HUGE', '', 1, 76, code='HUGE', chain='A') for i in range(2)]
+        protein.swissmodel = []
+        self.assertEqual(prefetch.prefetch_structures(protein), {'HUGE': True})
+        self.assertEqual(_StandIn.hits, 2)  # as PDB and as mmCIF
+        protein.pdbs[1].get_coordinates()
+        self.assertEqual(_StandIn.hits, 2)
+        protein.pdbs = [Structure('1ABC', '', 1, 76, code='1ABC', chain='A')]
+        protein.pdbs[0].chain_definitions = [{'chain': 'A'}]
+        Structure.rcsb_format = 'cif'
+        try:
+            self.assertEqual(prefetch.prefetch_structures(protein), {'1ABC': True})
+            self.assertIn('ATOM', protein.pdbs[0].get_coordinates())
+        finally:
+            Structure.rcsb_format = 'pdb'
+        self.assertEqual(_StandIn.hits, 3)
+
+
+class TestLigandInventory(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        LigandInventory._folder, LigandInventory._size, LigandInventory._catalog = self.folder.name, None, None
+        self.exclusion = LigandInventory.__dict__['get_exclusion']
+        LigandInventory.get_exclusion = staticmethod(lambda: {'HOH', 'ALA'})  # in lieu of the transpiler lists
+
+    def tearDown(self):
+        LigandInventory._folder, LigandInventory._size, LigandInventory._catalog = None, None, None
+        LigandInventory.get_exclusion = self.exclusion
+        LigandInventory._memory.clear()
+        self.folder.cleanup()
+
+    def make(self, shift: float = 0.) -> str:
+        atoms = [('ATOM', 1, 'CA', '', 'ALA', 'A', 23, '', 0., 0., 0., 1., 0., 'C'),
+                 ('ATOM', 2, 'CB', '', 'ALA', 'A', 23, '', 1., 0., 0., 1., 0., 'C'),
+                 ('HETATM', 3, 'FE', '', 'HEM', 'A', 201, '', 5. + shift, 0., 0., 1., 0., 'FE'),
+                 ('HETATM', 4, 'O', '', 'HOH', 'A', 301, '', 1.5, 0., 0., 1., 0., 'O')]
+        return '\n'.join(format_atom_line(atom) for atom in atoms) + '\nEND\n'
+
+    def test_closest(self):
+        pdbblock = self.make()
+        inventory = LigandInventory.get('1ABC', pdbblock)
+        self.assertEqual(inventory.get_ligand_list(), {'HEM'})
+        residue = pdb_to_atoms(pdbblock)[:2]
+        self.assertEqual(inventory.get_closest(residue), {'target': '23.CB:A', 'closest': '[HEM]201.FE:A', 'distance': 4.})
+        self.assertEqual(LigandInventory.find('hem'), ['1ABC'])
+        empty = LigandInventory(residue[:0])
+        self.assertEqual(empty.get_closest(residue)['closest'], None)
+
+    def test_eviction(self):
+        LigandInventory.get('', self.make())
+        oldest = os.path.join(self.folder.name, os.listdir(self.folder.name)[0])
+        os.utime(oldest, (0, 0))  # least recently used
+        size, LigandInventory.max_size = LigandInventory.max_size, 1.5 * os.path.getsize(oldest)
+        try:
+            LigandInventory.get('', self.make(1.))  # uncoded: not catalogued
+            self.assertFalse(os.path.exists(oldest))
+            self.assertEqual(len(os.listdir(self.folder.name)), 1)
+        finally:
+            LigandInventory.max_size = size
+
+
+class TestResolutions(unittest.TestCase):
+
+    def test_legacy(self):
+        # as written by the old create_json_from_idx: the header split on whitespace keyed the resolution ';'
+        legacy = '[{"IDCODE": "101M", ";": "2.07"}, {"IDCODE": "1ABC", ";": ""}, {"IDCODE": "2XYZ"}]'
+        settings = Structure.settings
+        Structure.settings = SimpleNamespace(open=lambda kind: io.StringIO(legacy),
+                                             telemetry=SimpleNamespace(hit=lambda kind: None))
+        try:
+            Structure.load_resolutions(refresh=True)
+            self.assertEqual(Structure.get_resolution_of('101M'), 2.07)
+            self.assertEqual(Structure.get_resolution_of('1ABC'), 0.)  # known, no resolution
+            self.assertIsNone(Structure.get_resolution_of('2XYZ'))
+        finally:
+            Structure.settings = settings
+            Structure._resolution_codes = None
+
+
+class TestModelCoverage(unittest.TestCase):
+
+    def make(self, code, x, y, resolution, kind='rcsb'):
+        structure = Structure(id=code, description='', x=x, y=y, code=code, type=kind)
+        structure.resolution = resolution
+        return structure
+
+    def test_best(self):
+        p = ProteinCore(uniprot='P00000', sequence='A' * 300)
+        p.pdbs = [self.make('1AAA', 1, 100, 3.0), self.make('2BBB', 50, 150, 1.5), self.make('3CCC', 10, 20, 0)]
+        p.swissmodel = [self.make('model', 1, 280, 0, 'swissmodel')]
+        self.assertEqual(p.get_best_model_at(15).id, '1AAA')  # unknown resolution goes last
+        self.assertEqual(p.get_best_model_at(60).id, '2BBB')
+        self.assertEqual(p.get_best_model_at(200).id, 'model')
+        self.assertIsNone(p.get_best_model_at(290))
+        self.assertEqual([s.id for s in p.model_coverage.get_ranked(p, 15)], ['1AAA', '3CCC', 'model'])
+        p.pdbs.append(self.make('4DDD', 1, 300, 1.0))  # stale table is rebuilt
+        self.assertEqual(p.get_best_model_at(200).id, '4DDD')
+        p.pdbs[0].resolution = 0.5  # resolutions loaded later
+        self.assertEqual(p.get_best_model_at(60).id, '1AAA')
+        p.pdbs[0].y = 40  # realigned
+        self.assertEqual(p.get_best_model_at(60).id, '4DDD')
+
+
+class TestSequenceAlignment(unittest.TestCase):
+
+    def test_local(self):
+        score, pairs = local_align('KLMNP', 'AAAKLMNPAA')
+        self.assertEqual((score, pairs), (10, [(0, 3), (1, 4), (2, 5), (3, 6), (4, 7)]))
+        score, pairs = local_align('WKLMQRST', 'GGKLMAAQRSTGG')  # two residue gap in the chain
+        self.assertEqual((score, pairs[2], pairs[3]), (10, (3, 4), (4, 7)))
+        self.assertEqual(local_align('XXXX', 'XXXX'), (0, []))  # X matches nothing
+        self.assertEqual(local_align('', 'AAA'), (0, []))
+
+    def test_offset(self):
+        chain = 'KLMNPQRS'
+        residues = [(resi, '') for resi in range(101, 109)]
+        details = get_offset_by_alignment(chain, residues, 'MAAAAKLMNPQRSAAAA', start=1)
+        self.assertEqual((details['offset'], details['identity'], details['coverage'], details['gaps']), (-95, 1., 1., 0))
+        details = get_offset_by_alignment(chain, residues, 'AKLMNPQRSA', start=5)  # a stretch of the sequence
+        self.assertEqual(details['offset'], -95)
+
+
+class TestSiftsMapping(unittest.TestCase):
+
+    def test_segments(self):
+        row = dict(PDB='1abc', CHAIN='A', SP_PRIMARY='P00000', RES_BEG='1', RES_END='10')
+        rows = [{**row, 'PDB_BEG': '1', 'PDB_END': '10', 'SP_BEG': '21', 'SP_END': '30'},
+                {**row, 'PDB_BEG': '15', 'PDB_END': '24', 'SP_BEG': '31', 'SP_END': '40'},  # gap in the PDB numbering
+                {**row, 'CHAIN': 'B', 'PDB_BEG': '5A', 'PDB_END': '14', 'SP_BEG': '1', 'SP_END': '10'}]  # icode
+        entry = SiftsMapping.from_segments('1abc', rows)
+        mapping = entry['A']
+        self.assertEqual(mapping.to_pdb(21), (1, ''))
+        self.assertEqual(mapping.to_pdb(31), (15, ''))
+        self.assertIsNone(mapping.to_pdb(41))
+        self.assertEqual(mapping.to_uniprot(15), 31)
+        self.assertIsNone(mapping.to_uniprot(12))
+        self.assertEqual(mapping.get_offsets(), {20: 10, 16: 10})
+        self.assertNotIn('B', entry)
+
+    def test_store(self):
+        def residue(resi, position):
+            return (f'<residue><crossRefDb dbSource="PDB" dbResNum="{resi}" dbChainId="A"/>'
+                    f'<crossRefDb dbSource="UniProt" dbResNum="{position}" dbAccessionId="P00000"/></residue>')
+        xml = '<entry>' + ''.join(residue(resi, position) for resi, position in
+                                  (('1', 21), ('2', 22), ('2A', 23), ('5', 24), ('null', 25))) + '</entry>'
+        folder = tempfile.TemporaryDirectory()
+        settings, SiftsMapping.settings = SiftsMapping.settings, SimpleNamespace(reference_folder=folder.name)
+        SiftsMapping.clear()
+        try:
+            os.makedirs(SiftsMapping.get_folder())
+            with gzip.open(SiftsMapping.get_xml_filename('1ABC'), 'wt') as fh:
+                fh.write(xml)
+            self.assertEqual(SiftsMapping.generate(), 1)
+            os.remove(SiftsMapping.get_xml_filename('1abc'))  # the store suffices
+            mapping = SiftsMapping.get('1ABC', 'A')
+            self.assertEqual([mapping.to_pdb(position) for position in (21, 23, 24, 25)], [(1, ''), (2, 'A'), (5, ''), None])
+            self.assertEqual((mapping.to_uniprot(2, 'A'), mapping.to_uniprot(5), mapping.uniprot), (23, 24, 'P00000'))
+        finally:
+            SiftsMapping.settings = settings
+            SiftsMapping.clear()
+            folder.cleanup()
+
+
+class TestCifParser(unittest.TestCase):
+    cif = """data_1ABC
+#
+loop_
+_atom_site.group_PDB
+_atom_site.id
+_atom_site.type_symbol
+_atom_site.label_atom_id
+_atom_site.label_alt_id
+_atom_site.label_comp_id
+_atom_site.label_asym_id
+_atom_site.label_seq_id
+_atom_site.pdbx_PDB_ins_code
+_atom_site.Cartn_x
+_atom_site.Cartn_y
+_atom_site.Cartn_z
+_atom_site.occupancy
+_atom_site.B_iso_or_equiv
+_atom_site.auth_seq_id
+_atom_site.auth_asym_id
+_atom_site.pdbx_PDB_model_num
+ATOM 1 N N . ALA A 1 ? 1.0 2.0 3.0 1.00 10.0 5 A 1
+ATOM 2 C CA . ALA A 1 ? 2.0 2.0 3.0 1.00 10.0 5 A 1
+ATOM 3 O "O5'" . DA B 1 A 3.0 2.0 3.0 1.00 10.0 6 BB 1
+ATOM 4 N N . ALA A 1 ? 9.0 2.0 3.0 1.00 10.0 5 A 2
+#
+"""
+
+    def test_cif(self):
+        pdbblock, aliases = cif_to_pdb(self.cif)
+        self.assertEqual(aliases, {'BB': 'B'})
+        atoms = list(iter_atoms(pdbblock))
+        self.assertEqual(len(atoms), 3)  # first model only
+        self.assertEqual(atoms[1][:8], ('ATOM', 2, 'CA', '', 'ALA', 'A', 5, ''))
+        self.assertEqual(atoms[2][2:8], ("O5'", '', 'DA', 'B', 6, 'A'))
+        pdbblock, aliases = cif_to_pdb(self.cif, chains=['A'])
+        self.assertEqual(len(list(iter_atoms(pdbblock))), 2)
+
+
+class TestModelRepository(unittest.TestCase):
+
+    def test_tarball(self):
+        def model(start, length):
+            return ''.join(format_atom_line(('ATOM', i, 'CA', '', 'ALA', 'A', start + i, '', 0., 0., float(i), 1., 0., 'C')) + '\n'
+                           for i in range(length)).encode()
+        tarball = os.path.join(tempfile.mkdtemp(), 'models.tar')
+        with tarfile.open(tarball, 'w') as tar:
+            for name, data in (('AF-P12345-F1-model_v4.pdb', model(1, 50)), ('README.txt', b'not a model')):
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        repository = ModelRepository(tarball)
+        self.assertEqual(repository.build(), 1)
+        protein = ProteinCore(uniprot='P12345', sequence='A' * 60)
+        self.assertEqual(repository.attach(protein), 1)
+        self.assertEqual(repository.attach(protein), 0)
+        structure = protein.swissmodel[0]
+        self.assertEqual((structure.x, structure.y, structure.type), (1, 50, 'local'))
+        self.assertEqual(structure.get_coordinates().encode(), model(1, 50))
+        structure.coordinates = ''
+        self.assertEqual(StructureAnalyser.get_coordinates_of(structure).encode(), model(1, 50))
+        self.assertEqual(structure.type, 'local')
+
+
+class TestElmIndex(unittest.TestCase):
+
+    def setUp(self):
+        ElmEngine.set_data([{'ELMIdentifier': f'LIG_{i}', 'FunctionalSiteName': f'motif {i}', 'Description': '',
+                             'Regex': regex, 'Probability': '0.01'} for i, regex in enumerate(('R..[ST]', 'P..P', '^M.K'))])
+
+    def tearDown(self):
+        ElmEngine.set_data([])  # reloaded from the reference file when next needed.
+
+    def test_delta(self):
+        index = ElmIndex('MAKGGRAASGGPAAPGG')
+        self.assertEqual(index.get_identifiers(7), ['LIG_0'])
+        self.assertEqual(index.get_identifiers(1, 3), ['LIG_2'])
+        statuses = {match['name']: match['status'] for match in index.get_delta('MAKGGRAASGGPAAPGG', 9, 'A')}
+        self.assertEqual(statuses, {'motif 0': 'lost'})
+        statuses = {match['name']: match['status'] for match in index.get_delta('MAKGGRAASGGPAAPGG', 15, 'A')}
+        self.assertEqual(statuses, {'motif 1': 'lost'})
+        statuses = {match['name']: match['status'] for match in index.get_delta('MAKGGRAASGGPAAPGG', 14, 'P')}
+        self.assertEqual(statuses, {'motif 1': 'kept'})
+        statuses = {match['name']: match['status'] for match in index.get_delta('MAKGGRAASGGPAAPGG', 9, 'P')}
+        self.assertEqual(statuses, {'motif 0': 'lost', 'motif 1': 'gained'})
+
+    def test_missing(self):
+        # a missing elm_classes.tsv raises, it does not prompt to retrieve the references (server).
+        settings, folder = ElmEngine.settings, tempfile.TemporaryDirectory()
+        saved = dict(vars(settings))
+        settings.reference_folder = folder.name
+        settings.retrieve_references = lambda *args, **kwargs: self.fail('prompted')
+        ElmEngine.set_data([])
+        try:
+            with self.assertRaises(FileNotFoundError):
+                ElmEngine.get_data()
+        finally:
+            vars(settings).clear()
+            vars(settings).update(saved)
+            folder.cleanup()
+
+    def test_paths(self):
+        # with and without an index check_elm gives the same motifs: those overlapping the residue.
+        sequence = 'MAKGGRAASGGPAAPGGRSTPKLP'
+        indexed = ProteinAnalyser(uniprot='P00000', sequence=sequence)
+        indexed.elm_index = ElmIndex(sequence)
+        scanned = ProteinAnalyser(uniprot='P00000', sequence=sequence)
+        for position in range(1, len(sequence) + 1):
+            for to_residue in 'APST':
+                for protein in (indexed, scanned):
+                    protein.mutation = f'{sequence[position - 1]}{position}{to_residue}'
+                    protein.check_elm()
+                self.assertEqual(indexed.mutation.elm, scanned.mutation.elm, f'{position}{to_residue}')
+                for match in scanned.mutation.elm:
+                    self.assertTrue(match['x'] <= position < match['y'])
+        scanned.mutation = 'P15A'
+        self.assertEqual({m['name']: m['status'] for m in scanned.check_elm().mutation.elm}, {'motif 1': 'lost'})
+
+    def test_long(self):
+        # a motif longer than the rescanned window is cut by either path, not reported as lost.
+        ElmEngine.set_data([{'ELMIdentifier': f'LIG_{i}', 'FunctionalSiteName': f'motif {i}', 'Description': '',
+                             'Regex': regex, 'Probability': '0.01'} for i, regex in enumerate(('M[^W]{70}W', 'AW'))])
+        sequence = 'A' * 10 + 'M' + 'A' * 70 + 'W' + 'A' * 40
+        index = ElmIndex(sequence)
+        self.assertEqual(index.get_overlapping(46), [(11, 83, 0)])
+        for position, to_residue, expected in ((46, 'G', []), (81, 'S', [('motif 1', 81, 'lost')])):
+            for delta in (index.get_delta(sequence, position, to_residue),
+                          ElmIndex.scan_delta(sequence, position, to_residue)):
+                self.assertEqual([(m['name'], m['x'], m['status']) for m in delta], expected)
+
+
+class _StandInAnalyser:
+    # in lieu of StructureAnalyser (PyMOL) for TestPredictEffects. fails at residue 12.
+    calls = []
+
+    def __init__(self, structure, mutation):
+        self.structure = structure
+        self.neighbours = [{'resi': '3', 'resn': 'LYS', 'chain': 'A'}]
+        self.buried = mutation.residue_index == 2
+
+    @classmethod
+    def analyse_many(cls, structure, mutations):
+        cls.calls.append((structure.id, [mutation.residue_index for mutation in mutations]))
+        return [ValueError('no CA') if mutation.residue_index == 12 else cls(structure, mutation)
+                for mutation in mutations]
+
+
+class TestPredictEffects(unittest.TestCase):
+
+    def setUp(self):
+        TestElmIndex.setUp(self)
+
+    def tearDown(self):
+        TestElmIndex.tearDown(self)
+
+    def test_batch(self):
+        p = ProteinAnalyser(uniprot='P00000', sequence='MAKGGRAASGGPAAPGG')
+        p.pdbs, p.swissmodel = [], []
+        results = p.predict_effects(['S9A', 'K4A', 'A7W', 'P50A'], structural=False)
+        self.assertEqual([r['mutation'].residue_index for r in results], [9, 4, 7, 50])
+        self.assertIsNone(results[0]['error'])
+        self.assertEqual({m['name']: m['status'] for m in results[0]['mutation'].elm}, {'motif 0': 'lost'})
+        self.assertIn('user claimed it was K', results[1]['error'])
+        self.assertIsNone(results[2]['error'])
+        self.assertIn('only 17 amino acids long', results[3]['error'])
+        self.assertIsNone(p.mutation)
+
+    def test_by_model(self):
+        p = ProteinAnalyser(uniprot='P00000', sequence='MAKGGRAASGGPAAPGG')
+        p.pdbs = [Structure(id=code, description='', x=x, y=y, code=code) for code, x, y in (('1AAA', 1, 10), ('2BBB', 8, 17))]
+        p.pdbs[0].resolution, p.pdbs[1].resolution = 2.0, 1.5
+        p.swissmodel = []
+        _StandInAnalyser.calls = []
+        analyser, protein_analysis.StructureAnalyser = protein_analysis.StructureAnalyser, _StandInAnalyser
+        try:
+            results = p.predict_effects(['A2W', 'S9A', 'K4A', 'P12A'])
+        finally:
+            protein_analysis.StructureAnalyser = analyser
+        self.assertEqual(_StandInAnalyser.calls, [('1AAA', [2]), ('2BBB', [9, 12])])  # one session per model
+        self.assertEqual([r['structure'].id if r['structure'] else None for r in results], ['1AAA', '2BBB', None, '2BBB'])
+        self.assertEqual([r['mutation'].surface_expose for r in results[:2]], ['buried', 'surface'])
+        self.assertEqual(results[1]['structural'].neighbours[0]['resn'], 'K')  # annotated
+        self.assertIsNotNone(results[2]['error'])
+        self.assertEqual(results[3]['error'], 'ValueError: no CA')
+        self.assertIsNone(p.structural)
+
+
+class TestFeatureIndex(unittest.TestCase):
+
+    def test_near(self):
+        p = ProteinAnalyser(uniprot='P00000', sequence='A' * 100)
+        p.features = {'domain': [{'x': 10, 'y': 40, 'description': 'big'}, {'x': 60, 'y': 70, 'description': 'small'}],
+                      'PSP_modified_residues': [{'residue_index': 45, 'ptm': 'p'}]}
+        p.gnomAD = [Variant(id='a', x=20, y=20, description='A20G'), Variant(id='b', x=30, y=30, description='A30*'),
+                    Variant(id='c', x=45, y=45, description='A45V'), Variant(id='d', x=39, y=41, description='A39del')]
+        near = p.get_features_near_position(44, wobble=5)
+        self.assertEqual([(f['x'], f['type'], f['gnomad']) for f in near],
+                         [(45, 'Post translational', {'missense': 1, 'nonsense': 0}),
+                          (10, 'domain', {'missense': 1, 'nonsense': 1})])
+        self.assertEqual(p.get_feature_index().tally(1, 100), {'missense': 2, 'nonsense': 2})  # del is nonsense
+        self.assertEqual(p.get_features_near_position(55, wobble=4), [])
+        p.features['domain'].append({'x': 50, 'y': 56, 'description': 'new'})  # stale index is rebuilt
+        self.assertEqual(len(p.get_features_near_position(55, wobble=4)), 1)
+        p.features['domain'][-1] = {'x': 80, 'y': 86, 'description': 'moved'}  # same count
+        self.assertEqual(p.get_features_near_position(55, wobble=4), [])
+        p.gnomAD[0] = Variant(id='e', x=20, y=20, description='A20*')  # re-parsed, same count
+        self.assertEqual(p.get_feature_index().tally(1, 100), {'missense': 1, 'nonsense': 3})
+
+
+class TestGnomADIndex(unittest.TestCase):
+
+    def test_bisect(self):
+        p = ProteinAnalyser(uniprot='P00000', sequence='A' * 100)
+        p.gnomAD = [Variant(id='a', x=50, y=50, description='A50G (rs1)'), Variant(id='b', x=20, y=20, description='A20* (rs2)'),
+                    Variant(id='a', x=50, y=50, description='A50G (rs1)'), Variant(id='c', x=52, y=52, description='A52V (rs3)')]
+        self.assertEqual([v.x for v in p.get_gnomAD_near_position(51, wobble=2)], [50, 52])  # deduplicated
+        self.assertEqual([v.x for v in p.get_gnomAD_in_range(1, 50)], [20, 50])
+        self.assertEqual(p.get_gnomAD_index().get_at(52)[0].description, 'A52V (rs3)')
+        p.gnomAD.append(Variant(id='d', x=10, y=10, description='A10C (rs4)'))  # stale index is rebuilt
+        self.assertEqual(len(p.get_gnomAD_in_range(1, 100)), 4)
+        p.gnomAD[-1] = Variant(id='e', x=90, y=90, description='A90C (rs5)')  # re-parsed, same count
+        self.assertEqual([v.x for v in p.get_gnomAD_in_range(80, 100)], [90])
+
+
+def _stand_in_job(method, init_settings, args):
+    # in lieu of pyrosetta for TestMutatorPool
+    if method == 'crash':
+        os.kill(os.getpid(), signal.SIGSEGV)
+    elif method == 'sleep':
+        time.sleep(args[0])
+    return {'pid': os.getpid(), 'args': args}
+
+
+def _stand_in_saturation(method, init_settings, args):
+    # in lieu of pyrosetta for TestSaturation: fails at 3, ddG = position + alphabet rank
+    position = init_settings['target_resi']
+    if position == 3:
+        return {'error': 'segmentation fault'}
+    elif method == 'relax_native':
+        return f'relaxed {position}'
+    assert init_settings['pdbblock'] == f'relaxed {position}' and args[1] is False
+    return {aa: position + ord(aa) - 64. for aa in args[0]}
+
+
+class TestMutatorPool(unittest.TestCase):
+
+    def test_pool(self):
+        pool = MutatorPool(size=1, max_jobs=3, runner=_stand_in_job, warmer=None)
+        try:
+            first = pool.submit('echo', {}, 1)
+            self.assertEqual(first['args'], (1,))
+            self.assertEqual(pool.submit('echo', {}, 2)['pid'], first['pid'])  # warm worker reused
+            self.assertEqual(pool.submit('crash', {}), {'error': 'segmentation fault'})
+            self.assertEqual(pool.crashes, 1)
+            second = pool.submit('echo', {}, 3)['pid']
+            self.assertNotEqual(second, first['pid'])  # respawned
+            self.assertEqual(pool.submit('sleep', {}, 5, timeout=0.2), {'error': 'timeout'})
+            pids = {pool.submit('echo', {})['pid'] for i in range(4)}
+            self.assertEqual((len(pids), pool.recycled), (2, 1))  # recycled after 3 jobs
+        finally:
+            pool.close()
+
+
+class TestFFScheduler(unittest.TestCase):
+
+    def test_priority(self):
+        pool = MutatorPool(size=1, runner=_stand_in_job, warmer=None)
+        scheduler = FFScheduler(pool)
+        try:
+            busy = scheduler.submit('sleep', {}, 0.3, priority='batch')
+            time.sleep(0.1)  # running.
+            batch = scheduler.submit('echo', {}, 'batch', priority='batch')
+            dropped = scheduler.submit('echo', {}, 'dropped', priority='batch')
+            interactive = scheduler.submit('echo', {}, 'interactive')
+            self.assertTrue(dropped.cancel())
+            self.assertEqual(scheduler.get_metrics()['queued'], {'interactive': 1, 'batch': 1})
+            interactive.result()
+            self.assertFalse(batch.done())  # jumped the queue
+            self.assertEqual(batch.result()['args'], ('batch',))
+            expired = scheduler.submit('sleep', {}, 5, deadline=time.time() + 1)  # admitted: 0.3 s expected
+            self.assertEqual(expired.result(), {'error': 'deadline exceeded'})
+            scheduler.rates['sleep'] = 1000.  # seconds per kB: a 1 kB job takes 1000 s
+            late = scheduler.submit('sleep', {'pdbblock': 'A' * 1000}, 0, deadline=time.time() + 10)
+            self.assertEqual(late.result()['args'], (0,))  # downgraded to batch, not rejected
+            scheduler.on_late = 'reject'
+            rejected = scheduler.submit('sleep', {'pdbblock': 'A' * 1000}, 0, deadline=time.time() + 10)
+            self.assertEqual(rejected.result(), {'error': 'rejected: predicted to miss its deadline'})
+            metrics = scheduler.get_metrics()
+            self.assertEqual((metrics['downgraded'], metrics['rejected'], metrics['expired'], metrics['cancelled']),
+                             (1, 1, 1, 1))
+        finally:
+            scheduler.close()
+            pool.close()
+
+    def test_queued_deadline(self):
+        pool = MutatorPool(size=1, runner=_stand_in_job, warmer=None)
+        scheduler = FFScheduler(pool)
+        scheduler.default_estimate = 0.01
+        try:
+            busy = scheduler.submit('sleep', {}, 1, priority='batch')
+            time.sleep(0.1)  # running.
+            start = time.time()
+            queued = scheduler.submit('echo', {}, deadline=start + 0.2)
+            self.assertEqual(queued.result(), {'error': 'deadline exceeded'})
+            self.assertLess(time.time() - start, 0.6)  # not after the running job
+            self.assertEqual(scheduler.get_metrics()['expired'], 1)
+            self.assertEqual(busy.result()['args'], (1,))
+        finally:
+            scheduler.close()
+            pool.close()
+
+    def test_close(self):
+        pool = MutatorPool(size=1, runner=_stand_in_job, warmer=None)
+        scheduler = FFScheduler(pool)
+        scheduler.default_estimate = 0.01
+        try:
+            busy = scheduler.submit('sleep', {}, 0.3)
+            time.sleep(0.1)  # running.
+            queued = scheduler.submit('echo', {}, deadline=time.time() + 60)
+            threads = scheduler._threads + [scheduler._sweeper]
+            scheduler.close()
+            self.assertEqual(queued.result(), {'error': 'rejected: closed'})
+            self.assertEqual(busy.result()['args'], (0.3,))  # waited for
+            self.assertFalse(any(thread.is_alive() for thread in threads))
+            self.assertEqual(scheduler.submit('echo', {}, 1).result()['args'], (1,))  # new threads
+        finally:
+            scheduler.close()
+            pool.close()
+
+
+class TestSaturation(unittest.TestCase):
+
+    def test_matrix(self):
+        previous, FFScheduler._default = FFScheduler._default, FFScheduler(MutatorPool(size=2,
+                                                                                       runner=_stand_in_saturation,
+                                                                                       warmer=None))
+        EnergeticsCache.enabled = False
+        try:
+            p = ProteinAnalyser(uniprot='P00000', sequence='MAKGG')
+            p.mutation = 'A2W'
+            p.structural = SimpleNamespace(coordinates='ATOM stand-in')  # in lieu of StructureAnalyser
+            matrix = p.analyse_saturation_FF(2, 4, chunks=3)
+            self.assertEqual(matrix['positions'], [2, 3, 4])
+            self.assertEqual(len(matrix['ddG'][0]), 20)
+            self.assertEqual(matrix['ddG'][0][:3], [0., 2. + 3, 2. + 4])  # A native, C, D
+            self.assertEqual(matrix['ddG'][1], [None] * 20)
+            self.assertEqual(matrix['ddG'][2][matrix['amino_acids'].index('G')], 0.)
+            self.assertEqual(matrix['ddG'][2][matrix['amino_acids'].index('W')], 4. + 23)
+            self.assertEqual(list(matrix['errors']), ['K3:relax_native'])
+        finally:
+            FFScheduler._default.close()
+            FFScheduler._default.pool.close()
+            FFScheduler._default = previous
+            EnergeticsCache.enabled = True
+
+    def test_defaults(self):
+        # without chunks the alternatives of a residue are split across the workers of a default pool.
+        previous, FFScheduler._default = FFScheduler._default, FFScheduler(MutatorPool(runner=_stand_in_saturation,
+                                                                                       warmer=None))
+        EnergeticsCache.enabled = False
+        try:
+            p = ProteinAnalyser(uniprot='P00000', sequence='MAKGG')
+            p.mutation = 'A2W'
+            p.structural = SimpleNamespace(coordinates='ATOM stand-in')
+            matrix = p.analyse_saturation_FF()
+            self.assertEqual(matrix['ddG'][0][matrix['amino_acids'].index('W')], 2. + 23)
+            jobs = FFScheduler._default.get_metrics()['completed'] - 1  # less the relax of the native
+            self.assertGreater(jobs, 1)
+            self.assertEqual(jobs, min(19, MutatorPool.size))
+        finally:
+            FFScheduler._default.close()
+            FFScheduler._default.pool.close()
+            FFScheduler._default = previous
+            EnergeticsCache.enabled = True
+
+
+class TestEnergeticsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        EnergeticsCache._folder, EnergeticsCache._size = self.folder.name, None
+
+    def tearDown(self):
+        EnergeticsCache._folder, EnergeticsCache._size = None, None
+        self.folder.cleanup()
+
+    def test_cache(self):
+        settings = dict(pdbblock='ATOM ...', target_resi=10, target_chain='A', cycles=1, radius=3)
+        key = EnergeticsCache.get_key('analyse_mutation', settings, ('W',))
+        self.assertNotEqual(key, EnergeticsCache.get_key('analyse_mutation', {**settings, 'radius': 4}, ('W',)))
+        self.assertIsNone(EnergeticsCache.get(key))
+        EnergeticsCache.put(key, {'error': 'segmentation fault'})  # not stored
+        self.assertIsNone(EnergeticsCache.get(key))
+        EnergeticsCache.put(key, {'ddG': 1.5, 'native': 'ATOM ...'})
+        self.assertEqual(EnergeticsCache.get(key)['ddG'], 1.5)
+        os.utime(EnergeticsCache.get_path(key), (0, 0))  # least recently used
+        size, EnergeticsCache.max_size = EnergeticsCache.max_size, 1.5 * os.path.getsize(EnergeticsCache.get_path(key))
+        try:
+            other = EnergeticsCache.get_key('analyse_mutation', settings, ('P',))
+            EnergeticsCache.put(other, {'ddG': 2.5, 'native': 'ATOM ...'})
+        finally:
+            EnergeticsCache.max_size = size
+        self.assertIsNone(EnergeticsCache.get(key))  # evicted
+        self.assertEqual(EnergeticsCache.get(other)['ddG'], 2.5)
+        for i in range(3):  # replaced, not added
+            EnergeticsCache.put(other, {'ddG': 2.5, 'native': 'ATOM ...'})
+        self.assertEqual(EnergeticsCache._size, EnergeticsCache._measure())
+
+
+class TestResidueTable(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        ResidueTable._folder = self.folder.name
+
+    def tearDown(self):
+        ResidueTable._folder = None
+        ResidueTable._memory.clear()
+        self.folder.cleanup()
+
+    def test_lookup(self):
+        import numpy as np
+        table = ResidueTable({'chain': np.array(['A', 'A', 'A']), 'resi': np.array(['1', '2', '3']),
+                              'resn': np.array(['ALA', 'GLY', 'HOH']), 'n_atoms': np.array([5, 4, 1]),
+                              'sasa': np.array([50., 20., 5.], dtype='f4'), 'sasa_sidechain': np.array([10., 2., 5.]),
+                              'ss': np.array(['H', 'L', '?']), 'neighbour_offsets': np.array([0, 1, 2, 4]),
+                              'neighbours': np.array([1, 0, 0, 1]), 'closest': np.array(['[HEM]101.FE:A', '', '']),
+                              'distance': np.array([4.5, 99999, 99999], dtype='f4')})
+        coordinates = 'ATOM stand-in for TestResidueTable\n'
+        table.save(coordinates)
+        ResidueTable._memory.clear()
+        table = ResidueTable.get(coordinates)
+        self.assertIsNone(table.get_residue('A', 4))
+        residue = table.get_residue('A', 1)
+        self.assertEqual((residue['N_atoms'], residue['SS'], residue['closest_ligand']), (5, 'H', '[HEM]101.FE:A'))
+        self.assertEqual(residue['neighbours'], [{'resi': '2', 'resn': 'GLY', 'chain': 'A'}])
+        self.assertEqual([n['resi'] for n in table.get_neighbours(2)], ['1', '2'])
+
+
 if __name__ == '__main__':
     print('*****Test********')
 
@@ -3,6 +3,11 @@ from michelanglo_protein.settings_handler import global_settings
 from michelanglo_protein.generate import ProteinGatherer, ProteomeGatherer
 from michelanglo_protein.generate.split_gnomAD import gnomAD
 from michelanglo_protein.protein_analysis import StructureAnalyser
+from michelanglo_protein.sifts_index import SiftsIndex
+from michelanglo_protein.sifts_mapping import SiftsMapping
+from michelanglo_protein.ligand_inventory import LigandInventory
+from michelanglo_protein.prefetch import prefetch_structures
+from michelanglo_protein.analyse import EnergeticsCache
 # Settings = namedtuple('settings', 'dictionary_folder', 'reference_folder', 'temp_folder')
 import pickle
 import sys, traceback, re
@@ -240,8 +245,9 @@ def fix_all_offsets():
 
     :return:
     """
-    p = Pool(4)
     global_settings.verbose = False
+    SiftsIndex.build()  # once, before forking, so the workers share it.
+    p = Pool(4)
     with open('PDB_Uniprot_offsets.tsv', 'w') as w:
         # for species in os.listdir(os.path.join(global_settings.pickle_folder)):
         #     if 'taxid' not in species:
@@ -257,6 +263,7 @@ def fix_all_offsets():
 def touch_offsets(taxid=9606):
     overview = []
     global_settings.verbose = False
+    SiftsIndex.build()
     source = os.path.join(global_settings.pickle_folder, f'taxid{taxid}')
     for pf in os.listdir(source):
         p = ProteinCore().load(file=os.path.join(source, pf))
@@ -431,6 +438,165 @@ def hotfix_swiss(taxid=9606):
 
 
 
+def migrate_structure_pickles(taxid=9606):
+    """
+    Structure is now slotted. Old pickles are converted on load (``Structure.__setstate__``),
+    this re-dumps them so they are stored in the compact form and skip the conversion.
+    """
+    global_settings.verbose = False
+    source = os.path.join(global_settings.pickle_folder, f'taxid{taxid}')
+    for pf in os.listdir(source):
+        try:
+            p = ProteinCore().load(file=os.path.join(source, pf))
+            p.dump(file=os.path.join(source, pf))
+        except Exception as err:
+            print(f'{pf} {err.__class__.__name__} {err}')
+
+
+def benchmark_structure_pickles(taxid=9606, sample=500):
+    """
+    Memory and unpickle time of the Structure instances of a sample of a taxon: as they were (a __dict__ each) vs slotted.
+    Run before ``migrate_structure_pickles`` to compare against the old files.
+    """
+    import time, tracemalloc, random
+    from types import SimpleNamespace
+    source = os.path.join(global_settings.pickle_folder, f'taxid{taxid}')
+    files = os.listdir(source)
+    random.shuffle(files)
+    structures = []
+    for pf in files[:sample]:
+        p = ProteinCore().load(file=os.path.join(source, pf))
+        structures.extend(p.pdbs + p.swissmodel)
+    # the dict form, as it was. NB. SimpleNamespace just stands in for the old class.
+    legacy = [SimpleNamespace(**{k: getattr(s, k) for k in structure.Structure.__slots__ if k != '_extra'},
+                              extra={}, pdb_start=None, pdb_end=None) for s in structures]
+
+    def measure(objects):
+        blob = pickle.dumps(objects)
+        tick = time.perf_counter()
+        pickle.loads(blob)
+        tock = time.perf_counter() - tick
+        tracemalloc.start()
+        loaded = pickle.loads(blob)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return {'bytes pickled': len(blob), 'unpickle s': tock, 'memory/instance': memory / max(1, len(loaded))}
+
+    print(f'{len(structures):,} structures from {min(sample, len(files))} proteins of taxid{taxid}')
+    print('dict:   ', measure(legacy))
+    print('slotted:', measure(structures))
+
+
+def catalog_ligands(taxid=9606):
+    """
+    Fills the ligand catalog (see ligand_inventory.py) with the PDB entries of a taxon,
+    so ``LigandInventory.find_uniprots('HEM')`` covers it.
+    """
+    global_settings.verbose = False
+    source = os.path.join(global_settings.pickle_folder, f'taxid{taxid}')
+    done = set()
+    for pf in os.listdir(source):
+        try:
+            p = ProteinCore().load(file=os.path.join(source, pf))
+            prefetch_structures(p)
+            for s in p.pdbs:
+                if s.code in done:
+                    continue
+                done.add(s.code)
+                LigandInventory.get(s.code, s.get_coordinates())
+        except Exception as err:
+            print(f'{pf} {err.__class__.__name__} {err}')
+
+
+def store_sifts_mappings(taxid=9606, download=False):
+    """
+    Stores the residue level SIFTS mappings (see sifts_mapping.py) of the PDB entries of a taxon,
+    downloading the missing XMLs if download is True.
+    """
+    global_settings.verbose = False
+    source = os.path.join(global_settings.pickle_folder, f'taxid{taxid}')
+    codes = set()
+    for pf in os.listdir(source):
+        try:
+            p = ProteinCore().load(file=os.path.join(source, pf))
+            codes.update(s.code for s in p.pdbs if s.type == 'rcsb')
+        except Exception as err:
+            print(f'{pf} {err.__class__.__name__} {err}')
+    print(f'{SiftsMapping.generate(codes, download=download)} of {len(codes)} entries stored')
+
+
+def find_elm_gnomAD(identifier='LIG_SH3', taxid=9606):
+    """
+    Proteins of a taxon with a gnomAD missense in an ELM motif (e.g. LIG_SH3), from the stored ELM indices.
+    Pickles without one get it made (and are resaved).
+    """
+    global_settings.verbose = False
+    source = os.path.join(global_settings.pickle_folder, f'taxid{taxid}')
+    found = {}
+    for pf in os.listdir(source):
+        try:
+            p = ProteinCore().load(file=os.path.join(source, pf))
+            missing = p.elm_index is None or not p.elm_index.is_current()
+            hits = p.get_gnomAD_in_elm(identifier)
+            if missing:
+                p.dump(file=os.path.join(source, pf))
+            if hits:
+                found[p.uniprot] = [(name, variant.description) for name, variant in hits]
+        except Exception as err:
+            print(f'{pf} {err.__class__.__name__} {err}')
+    return found
+
+
+def warm_energetics_cache(clinvar_file, taxid=9606, significance=('Pathogenic', 'Likely pathogenic')):
+    """
+    Scores the ClinVar missenses (``variant_summary.txt.gz`` from ftp.ncbi.nlm.nih.gov/pub/clinvar/tab_delimited)
+    as VENUS would, at batch priority, so the results are in ``EnergeticsCache`` when users ask for them.
+    """
+    import gzip, csv
+    global_settings.verbose = False
+    namedex = json.load(open(os.path.join(global_settings.dictionary_folder, f'taxid{taxid}-names2uniprot.json')))
+    variants = {}
+    with gzip.open(clinvar_file, 'rt') as fh:
+        for row in csv.DictReader(fh, delimiter='\t'):
+            if row['Type'] != 'single nucleotide variant' or row['ClinicalSignificance'] not in significance:
+                continue
+            rex = re.search(r'\(p\.([A-Z][a-z]{2}\d+(?!Ter)[A-Z][a-z]{2})\)', row['Name'])
+            if rex and row['GeneSymbol'] in namedex:
+                variants.setdefault(namedex[row['GeneSymbol']], set()).add(rex.group(1))
+    for uniprot, mutations in variants.items():
+        try:
+            p = ProteinAnalyser(taxid=str(taxid), uniprot=uniprot).load()
+            for result in p.predict_effects(sorted(mutations)):
+                if result['structural'] is None:
+                    continue
+                p.mutation, p.structural, p.energetics = result['mutation'], result['structural'], None
+                p.analyse_FF(priority='batch')
+        except Exception as err:
+            print(f'{uniprot} {err.__class__.__name__} {err}')
+    print(f'cache hits {EnergeticsCache.hits}, misses {EnergeticsCache.misses}')
+
+
+def annotate_residues(taxid=9606):
+    """
+    Precomputes the residue tables (see analyse/residue_table.py) of the structures of a taxon,
+    so ``StructureAnalyser`` is a lookup for them.
+    """
+    global_settings.verbose = False
+    source = os.path.join(global_settings.pickle_folder, f'taxid{taxid}')
+    done = set()
+    for pf in os.listdir(source):
+        try:
+            p = ProteinCore().load(file=os.path.join(source, pf))
+            prefetch_structures(p)
+            for s in p.pdbs + p.swissmodel:
+                if (s.code, s.chain) in done:
+                    continue
+                done.add((s.code, s.chain))
+                StructureAnalyser.annotate(s)
+        except Exception as err:
+            print(f'{pf} {err.__class__.__name__} {err}')
+
+
 if __name__ == '__main__':
     global_settings.verbose = True #False
     global_settings.startup(data_folder='../protein-data')
@@ -19,7 +19,7 @@ setuptools.setup(
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
-    ], install_requires=['Bio', 'requests_ftp'
+    ], install_requires=['Bio', 'requests_ftp', 'numpy'
     ]
 )
 